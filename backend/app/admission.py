@@ -0,0 +1,196 @@
+"""
+Admission control for the expensive stages of a chat turn.
+
+Each stage (emotion inference, LLM reply) has a concurrency limit and a
+bounded FIFO queue in front of it. Under a spike, requests past the limit
+wait in line; once the line is full, or the wait would pass the stage's
+deadline, new requests are turned away right away instead of piling up
+until everyone times out:
+
+- 429 + Retry-After: the stage's queue is full.
+- 503 + Retry-After: the expected wait (queue position x recent service
+  time / limit) is past ADMISSION_<STAGE>_MAX_WAIT_SECONDS, or the
+  request waited that long without getting a slot.
+
+Retry-After is the expected time for the queue to drain, at least 1 s.
+
+/chat and /chat/stream check the LLM stage before running emotion
+inference, so a request that would be rejected there doesn't spend a
+forward pass first. Voice sessions queue for emotion slots without a cap
+or deadline (a turn has one window in flight at most, and can't fail half
+way through), and get an "error" message with retry_after when the LLM
+stage turns them away.
+
+Limits are per process, like the executors. Everything here runs on the
+event loop, so no locks are needed.
+
+Metrics: thera_admission_wait_seconds{stage}, thera_admission_rejected_total
+{stage,reason}, thera_admission_in_flight{stage} and
+thera_queue_depth{queue="admission_<stage>"}.
+"""
+
+import asyncio
+import logging
+import math
+import time
+from collections import deque
+from contextlib import asynccontextmanager
+from fastapi import HTTPException
+from app.config import settings
+from app.services.metrics import ADMISSION_REJECTED, ADMISSION_WAIT, CallbackMetric, register_queue
+
+logger = logging.getLogger(__name__)
+
+BUSY = "Hệ thống đang quá tải, vui lòng thử lại sau"
+
+
+class Overloaded(HTTPException):
+    """A stage turned the request away; rendered as 429/503 with Retry-After."""
+
+    def __init__(self, stage: str, reason: str, retry_after: int):
+        status_code = 429 if reason == "queue_full" else 503
+        super().__init__(status_code=status_code, detail=BUSY, headers={"Retry-After": str(retry_after)})
+        self.stage = stage
+        self.reason = reason
+        self.retry_after = retry_after
+
+
+class Admission:
+    """Concurrency limit + bounded wait queue + wait deadline for one stage."""
+
+    def __init__(self, name: str, limit: int, max_queue: int, max_wait: float, enabled: bool = True):
+        self.name = name
+        self.limit = max(1, limit)
+        self.max_queue = max(0, max_queue)
+        self.max_wait = max_wait
+        self.enabled = enabled
+        self.active = 0
+        self.service_ewma: float | None = None  # seconds a slot is held, recent average
+        self._waiters: deque[asyncio.Future] = deque()
+
+    @property
+    def depth(self) -> int:
+        return len(self._waiters)
+
+    def expected_wait(self, position: int) -> float | None:
+        """Seconds until the request at `position` in line gets a slot."""
+        if self.service_ewma is None:
+            return None
+        return position * self.service_ewma / self.limit
+
+    def retry_after(self) -> int:
+        expected = self.expected_wait(self.depth + 1)
+        return max(1, math.ceil(expected if expected is not None else self.max_wait))
+
+    def check(self) -> None:
+        """Fail fast if a request arriving now would be turned away."""
+        if not self.enabled or (self.active < self.limit and not self._waiters):
+            return
+        if self.depth >= self.max_queue:
+            self._reject("queue_full")
+        expected = self.expected_wait(self.depth + 1)
+        if expected is not None and expected > self.max_wait:
+            self._reject("deadline")
+
+    @asynccontextmanager
+    async def slot(self, reject: bool = True):
+        """Hold one of the stage's slots for the block. reject=False waits in
+        line however long it takes (no queue cap, no deadline)."""
+        if not self.enabled:
+            yield
+            return
+        await self._acquire(reject)
+        started = time.monotonic()
+        try:
+            yield
+        finally:
+            held = time.monotonic() - started
+            self.service_ewma = held if self.service_ewma is None else 0.2 * held + 0.8 * self.service_ewma
+            self._release()
+
+    async def _acquire(self, reject: bool) -> None:
+        if self.active < self.limit and not self._waiters:
+            self.active += 1
+            ADMISSION_WAIT.observe(0.0, stage=self.name)
+            return
+        if reject:
+            self.check()
+
+        loop = asyncio.get_running_loop()
+        waiter = loop.create_future()
+        self._waiters.append(waiter)
+        timer = loop.call_later(self.max_wait, self._expire, waiter) if reject else None
+        started = time.monotonic()
+        try:
+            granted = await waiter
+        except asyncio.CancelledError:
+            if waiter.done() and not waiter.cancelled() and waiter.result():
+                self._release()  # handed a slot just as we were cancelled
+            elif waiter in self._waiters:
+                self._waiters.remove(waiter)
+            raise
+        finally:
+            if timer is not None:
+                timer.cancel()
+        ADMISSION_WAIT.observe(time.monotonic() - started, stage=self.name)
+        if not granted:
+            self._reject("deadline")
+
+    def _release(self) -> None:
+        # Hand the slot straight to the next waiter still in line
+        while self._waiters:
+            waiter = self._waiters.popleft()
+            if not waiter.done():
+                waiter.set_result(True)
+                return
+        self.active -= 1
+
+    def _expire(self, waiter: asyncio.Future) -> None:
+        if not waiter.done():
+            self._waiters.remove(waiter)
+            waiter.set_result(False)
+
+    def _reject(self, reason: str):
+        ADMISSION_REJECTED.inc(stage=self.name, reason=reason)
+        retry_after = self.retry_after()
+        logger.warning(
+            f"Admission {self.name}: rejected ({reason}), in_flight={self.active} queued={self.depth} "
+            f"retry_after={retry_after}s"
+        )
+        raise Overloaded(self.name, reason, retry_after)
+
+
+_stages: dict[str, Admission] = {}
+
+
+def _limits(stage: str) -> tuple[int, int, float]:
+    return {
+        "emotion": (
+            settings.ADMISSION_EMOTION_CONCURRENCY,
+            settings.ADMISSION_EMOTION_QUEUE,
+            settings.ADMISSION_EMOTION_MAX_WAIT_SECONDS,
+        ),
+        "llm": (
+            settings.ADMISSION_LLM_CONCURRENCY,
+            settings.ADMISSION_LLM_QUEUE,
+            settings.ADMISSION_LLM_MAX_WAIT_SECONDS,
+        ),
+    }[stage]
+
+
+def get_admission(stage: str) -> Admission:
+    """Shared gate for a stage ("emotion" or "llm"), built from settings on first use."""
+    admission = _stages.get(stage)
+    if admission is None:
+        admission = _stages[stage] = Admission(stage, *_limits(stage), enabled=settings.ADMISSION_ENABLED)
+        register_queue(f"admission_{stage}", lambda: admission.depth)
+    return admission
+
+
+CallbackMetric(
+    "thera_admission_in_flight",
+    "Requests holding a slot per admission stage",
+    "gauge",
+    ("stage",),
+    lambda: {(name,): admission.active for name, admission in _stages.items()},
+)
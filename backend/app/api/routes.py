@@ -2,17 +2,51 @@
 API routes for the chatbot application.
 """
 
+import asyncio
+import json
 import logging
+import uuid
+from dataclasses import dataclass
 from datetime import date, datetime
-from fastapi import APIRouter, UploadFile, File, Form, HTTPException, Header, Query
+from typing import BinaryIO
+from zoneinfo import ZoneInfo, ZoneInfoNotFoundError
+from fastapi import APIRouter, UploadFile, File, Form, HTTPException, Header, Query, WebSocket, WebSocketDisconnect
+from fastapi.responses import StreamingResponse
+from starlette.background import BackgroundTask
 from app.config import settings
 from app.models import ChatResponse
-from app.services import (
-    emotion_service,
-    chatbot_service,
+from app.services import get_emotion_batcher, get_chatbot_service
+from app.services.chatbot import INTERRUPTED_REPLY
+from app.services.chat_history import (
+    BUCKETS,
+    conversation_cache,
+    save_message,
+    get_recent_messages,
+    get_emotion_stats_by_date,
+    get_emotion_stats_range,
 )
-from app.services.chat_history import save_message, get_recent_messages, get_emotion_stats_by_date
-from app.services.auth import get_user_id_from_token
+from app.services.audio_decode import AudioDecodeError, decode_to_wav
+from app.services.audio_frontend import SAMPLE_RATE
+from app.services.audio_input import (
+    HEADER_SIZE,
+    TOO_LARGE,
+    UNSUPPORTED_AUDIO,
+    audio_digest,
+    audio_format,
+    audio_size,
+    is_audio_content_type,
+    open_audio,
+)
+from app.services.auth import get_user_id_from_token, token_cache
+from app.services.emotion_cache import get_emotion_cache
+from app.services.inference_client import get_inference_client
+from app.services.llm_router import ReplyInterrupted
+from app.services.executors import iterate_io, run_decode, run_inference, run_io
+from app.services.metrics import stage
+from app.services.segmenter import analyze_long_audio, is_long_audio
+from app.services.voice_session import PCM_FORMATS, VoiceTurn
+from app.admission import Overloaded, get_admission
+from app.request_context import request_id_var
 
 logger = logging.getLogger(__name__)
 router = APIRouter()
@@ -22,14 +56,157 @@ def _validate_audio_file(file: UploadFile) -> None:
     """Validate audio file."""
     # Check file size
     if file.size and file.size > settings.MAX_AUDIO_SIZE:
-        raise HTTPException(
-            status_code=400,
-            detail=f"File quá lớn (max {settings.MAX_AUDIO_SIZE / (1024*1024):.0f}MB)",
-        )
+        raise HTTPException(status_code=413, detail=TOO_LARGE)
+
+    # Check content type - the container itself is sniffed in _inspect_upload
+    if not is_audio_content_type(file.content_type):
+        raise HTTPException(status_code=400, detail=UNSUPPORTED_AUDIO)
+
+
+@dataclass
+class AudioUpload:
+    """An uploaded clip, left in the file Starlette spooled it to."""
+
+    file: BinaryIO
+    size: int
+    digest: str
+    format: str
+
+
+def _inspect_upload(file: BinaryIO) -> AudioUpload:
+    header = open_audio(file).read(HEADER_SIZE)
+    if not header:
+        raise HTTPException(400, "Audio file is empty")
+    container = audio_format(header)
+    if container is None:
+        raise HTTPException(status_code=400, detail=UNSUPPORTED_AUDIO)
+    size = audio_size(file)
+    if size > settings.MAX_AUDIO_SIZE:
+        raise HTTPException(status_code=413, detail=TOO_LARGE)
+    return AudioUpload(file=file, size=size, digest=audio_digest(file), format=container)
+
+
+async def _receive_upload(file: UploadFile) -> AudioUpload:
+    """Check the header and hash the upload in chunks, without reading it
+    into memory (see app.services.audio_input). Runs on the IO pool since
+    larger uploads are spooled to disk."""
+    _validate_audio_file(file)
+    return await run_io(_inspect_upload, file.file)
+
+
+async def _decode_upload(audio: AudioUpload) -> BinaryIO:
+    """Compressed uploads -> 16 kHz mono float32 WAV, on the decode pool."""
+    with stage("audio_decode"):
+        try:
+            return await run_decode(decode_to_wav, audio.file, audio.format)
+        except AudioDecodeError as exc:
+            logger.warning(f"Audio decode failed: {exc}")
+            raise HTTPException(400, "Không giải mã được file audio")
+
+
+async def _run_emotion(audio: AudioUpload, transcribe: bool = False) -> dict:
+    """Compressed uploads are decoded first, only on a cache miss (the cache
+    key is the digest of the upload as sent)."""
+    async with get_admission("emotion").slot():
+        if audio.format == "wav":
+            return await _predict_emotion(audio.file, transcribe)
+        wav = await _decode_upload(audio)
+        try:
+            return await _predict_emotion(wav, transcribe)
+        finally:
+            wav.close()
+
+
+async def _predict_emotion(wav: BinaryIO, transcribe: bool = False) -> dict:
+    """Short clips go through the micro-batcher; long recordings are analysed in windows.
+    transcribe: also return the clip's "text" (server-side STT, short clips only)."""
+    long_audio = is_long_audio(wav)
+    if long_audio and transcribe:
+        raise HTTPException(400, "Audio quá dài để nhận dạng trên server, cần gửi kèm 'text'")
+    if settings.EMOTION_INFERENCE_MODE == "server":
+        return await get_inference_client().predict(wav, long_audio=long_audio, transcribe=transcribe)
+    if long_audio:
+        return await run_inference(analyze_long_audio, wav)
+    return await get_emotion_batcher().predict(wav, transcribe=transcribe)
+
+
+async def _detect_emotion(audio: AudioUpload, transcribe: bool = False) -> dict:
+    """Emotion for the clip, served from the result cache when the same bytes were seen before."""
+    with stage("emotion"):
+        if not settings.EMOTION_CACHE_ENABLED:
+            return await _run_emotion(audio, transcribe)
+        # Results with a transcript are cached apart from emotion-only ones
+        key = f"{audio.digest}:text" if transcribe else audio.digest
+        return await get_emotion_cache().get_or_compute(key, lambda: _run_emotion(audio, transcribe))
+
 
-    # Check content type - WAV only
-    if file.content_type not in ["audio/wav", "audio/x-wav"]:
-        raise HTTPException(status_code=400, detail="Chỉ hỗ trợ định dạng WAV")
+def _user_text(text: str | None) -> str:
+    """Frontend STT text; empty means transcribe on the server (STT_ENABLED)."""
+    user_text = (text or "").strip()
+    if not user_text and not settings.STT_ENABLED:
+        raise HTTPException(400, "Thiếu 'text' từ frontend STT")
+    return user_text
+
+
+def _transcript(emotion_result: dict) -> str:
+    user_text = (emotion_result.get("text") or "").strip()
+    if not user_text:
+        raise HTTPException(400, "Không nhận dạng được lời nói trong audio")
+    return user_text
+
+
+async def _load_user_context(authorization: str | None) -> tuple[str | None, list[dict]]:
+    """Resolve the user from the token, then fetch their recent messages."""
+    if not authorization:
+        return None, []
+    with stage("user_context"):
+        return await _resolve_user_context(authorization)
+
+
+async def _resolve_user_context(authorization: str) -> tuple[str | None, list[dict]]:
+
+    try:
+        user_id = await run_io(get_user_id_from_token, authorization)
+    except Exception as auth_err:
+        logger.warning(f"Auth failed: {auth_err}")
+        return None, []
+
+    return user_id, await _load_recent_messages(user_id)
+
+
+async def _load_recent_messages(user_id: str) -> list[dict]:
+    try:
+        return await run_io(get_recent_messages, user_id, limit=5)
+    except Exception as fetch_err:
+        logger.warning(f"Failed to fetch recent messages: {fetch_err}")
+        return []
+
+
+def _persist_turn(
+    user_id: str,
+    user_text: str,
+    emotion: str,
+    confidence: float,
+    reply_text: str,
+) -> None:
+    """Queue the user message, then the assistant reply, for the background writer."""
+    try:
+        save_message(
+            user_id=user_id,
+            role="user",
+            content=user_text,
+            emotion=emotion,
+            confidence=confidence,
+        )
+        save_message(
+            user_id=user_id,
+            role="assistant",
+            content=reply_text,
+            emotion=None,
+            confidence=None,
+        )
+    except Exception as save_err:
+        logger.error(f"Failed to queue messages for {user_id}: {save_err}")
 
 
 @router.post("/chat", response_model=ChatResponse)
@@ -40,80 +217,45 @@ async def chat(
 ):
     """
     Main chat endpoint - Processes audio + saves to DB if user logged in.
+
+    Without `text` (and with STT_ENABLED) the clip is transcribed on the
+    server, in the same encoder pass as emotion inference.
     """
     try:
-        # Validate
-        _validate_audio_file(file)
-
-        # Read audio
-        audio_bytes = await file.read()
-        if not audio_bytes:
-            raise HTTPException(400, "Audio file is empty")
+        # Validate and hash the upload; the audio stays in its spooled file
+        audio = await _receive_upload(file)
 
-        # User text (required)
-        user_text = (text or "").strip()
-        if not user_text:
-            raise HTTPException(400, "Thiếu 'text' từ frontend STT")
+        user_text = _user_text(text)
+        transcribe = not user_text
+        # Don't spend a forward pass on a turn the LLM stage would turn away
+        get_admission("llm").check()
 
         logger.info(
-            f"Processing chat: text_len={len(user_text)}, audio_size={len(audio_bytes)} bytes"
+            f"Processing chat: text_len={len(user_text)}, server_stt={transcribe}, audio_size={audio.size} bytes"
         )
 
-        # Emotion Detection from audio
-        emotion_result = emotion_service.predict(audio_bytes)
+        # Emotion inference, token validation and history fetch are independent
+        emotion_result, (user_id, recent_messages) = await asyncio.gather(
+            _detect_emotion(audio, transcribe=transcribe),
+            _load_user_context(authorization),
+        )
+        if transcribe:
+            user_text = _transcript(emotion_result)
         emotion = emotion_result["emotion"]
         confidence = emotion_result["confidence"]
 
-        # Get user_id from token if provided
-        user_id = None
-        if authorization:
-            try:
-                user_id = get_user_id_from_token(authorization)
-            except Exception as auth_err:
-                logger.warning(f"Auth failed: {auth_err}")
-
-        # Save user message if logged in
-        if user_id:
-            try:
-                save_message(
-                    user_id=user_id,
-                    role="user",
-                    content=user_text,
-                    emotion=emotion,
-                    confidence=confidence,
-                )
-                logger.info(f"User message saved for {user_id}")
-            except Exception as save_err:
-                logger.error(f"Failed to save user message: {save_err}")
-
-        # Get recent messages for context if logged in
-        recent_messages = []
-        if user_id:
-            try:
-                recent_messages = get_recent_messages(user_id, limit=5)
-            except Exception as fetch_err:
-                logger.warning(f"Failed to fetch recent messages: {fetch_err}")
-
         # Chat Response
-        reply_text = chatbot_service.get_reply(
-            user_text=user_text,
-            emotion=emotion,
-            recent_messages=recent_messages if user_id else [],
-        )
+        async with get_admission("llm").slot():
+            reply_text = await run_io(
+                get_chatbot_service().get_reply,
+                user_text=user_text,
+                emotion=emotion,
+                recent_messages=recent_messages,
+            )
 
-        # Save assistant reply if logged in
+        # Persist both messages off the critical path (write-behind queue)
         if user_id:
-            try:
-                save_message(
-                    user_id=user_id,
-                    role="assistant",
-                    content=reply_text,
-                    emotion=None,
-                    confidence=None,
-                )
-                logger.info(f"Assistant message saved for {user_id}")
-            except Exception as save_err:
-                logger.error(f"Failed to save assistant message: {save_err}")
+            _persist_turn(user_id, user_text, emotion, confidence, reply_text)
 
         logger.info(f"Chat completed: emotion={emotion}, confidence={confidence:.2f}")
 
@@ -122,6 +264,7 @@ async def chat(
             reply_text=reply_text,
             emotion=emotion,
             confidence=confidence,
+            segments=emotion_result.get("segments"),
         )
 
     except HTTPException:
@@ -130,9 +273,319 @@ async def chat(
         logger.error(f"Chat endpoint error: {e}", exc_info=True)
         raise HTTPException(status_code=500, detail="Internal server error")
 
+
+def _sse(event: str, data: dict) -> str:
+    """Format one Server-Sent Event."""
+    return f"event: {event}\ndata: {json.dumps(data, ensure_ascii=False)}\n\n"
+
+
+@router.post("/chat/stream")
+async def chat_stream(
+    file: UploadFile = File(...),
+    text: str = Form(default=""),
+    authorization: str = Header(default=None),
+):
+    """
+    Streaming chat endpoint (Server-Sent Events).
+
+    Events: "emotion" as soon as inference finishes (with the server-side
+    transcript as user_text when `text` was omitted), then one "token" per
+    reply chunk, then "done" with the full reply. Messages are saved after
+    the stream ends. If the reply breaks off (LLM provider failed or timed
+    out mid-reply), "error" is sent instead of "done" and nothing is saved.
+    """
+    try:
+        audio = await _receive_upload(file)
+
+        user_text = _user_text(text)
+        transcribe = not user_text
+        get_admission("llm").check()
+
+        logger.info(
+            f"Processing chat stream: text_len={len(user_text)}, server_stt={transcribe}, audio_size={audio.size} bytes"
+        )
+
+        # History keeps loading while we wait for the emotion result
+        context_task = asyncio.create_task(_load_user_context(authorization))
+        try:
+            emotion_result = await _detect_emotion(audio, transcribe=transcribe)
+            if transcribe:
+                user_text = _transcript(emotion_result)
+        except Exception:
+            context_task.cancel()
+            raise
+
+    except HTTPException:
+        raise
+    except Exception as e:
+        logger.error(f"Chat stream endpoint error: {e}", exc_info=True)
+        raise HTTPException(status_code=500, detail="Internal server error")
+
+    emotion = emotion_result["emotion"]
+    confidence = emotion_result["confidence"]
+    turn = {"user_id": None, "reply_parts": []}
+
+    async def events():
+        emotion_event = {"user_text": user_text, "emotion": emotion, "confidence": confidence}
+        if emotion_result.get("segments") is not None:
+            emotion_event["segments"] = emotion_result["segments"]
+        yield _sse("emotion", emotion_event)
+
+        user_id, recent_messages = await context_task
+        turn["user_id"] = user_id
+
+        try:
+            async with get_admission("llm").slot():
+                async for delta in iterate_io(
+                    get_chatbot_service().get_reply_stream(
+                        user_text=user_text,
+                        emotion=emotion,
+                        recent_messages=recent_messages,
+                    )
+                ):
+                    turn["reply_parts"].append(delta)
+                    yield _sse("token", {"text": delta})
+        except Overloaded as e:
+            # The response has started: report it in the stream
+            yield _sse("error", {"detail": e.detail, "retry_after": e.retry_after})
+            return
+        except ReplyInterrupted as e:
+            # Half a reply: tell the client and don't save it
+            logger.warning(f"Chat stream interrupted: {e}")
+            turn["reply_parts"].clear()
+            yield _sse("error", {"detail": INTERRUPTED_REPLY})
+            return
+        except Exception as e:
+            logger.error(f"Chat stream error: {e}", exc_info=True)
+            turn["reply_parts"].clear()
+            yield _sse("error", {"detail": "Internal server error"})
+            return
+
+        yield _sse("done", {"reply_text": "".join(turn["reply_parts"]).strip()})
+
+    def persist():
+        reply_text = "".join(turn["reply_parts"]).strip()
+        if turn["user_id"] and reply_text:
+            _persist_turn(turn["user_id"], user_text, emotion, confidence, reply_text)
+
+    return StreamingResponse(
+        events(),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"},
+        background=BackgroundTask(persist),
+    )
+
+
+@router.websocket("/chat/session")
+async def chat_session(websocket: WebSocket, authorization: str = Header(default=None)):
+    """
+    Voice session over one WebSocket: authenticate once, then any number of turns.
+
+    Client -> server:
+      {"type": "start", "token"?, "sample_rate"?: 16000, "format"?: "pcm_f32le" | "pcm_s16le"}
+          first message; the token can also come in the Authorization header
+      binary frames: the turn's audio (mono PCM), sent while the user speaks
+      {"type": "end", "text": "..."}: end of the turn, with the frontend STT text
+      {"type": "cancel"}: drop the current turn
+
+    Server -> client:
+      {"type": "ready", "authenticated": bool}
+      {"type": "emotion_partial", "emotion", "confidence", "duration"} while the user speaks
+      {"type": "emotion", "user_text", "emotion", "confidence", "duration", "segments"?}
+      {"type": "token", "text"} per reply chunk, then {"type": "done", "reply_text"}
+      {"type": "error", "detail", "retry_after"?}: retry_after when the LLM stage is overloaded
+
+    Emotion is inferred while the audio streams in (see
+    app.services.voice_session), so it is ready as soon as the turn ends.
+    Turns are answered in order; the next turn's audio can stream in while
+    the previous reply is still being sent.
+    """
+    request_id_var.set(uuid.uuid4().hex[:16])
+    await websocket.accept()
+    send_lock = asyncio.Lock()
+
+    async def send(message: dict) -> None:
+        async with send_lock:
+            await websocket.send_text(json.dumps(message, ensure_ascii=False))
+
+    async def send_estimate(estimate: dict) -> None:
+        await send({"type": "emotion_partial", **estimate})
+
+    turn: VoiceTurn | None = None
+    history: asyncio.Task | None = None
+    replies: asyncio.Task | None = None
+    try:
+        try:
+            start = json.loads(
+                await asyncio.wait_for(websocket.receive_text(), settings.SESSION_IDLE_TIMEOUT_SECONDS)
+            )
+            sample_rate = int(start.get("sample_rate", SAMPLE_RATE))
+            pcm_format = start.get("format", "pcm_f32le")
+        except (KeyError, ValueError, TypeError, AttributeError):
+            start, sample_rate, pcm_format = {}, 0, None
+        if start.get("type") != "start" or pcm_format not in PCM_FORMATS or not 8000 <= sample_rate <= 48000:
+            await send({"type": "error", "detail": "Invalid start message"})
+            await websocket.close(code=1008)
+            return
+
+        user_id = None
+        token = authorization or start.get("token")
+        if token:
+            try:
+                user_id = await run_io(get_user_id_from_token, token)
+            except Exception as auth_err:
+                logger.warning(f"Auth failed: {auth_err}")
+                await send({"type": "error", "detail": "Invalid token"})
+                await websocket.close(code=1008)
+                return
+        logger.info(f"Voice session started: sample_rate={sample_rate} format={pcm_format}")
+        await send({"type": "ready", "authenticated": user_id is not None})
+
+        while True:
+            message = await asyncio.wait_for(websocket.receive(), settings.SESSION_IDLE_TIMEOUT_SECONDS)
+            if message["type"] == "websocket.disconnect":
+                break
+
+            if message.get("bytes") is not None:
+                if turn is None:
+                    turn = VoiceTurn(_session_emotion, sample_rate, pcm_format, on_estimate=send_estimate)
+                    # History loads while the user is still speaking
+                    history = asyncio.create_task(_load_recent_messages(user_id)) if user_id else None
+                elif turn.full:
+                    continue
+                turn.push(message["bytes"])
+                if turn.full:
+                    await send({
+                        "type": "error",
+                        "detail": f"Turn too long (max {settings.SESSION_MAX_TURN_SECONDS:g}s), later audio is ignored",
+                    })
+                continue
+
+            try:
+                data = json.loads(message.get("text") or "")
+            except ValueError:
+                data = {}
+            kind = data.get("type") if isinstance(data, dict) else None
+            if kind == "end":
+                if turn is None:
+                    await send({"type": "error", "detail": "Audio file is empty"})
+                    continue
+                user_text = str(data.get("text") or "").strip()
+                replies = asyncio.create_task(_session_turn(send, turn, history, user_id, user_text, replies))
+                turn, history = None, None
+            elif kind == "cancel":
+                if turn is not None:
+                    turn.cancel()
+                if history is not None:
+                    history.cancel()
+                turn, history = None, None
+            else:
+                await send({"type": "error", "detail": "Unknown message type"})
+
+    except asyncio.TimeoutError:
+        logger.info("Voice session idle, closing")
+        await websocket.close(code=1000)
+    except WebSocketDisconnect:
+        pass
+    finally:
+        if turn is not None:
+            turn.cancel()
+        if history is not None:
+            history.cancel()
+        if replies is not None and not replies.done():
+            # Let the turn in flight wind down; its sends fail fast once the socket is gone
+            await asyncio.wait([replies])
+
+
+async def _session_emotion(wav: BinaryIO) -> dict:
+    """A voice turn's window: waits for an emotion slot rather than failing mid-turn."""
+    async with get_admission("emotion").slot(reject=False):
+        return await _predict_emotion(wav)
+
+
+async def _session_turn(
+    send,
+    turn: VoiceTurn,
+    history: asyncio.Task | None,
+    user_id: str | None,
+    user_text: str,
+    previous: asyncio.Task | None,
+) -> None:
+    """Emotion, streamed reply and persistence for one ended turn."""
+    if previous is not None:
+        await asyncio.wait([previous])
+
+    try:
+        if not user_text:
+            turn.cancel()
+            await send({"type": "error", "detail": "Thiếu 'text' từ frontend STT"})
+            return
+
+        try:
+            with stage("session_emotion"):
+                emotion_result = await turn.finish()
+        except Exception as e:
+            logger.error(f"Voice turn emotion error: {e}", exc_info=True)
+            await send({"type": "error", "detail": "Emotion detection failed"})
+            return
+
+        emotion = emotion_result["emotion"]
+        confidence = emotion_result["confidence"]
+        logger.info(
+            f"Voice turn: text_len={len(user_text)}, duration={emotion_result['duration']}s, emotion={emotion}"
+        )
+        await send({"type": "emotion", "user_text": user_text, **emotion_result})
+
+        recent_messages = await history if history is not None else []
+        history = None
+        reply_parts = []
+        try:
+            async with get_admission("llm").slot():
+                async for delta in iterate_io(
+                    get_chatbot_service().get_reply_stream(
+                        user_text=user_text,
+                        emotion=emotion,
+                        recent_messages=recent_messages,
+                    )
+                ):
+                    reply_parts.append(delta)
+                    await send({"type": "token", "text": delta})
+        except Overloaded as e:
+            await send({"type": "error", "detail": e.detail, "retry_after": e.retry_after})
+            return
+        except ReplyInterrupted as e:
+            logger.warning(f"Voice session reply interrupted: {e}")
+            await send({"type": "error", "detail": INTERRUPTED_REPLY})
+            return
+        except Exception as e:
+            logger.error(f"Voice session reply error: {e}", exc_info=True)
+            await send({"type": "error", "detail": "Internal server error"})
+            return
+
+        reply_text = "".join(reply_parts).strip()
+        if user_id and reply_text:
+            _persist_turn(user_id, user_text, emotion, confidence, reply_text)
+        await send({"type": "done", "reply_text": reply_text})
+
+    except (WebSocketDisconnect, RuntimeError) as e:
+        # The client went away mid-turn
+        logger.info(f"Voice session closed during a turn: {e}")
+    finally:
+        if history is not None:
+            history.cancel()
+
+
+def _validate_timezone(tz: str) -> None:
+    try:
+        ZoneInfo(tz)
+    except (ZoneInfoNotFoundError, ValueError):
+        raise HTTPException(status_code=400, detail=f"Unknown timezone: {tz}")
+
+
 @router.get("/emotion-stats")
 async def get_emotion_stats(
     date_param: str = Query(..., description="Date in format YYYY-MM-DD"),
+    tz: str = Query(default=settings.STATS_DEFAULT_TIMEZONE, description="IANA timezone of the day"),
     authorization: str = Header(default=None),
 ):
     """
@@ -146,7 +599,7 @@ async def get_emotion_stats(
             raise HTTPException(status_code=401, detail="Authorization header required")
         
         try:
-            user_id = get_user_id_from_token(authorization)
+            user_id = await run_io(get_user_id_from_token, authorization)
         except Exception as auth_err:
             logger.warning(f"Auth failed: {auth_err}")
             raise HTTPException(status_code=401, detail="Invalid token")
@@ -156,9 +609,11 @@ async def get_emotion_stats(
             datetime.strptime(date_param, "%Y-%m-%d")
         except ValueError:
             raise HTTPException(status_code=400, detail="Invalid date format, use YYYY-MM-DD")
+
+        _validate_timezone(tz)
         
         # Get emotion stats
-        stats = get_emotion_stats_by_date(user_id, date_param)
+        stats = await run_io(get_emotion_stats_by_date, user_id, date_param, tz)
         
         return stats
         
@@ -166,4 +621,73 @@ async def get_emotion_stats(
         raise
     except Exception as e:
         logger.error(f"Emotion stats endpoint error: {e}", exc_info=True)
-        raise HTTPException(status_code=500, detail="Internal server error")
\ No newline at end of file
+        raise HTTPException(status_code=500, detail="Internal server error")
+
+
+@router.get("/emotion-stats/range")
+async def get_emotion_stats_range_endpoint(
+    start: str = Query(..., description="First day, YYYY-MM-DD"),
+    end: str = Query(..., description="Last day (inclusive), YYYY-MM-DD"),
+    bucket: str = Query(default="day", description="Bucket size: day or hour"),
+    tz: str = Query(default=settings.STATS_DEFAULT_TIMEZONE, description="IANA timezone for day boundaries"),
+    authorization: str = Header(default=None),
+):
+    """
+    Get per-bucket emotion counts for a date range in one call.
+
+    Returns: {"start", "end", "bucket", "timezone", "buckets": [...],
+              "counts": {"happy": [...], ...}, "totals": {"happy": int, ...}}
+    """
+    try:
+        if not authorization:
+            raise HTTPException(status_code=401, detail="Authorization header required")
+
+        try:
+            user_id = await run_io(get_user_id_from_token, authorization)
+        except Exception as auth_err:
+            logger.warning(f"Auth failed: {auth_err}")
+            raise HTTPException(status_code=401, detail="Invalid token")
+
+        try:
+            start_date = datetime.strptime(start, "%Y-%m-%d").date()
+            end_date = datetime.strptime(end, "%Y-%m-%d").date()
+        except ValueError:
+            raise HTTPException(status_code=400, detail="Invalid date format, use YYYY-MM-DD")
+
+        if end_date < start_date:
+            raise HTTPException(status_code=400, detail="end must not be before start")
+        if bucket not in BUCKETS:
+            raise HTTPException(status_code=400, detail=f"bucket must be one of {', '.join(BUCKETS)}")
+
+        max_days = settings.STATS_RANGE_MAX_DAYS if bucket == "day" else settings.STATS_RANGE_MAX_HOURLY_DAYS
+        if (end_date - start_date).days + 1 > max_days:
+            raise HTTPException(status_code=400, detail=f"Range too long (max {max_days} days for {bucket})")
+
+        _validate_timezone(tz)
+
+        return await run_io(get_emotion_stats_range, user_id, start_date, end_date, bucket, tz)
+
+    except HTTPException:
+        raise
+    except Exception as e:
+        logger.error(f"Emotion stats range endpoint error: {e}", exc_info=True)
+        raise HTTPException(status_code=500, detail="Internal server error")
+
+
+@router.get("/cache-stats")
+async def cache_stats(authorization: str = Header(default=None)):
+    """Size and hit-rate counters of the in-process caches."""
+    if not authorization:
+        raise HTTPException(status_code=401, detail="Authorization header required")
+
+    try:
+        await run_io(get_user_id_from_token, authorization)
+    except Exception as auth_err:
+        logger.warning(f"Auth failed: {auth_err}")
+        raise HTTPException(status_code=401, detail="Invalid token")
+
+    return {
+        "emotion": get_emotion_cache().stats(),
+        "auth": token_cache.stats(),
+        "conversation": conversation_cache.stats(),
+    }
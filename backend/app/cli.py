@@ -0,0 +1,38 @@
+"""
+Maintenance commands.
+
+Usage:
+    python -m app.cli rebuild-rollups [--user-id UUID] [--since YYYY-MM-DD]
+"""
+
+import argparse
+import logging
+from datetime import datetime
+
+
+def _rebuild_rollups(args):
+    from app.services.chat_history import rebuild_emotion_rollups
+
+    since = datetime.strptime(args.since, "%Y-%m-%d").date() if args.since else None
+    written = rebuild_emotion_rollups(user_id=args.user_id, since=since)
+    print(f"Rebuilt {written} emotion rollup row(s)")
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(prog="python -m app.cli")
+    commands = parser.add_subparsers(dest="command", required=True)
+
+    rebuild = commands.add_parser(
+        "rebuild-rollups", help="Recompute daily emotion rollups from the messages table"
+    )
+    rebuild.add_argument("--user-id", help="Only rebuild this user")
+    rebuild.add_argument("--since", help="Only rebuild days on or after YYYY-MM-DD")
+    rebuild.set_defaults(func=_rebuild_rollups)
+
+    args = parser.parse_args(argv)
+    logging.basicConfig(level=logging.INFO)
+    args.func(args)
+
+
+if __name__ == "__main__":
+    main()
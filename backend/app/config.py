@@ -21,9 +21,115 @@ class Settings:
     EMOTION_MODEL_PATH: str = "model/whisper.pt"
     EMOTION_LABELS: list = ["happy", "neutral", "sad", "angry"]
 
-    WHISPER_MODEL: str = "small"
+    # Map the checkpoint instead of copying it, so workers on one node share
+    # the weights through the page cache (eager/compile backends)
+    EMOTION_MMAP: bool = os.getenv("EMOTION_MMAP", "true").lower() == "true"
+
+    # Inference backend: eager | int8 | torchscript | compile | onnx
+    EMOTION_BACKEND: str = os.getenv("EMOTION_BACKEND", "eager")
+    EMOTION_ONNX_PATH: str = os.getenv("EMOTION_ONNX_PATH", "model/whisper.onnx")
+    # Variable-length input: encode clips at their own length, padded only up
+    # to the nearest bucket (in 10 ms mel frames; 3000 = 30 s) instead of 30 s
+    EMOTION_VARIABLE_LENGTH: bool = os.getenv("EMOTION_VARIABLE_LENGTH", "false").lower() == "true"
+    EMOTION_LENGTH_BUCKETS: str = os.getenv("EMOTION_LENGTH_BUCKETS", "500,1000,1500,3000")
+    # Per-worker torch thread budget (0 = torch default)
+    TORCH_INTRA_OP_THREADS: int = int(os.getenv("TORCH_INTRA_OP_THREADS", "0"))
+    TORCH_INTER_OP_THREADS: int = int(os.getenv("TORCH_INTER_OP_THREADS", "0"))
+
+    # Long recordings (> EMOTION_LONG_AUDIO_SECONDS) are analysed in overlapping
+    # windows; mostly-silent windows are skipped by an energy VAD
+    EMOTION_LONG_AUDIO_SECONDS: float = float(os.getenv("EMOTION_LONG_AUDIO_SECONDS", "30"))
+    EMOTION_WINDOW_SECONDS: float = float(os.getenv("EMOTION_WINDOW_SECONDS", "10"))
+    EMOTION_WINDOW_HOP_SECONDS: float = float(os.getenv("EMOTION_WINDOW_HOP_SECONDS", "5"))
+    EMOTION_MIN_WINDOW_SECONDS: float = float(os.getenv("EMOTION_MIN_WINDOW_SECONDS", "1"))
+    EMOTION_SEGMENT_BATCH: int = int(os.getenv("EMOTION_SEGMENT_BATCH", "16"))
+    EMOTION_VAD_ENABLED: bool = os.getenv("EMOTION_VAD_ENABLED", "true").lower() == "true"
+    EMOTION_VAD_THRESHOLD_DB: float = float(os.getenv("EMOTION_VAD_THRESHOLD_DB", "-45"))
+    EMOTION_VAD_MIN_SPEECH_RATIO: float = float(os.getenv("EMOTION_VAD_MIN_SPEECH_RATIO", "0.2"))
+
+    # /chat/session (WebSocket voice turns): the same windows are classified
+    # while the user speaks, with a live estimate every
+    # SESSION_EMOTION_UPDATE_SECONDS of new audio and after each pause of
+    # SESSION_PAUSE_SECONDS (see app.services.voice_session)
+    SESSION_EMOTION_UPDATE_SECONDS: float = float(os.getenv("SESSION_EMOTION_UPDATE_SECONDS", "2"))
+    SESSION_PAUSE_SECONDS: float = float(os.getenv("SESSION_PAUSE_SECONDS", "0.4"))
+    SESSION_MAX_TURN_SECONDS: float = float(os.getenv("SESSION_MAX_TURN_SECONDS", "120"))
+    SESSION_IDLE_TIMEOUT_SECONDS: float = float(os.getenv("SESSION_IDLE_TIMEOUT_SECONDS", "300"))
+
+    # Emotion result cache, keyed by audio hash + model version. Optional disk
+    # tier (EMOTION_CACHE_DIR) survives restarts and is shared by workers.
+    EMOTION_CACHE_ENABLED: bool = os.getenv("EMOTION_CACHE_ENABLED", "true").lower() == "true"
+    EMOTION_CACHE_SIZE: int = int(os.getenv("EMOTION_CACHE_SIZE", "2048"))
+    EMOTION_CACHE_TTL: int = int(os.getenv("EMOTION_CACHE_TTL", "3600"))
+    EMOTION_CACHE_DIR: str = os.getenv("EMOTION_CACHE_DIR", "")
+
+    # Startup: build clients/models in the background after the port is bound,
+    # then run a dummy clip through the model (see app.lifecycle)
+    SERVICES_PRELOAD: bool = os.getenv("SERVICES_PRELOAD", "true").lower() == "true"
+    EMOTION_WARMUP: bool = os.getenv("EMOTION_WARMUP", "true").lower() == "true"
+
+    # Emotion micro-batching: group concurrent requests into one forward pass
+    EMOTION_BATCH_MAX_SIZE: int = int(os.getenv("EMOTION_BATCH_MAX_SIZE", "8"))
+    EMOTION_BATCH_MAX_WAIT_MS: float = float(os.getenv("EMOTION_BATCH_MAX_WAIT_MS", "10"))
+
+    # Where emotion inference runs: "local" (inference thread in each web
+    # worker) or "server" (python -m app.inference_server, reached over unix
+    # sockets <EMOTION_INFERENCE_SOCKET>.<n> with shared-memory audio)
+    EMOTION_INFERENCE_MODE: str = os.getenv("EMOTION_INFERENCE_MODE", "local")
+    EMOTION_INFERENCE_SOCKET: str = os.getenv("EMOTION_INFERENCE_SOCKET", "/tmp/thera-inference.sock")
+    INFERENCE_SERVER_PROCESSES: int = int(os.getenv("INFERENCE_SERVER_PROCESSES", "2"))
+    INFERENCE_SERVER_CORES_PER_PROCESS: int = int(os.getenv("INFERENCE_SERVER_CORES_PER_PROCESS", "0"))
+    # Required in server mode; the same random secret for web and inference processes
+    INFERENCE_SERVER_AUTHKEY: str = os.getenv("INFERENCE_SERVER_AUTHKEY", "")
+    INFERENCE_SERVER_CONNECT_TIMEOUT: float = float(os.getenv("INFERENCE_SERVER_CONNECT_TIMEOUT", "60"))
+
+    # Executors for blocking work (torch inference vs. network SDK calls vs.
+    # decoding compressed uploads)
+    INFERENCE_WORKERS: int = int(os.getenv("INFERENCE_WORKERS", "1"))
+    IO_WORKERS: int = int(os.getenv("IO_WORKERS", "32"))
+    AUDIO_DECODE_WORKERS: int = int(os.getenv("AUDIO_DECODE_WORKERS", "2"))
+
+    # Server-side STT (see services/transcription): transcribe clips sent
+    # without `text`. WHISPER_MODEL is a size ("tiny" -> openai/whisper-tiny),
+    # a Hub id or a local save_pretrained directory; it has to match the
+    # emotion encoder's size for the encoder pass to be shared.
+    STT_ENABLED: bool = os.getenv("STT_ENABLED", "false").lower() == "true"
+    WHISPER_MODEL: str = os.getenv("WHISPER_MODEL", "tiny")
+    STT_SHARE_ENCODER: bool = os.getenv("STT_SHARE_ENCODER", "true").lower() == "true"
+    STT_LANGUAGE: str = os.getenv("STT_LANGUAGE", "vi")
+    STT_MAX_NEW_TOKENS: int = int(os.getenv("STT_MAX_NEW_TOKENS", "128"))
+    STT_LOCAL_FILES_ONLY: bool = os.getenv("STT_LOCAL_FILES_ONLY", "false").lower() == "true"
+
     GEMINI_MODEL: str = os.getenv("GEMINI_MODEL", "gemini-2.0-flash")
 
+    # LLM provider routing: order of preference, per-provider timeouts (s),
+    # circuit breaker, and hedging to the next provider past the p95 latency
+    LLM_PROVIDERS: str = os.getenv("LLM_PROVIDERS", "groq,gemini")
+    GROQ_TIMEOUT: float = float(os.getenv("GROQ_TIMEOUT", "10"))
+    GEMINI_TIMEOUT: float = float(os.getenv("GEMINI_TIMEOUT", "15"))
+    LLM_BREAKER_FAILURES: int = int(os.getenv("LLM_BREAKER_FAILURES", "5"))
+    LLM_BREAKER_COOLDOWN: float = float(os.getenv("LLM_BREAKER_COOLDOWN", "30"))
+    LLM_HEDGE_ENABLED: bool = os.getenv("LLM_HEDGE_ENABLED", "true").lower() == "true"
+    LLM_HEDGE_QUANTILE: float = float(os.getenv("LLM_HEDGE_QUANTILE", "0.95"))
+    LLM_HEDGE_MIN_SAMPLES: int = int(os.getenv("LLM_HEDGE_MIN_SAMPLES", "20"))
+    LLM_EWMA_ALPHA: float = float(os.getenv("LLM_EWMA_ALPHA", "0.2"))
+    LLM_MAX_CONCURRENCY: int = int(os.getenv("LLM_MAX_CONCURRENCY", "64"))
+
+    # Admission control (app.admission), per process: concurrent requests per
+    # stage, how many may wait for a slot, and how long. Past either limit
+    # requests get a 429/503 with Retry-After instead of queueing.
+    ADMISSION_ENABLED: bool = os.getenv("ADMISSION_ENABLED", "true").lower() == "true"
+    ADMISSION_EMOTION_CONCURRENCY: int = int(os.getenv("ADMISSION_EMOTION_CONCURRENCY", "16"))
+    ADMISSION_EMOTION_QUEUE: int = int(os.getenv("ADMISSION_EMOTION_QUEUE", "64"))
+    ADMISSION_EMOTION_MAX_WAIT_SECONDS: float = float(os.getenv("ADMISSION_EMOTION_MAX_WAIT_SECONDS", "5"))
+    ADMISSION_LLM_CONCURRENCY: int = int(os.getenv("ADMISSION_LLM_CONCURRENCY", "32"))
+    ADMISSION_LLM_QUEUE: int = int(os.getenv("ADMISSION_LLM_QUEUE", "64"))
+    ADMISSION_LLM_MAX_WAIT_SECONDS: float = float(os.getenv("ADMISSION_LLM_MAX_WAIT_SECONDS", "5"))
+    # Alternative API endpoints, e.g. the local stand-ins in benchmarks.standins
+    # (empty = the vendor's default)
+    GROQ_BASE_URL: str = os.getenv("GROQ_BASE_URL", "")
+    GEMINI_API_ENDPOINT: str = os.getenv("GEMINI_API_ENDPOINT", "")
+
     # LLM config
     LLM_TEMPERATURE: float = 0.7
     LLM_MAX_TOKENS: int = 500
@@ -31,6 +137,8 @@ class Settings:
     # Audio config
     AUDIO_DIR: str = "audio"
     MAX_AUDIO_SIZE: int = 25 * 1024 * 1024  # 25MB
+    # Compressed uploads are decoded up to this length; the rest is dropped
+    AUDIO_DECODE_MAX_SECONDS: float = float(os.getenv("AUDIO_DECODE_MAX_SECONDS", "600"))
     AUDIO_CLEANUP_HOURS: int = 24
 
     # API Keys
@@ -39,11 +147,46 @@ class Settings:
     # Logging
     LOG_LEVEL: str = os.getenv("LOG_LEVEL", "INFO")
 
+    # /metrics needs "Authorization: Bearer <METRICS_TOKEN>" (Prometheus:
+    # authorization.credentials). Unset, the endpoint is disabled.
+    METRICS_TOKEN: str = os.getenv("METRICS_TOKEN", "")
+
     # Supabase Configuration
     SUPABASE_URL: str = os.getenv("SUPABASE_URL", "")
     SUPABASE_ANON_KEY: str = os.getenv("SUPABASE_ANON_KEY", "")
     SUPABASE_SERVICE_ROLE_KEY: str = os.getenv("SUPABASE_SERVICE_ROLE_KEY", "")
 
+    # Local JWT verification. HS256 projects need the JWT secret; projects with
+    # asymmetric signing keys are verified against the cached JWKS instead.
+    SUPABASE_JWT_SECRET: str = os.getenv("SUPABASE_JWT_SECRET", "")
+    SUPABASE_JWT_AUDIENCE: str = os.getenv("SUPABASE_JWT_AUDIENCE", "authenticated")
+    AUTH_JWKS_TTL: int = int(os.getenv("AUTH_JWKS_TTL", "3600"))
+    AUTH_CACHE_SIZE: int = int(os.getenv("AUTH_CACHE_SIZE", "10000"))
+    AUTH_CACHE_TTL: int = int(os.getenv("AUTH_CACHE_TTL", "300"))
+
+    # Per-user recent-message cache. Each worker only sees its own writes.
+    # VERIFY checks every hit against the newest row in the messages table
+    # (one Supabase query per hit); it is only needed with several workers or
+    # replicas and no sticky routing of a user to one of them.
+    CONVERSATION_CACHE_ENABLED: bool = os.getenv("CONVERSATION_CACHE_ENABLED", "true").lower() == "true"
+    CONVERSATION_CACHE_VERIFY: bool = os.getenv("CONVERSATION_CACHE_VERIFY", "false").lower() == "true"
+    CONVERSATION_CACHE_WINDOW: int = int(os.getenv("CONVERSATION_CACHE_WINDOW", "10"))
+    CONVERSATION_CACHE_MAX_USERS: int = int(os.getenv("CONVERSATION_CACHE_MAX_USERS", "5000"))
+    CONVERSATION_CACHE_TTL: int = int(os.getenv("CONVERSATION_CACHE_TTL", "600"))
+
+    # Write-behind message persistence
+    PERSIST_BATCH_SIZE: int = int(os.getenv("PERSIST_BATCH_SIZE", "50"))
+    PERSIST_FLUSH_INTERVAL_MS: float = float(os.getenv("PERSIST_FLUSH_INTERVAL_MS", "250"))
+    PERSIST_MAX_RETRIES: int = int(os.getenv("PERSIST_MAX_RETRIES", "5"))
+    PERSIST_RETRY_BACKOFF_MS: float = float(os.getenv("PERSIST_RETRY_BACKOFF_MS", "200"))
+    PERSIST_MAX_PENDING: int = int(os.getenv("PERSIST_MAX_PENDING", "10000"))
+
+    # Emotion stats: closed-day cache size, default timezone, range limits
+    STATS_CACHE_SIZE: int = int(os.getenv("STATS_CACHE_SIZE", "20000"))
+    STATS_DEFAULT_TIMEZONE: str = os.getenv("STATS_DEFAULT_TIMEZONE", "UTC")
+    STATS_RANGE_MAX_DAYS: int = int(os.getenv("STATS_RANGE_MAX_DAYS", "366"))
+    STATS_RANGE_MAX_HOURLY_DAYS: int = int(os.getenv("STATS_RANGE_MAX_HOURLY_DAYS", "31"))
+
     # Default user (for anonymous saves). Must exist in auth.users if foreign key is enforced.
     DEFAULT_USER_ID: str | None = os.getenv("DEFAULT_USER_ID")
 
@@ -1,6 +1,7 @@
 """Supabase client setup with validation."""
 
 import logging
+import threading
 from supabase import create_client
 from app.config import settings
 
@@ -17,6 +18,12 @@ def _init_client():
             "No Supabase key configured. Set SUPABASE_SERVICE_ROLE_KEY (recommended) or SUPABASE_ANON_KEY."
         )
 
+    if not settings.SUPABASE_SERVICE_ROLE_KEY:
+        logger.warning(
+            "No SUPABASE_SERVICE_ROLE_KEY: queries run under row level security, "
+            "so /emotion-stats reads no emotion_daily_rollups rows"
+        )
+
     client = create_client(settings.SUPABASE_URL, key)
     logger.info(
         "Supabase client initialized with %s key",
@@ -25,4 +32,15 @@ def _init_client():
     return client
 
 
-supabase = _init_client()
+_client = None
+_client_lock = threading.Lock()
+
+
+def get_supabase():
+    """Shared Supabase client, created on first use."""
+    global _client
+    if _client is None:
+        with _client_lock:
+            if _client is None:
+                _client = _init_client()
+    return _client
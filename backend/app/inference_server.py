@@ -0,0 +1,278 @@
+"""
+Standalone emotion inference server.
+
+    cd backend
+    python -m app.inference_server --processes 2
+
+Starts INFERENCE_SERVER_PROCESSES worker processes that own the emotion
+model. Web workers (EMOTION_INFERENCE_MODE=server) send them audio through
+app.services.inference_client, so torch never competes with request
+handling for the GIL or cores, and web and inference capacity can be
+scaled separately.
+
+Each worker process:
+
+- is pinned to its own slice of the CPUs (sched_setaffinity), and torch
+  gets one intra-op thread per pinned core unless TORCH_INTRA_OP_THREADS
+  says otherwise;
+- loads the model (memory-mapped, so workers share one copy of the
+  weights) and warms it up before opening its socket;
+- listens on EMOTION_INFERENCE_SOCKET.<index>, with one reader thread per
+  web-worker connection feeding a single inference loop;
+- batches requests from all connections like the in-process batcher
+  (EMOTION_BATCH_MAX_SIZE / EMOTION_BATCH_MAX_WAIT_MS), and reads audio
+  straight from the sender's shared-memory segment.
+
+Connections are authenticated with INFERENCE_SERVER_AUTHKEY (required,
+shared with the web workers), since both ends unpickle what they receive.
+
+The parent restarts a worker if it dies, and removes the sockets on
+SIGTERM/SIGINT.
+"""
+
+import argparse
+import io
+import logging
+import multiprocessing as mp
+import os
+import queue
+import signal
+import threading
+import time
+from collections import OrderedDict
+from multiprocessing.connection import Connection, Listener
+from multiprocessing.shared_memory import SharedMemory
+from app.config import settings
+from app.services.inference_client import attach_shared_memory, authkey, socket_paths
+
+logger = logging.getLogger(__name__)
+
+_MAX_ATTACHED = 256
+
+
+def cpu_slices(processes: int, cores_per_process: int = 0) -> list[list[int]]:
+    """Split the CPUs this process may use into one slice per worker."""
+    cores = sorted(os.sched_getaffinity(0))
+    per = cores_per_process or max(1, len(cores) // processes)
+    return [[cores[(index * per + k) % len(cores)] for k in range(per)] for index in range(processes)]
+
+
+class SegmentReader(io.RawIOBase):
+    """Seekable read-only file over the first `size` bytes of a segment.
+
+    Reads copy straight from shared memory into the caller's buffer
+    (soundfile reads through readinto), so the payload is never copied as
+    a whole. close() releases the view; the segment can't be closed while
+    a reader is open.
+    """
+
+    def __init__(self, segment: SharedMemory, size: int):
+        super().__init__()
+        self._view = segment.buf[:size]
+        self._position = 0
+
+    def readable(self) -> bool:
+        return True
+
+    def seekable(self) -> bool:
+        return True
+
+    def readinto(self, buffer) -> int:
+        count = max(0, min(len(buffer), len(self._view) - self._position))
+        buffer[:count] = self._view[self._position:self._position + count]
+        self._position += count
+        return count
+
+    def seek(self, offset: int, whence: int = io.SEEK_SET) -> int:
+        base = {io.SEEK_SET: 0, io.SEEK_CUR: self._position, io.SEEK_END: len(self._view)}[whence]
+        self._position = max(0, base + offset)
+        return self._position
+
+    def tell(self) -> int:
+        return self._position
+
+    def close(self) -> None:
+        if not self.closed:
+            self._view.release()
+        super().close()
+
+
+class _Segments:
+    """Attached shared-memory segments, kept open while senders reuse them."""
+
+    def __init__(self, capacity: int):
+        self.capacity = capacity
+        self._segments: OrderedDict[str, SharedMemory] = OrderedDict()
+
+    def read(self, name: str, size: int) -> SegmentReader:
+        """The audio in place; close the reader before the reply is sent
+        (the sender reuses the segment once it has its reply)."""
+        segment = self._segments.get(name)
+        if segment is None:
+            segment = attach_shared_memory(name)
+            self._segments[name] = segment
+            while len(self._segments) > self.capacity:
+                self._segments.popitem(last=False)[1].close()
+        self._segments.move_to_end(name)
+        return SegmentReader(segment, size)
+
+    def forget(self, name: str) -> None:
+        segment = self._segments.pop(name, None)
+        if segment is not None:
+            segment.close()
+
+
+def _receive(conn: Connection, lock: threading.Lock, requests: queue.Queue):
+    """Forward one web worker's requests to the inference loop."""
+    while True:
+        try:
+            kind, request_id, name, size = conn.recv()
+        except (EOFError, OSError):
+            break
+        requests.put((conn, lock, kind, request_id, name, size))
+    conn.close()
+
+
+def _accept(listener: Listener, requests: queue.Queue):
+    while True:
+        try:
+            conn = listener.accept()
+        except Exception as exc:
+            logger.warning("Rejected inference client: %s", exc)
+            continue
+        threading.Thread(target=_receive, args=(conn, threading.Lock(), requests), daemon=True).start()
+
+
+def _collect(requests: queue.Queue, max_size: int, max_wait: float) -> list:
+    batch = [requests.get()]
+    deadline = time.monotonic() + max_wait
+    while len(batch) < max_size:
+        timeout = deadline - time.monotonic()
+        if timeout <= 0:
+            break
+        try:
+            batch.append(requests.get(timeout=timeout))
+        except queue.Empty:
+            break
+    return batch
+
+
+def _reply(conn: Connection, lock: threading.Lock, request_id: int, result):
+    if isinstance(result, Exception):
+        message = ("error", request_id, str(result))
+    else:
+        message = ("ok", request_id, result)
+    try:
+        with lock:
+            conn.send(message)
+    except OSError:
+        pass  # client went away
+
+
+def _handle(model, segments: _Segments, batch: list):
+    from app.services.segmenter import analyze_long_audio
+
+    short, audios, transcribe = [], [], []
+    for conn, lock, kind, request_id, name, size in batch:
+        try:
+            audio = segments.read(name, size)
+        except Exception as exc:
+            segments.forget(name)
+            _reply(conn, lock, request_id, RuntimeError(f"Cannot read audio segment: {exc}"))
+            continue
+
+        if kind == "analyze":
+            try:
+                result = analyze_long_audio(audio, model)
+            except Exception as exc:
+                result = RuntimeError(f"Emotion detection error: {exc}")
+            audio.close()
+            _reply(conn, lock, request_id, result)
+        else:
+            short.append((conn, lock, request_id))
+            audios.append(audio)
+            transcribe.append(kind == "transcribe")
+
+    if audios:
+        try:
+            results = model.predict_batch(audios, transcribe)
+        except Exception as exc:
+            logger.error("Emotion batch failed: %s", exc, exc_info=True)
+            results = [RuntimeError(f"Emotion detection error: {exc}")] * len(audios)
+        for audio in audios:
+            audio.close()
+        for (conn, lock, request_id), result in zip(short, results):
+            _reply(conn, lock, request_id, result)
+
+
+def serve_worker(index: int, cores: list[int], path: str):
+    """Entry point of one inference process."""
+    logging.basicConfig(level=logging.INFO, format=f"%(asctime)s [inference-{index}] %(message)s")
+    os.sched_setaffinity(0, cores)
+    if not settings.TORCH_INTRA_OP_THREADS:
+        settings.TORCH_INTRA_OP_THREADS = len(cores)
+
+    from app.services.emotion import get_emotion_service
+
+    started = time.perf_counter()
+    model = get_emotion_service()
+    if settings.EMOTION_WARMUP:
+        model.warmup()
+    logger.info("Model ready in %.2fs on cores %s", time.perf_counter() - started, cores)
+
+    if os.path.exists(path):
+        os.unlink(path)
+    listener = Listener(path, family="AF_UNIX", authkey=authkey())
+    requests: queue.Queue = queue.Queue()
+    threading.Thread(target=_accept, args=(listener, requests), daemon=True).start()
+    logger.info("Listening on %s", path)
+
+    segments = _Segments(_MAX_ATTACHED)
+    max_wait = max(0.0, settings.EMOTION_BATCH_MAX_WAIT_MS) / 1000
+    while True:
+        _handle(model, segments, _collect(requests, max(1, settings.EMOTION_BATCH_MAX_SIZE), max_wait))
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Emotion inference server")
+    parser.add_argument("--processes", type=int, default=settings.INFERENCE_SERVER_PROCESSES)
+    parser.add_argument("--socket", default=settings.EMOTION_INFERENCE_SOCKET)
+    parser.add_argument(
+        "--cores-per-process", type=int, default=settings.INFERENCE_SERVER_CORES_PER_PROCESS,
+        help="CPUs pinned to each process (0 = split evenly)",
+    )
+    args = parser.parse_args()
+    logging.basicConfig(level=logging.INFO)
+    authkey()  # refuse to start without a shared secret
+
+    ctx = mp.get_context("spawn")
+    paths = socket_paths(args.socket, args.processes)
+    slices = cpu_slices(args.processes, args.cores_per_process)
+
+    def start(index: int):
+        process = ctx.Process(target=serve_worker, args=(index, slices[index], paths[index]), daemon=True)
+        process.start()
+        return process
+
+    processes = [start(index) for index in range(args.processes)]
+    stopping = threading.Event()
+    for signum in (signal.SIGTERM, signal.SIGINT):
+        signal.signal(signum, lambda *_: stopping.set())
+
+    while not stopping.wait(1.0):
+        for index, process in enumerate(processes):
+            if not process.is_alive():
+                logger.warning("Inference worker %d exited (%s), restarting", index, process.exitcode)
+                processes[index] = start(index)
+
+    for process in processes:
+        process.terminate()
+    for process in processes:
+        process.join(timeout=5)
+    for path in paths:
+        if os.path.exists(path):
+            os.unlink(path)
+
+
+if __name__ == "__main__":
+    main()
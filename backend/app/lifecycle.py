@@ -0,0 +1,100 @@
+"""
+Service startup and readiness.
+
+uvicorn binds the port right away; the heavy services are then built by a
+background task started from the FastAPI lifespan:
+
+    supabase -> chatbot -> emotion_model -> emotion_warmup
+
+(or supabase -> chatbot -> inference_server when EMOTION_INFERENCE_MODE=server).
+
+Each phase is timed. /health only says the process is alive, while /ready
+returns 503 until every phase has finished (or names the phase that
+failed). A request that arrives before the task is done doesn't fail: the
+service getters build what it needs on first use, and the startup task
+waits for the same lock.
+"""
+
+import asyncio
+import logging
+import time
+from app.config import settings
+from app.services.executors import run_inference, run_io
+
+logger = logging.getLogger(__name__)
+
+
+class Startup:
+    """Tracks the background startup task and its phase timings."""
+
+    def __init__(self):
+        self.state = "starting"  # starting | ready | failed
+        self.phases: dict[str, float] = {}
+        self.error: str | None = None
+        self._started_at = time.perf_counter()
+        self._task: asyncio.Task | None = None
+
+    @property
+    def ready(self) -> bool:
+        return self.state == "ready"
+
+    def start(self) -> None:
+        self._started_at = time.perf_counter()
+        self._task = asyncio.create_task(self._run())
+
+    async def stop(self) -> None:
+        if self._task is not None and not self._task.done():
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+
+    def status(self) -> dict:
+        status = {
+            "status": self.state,
+            "phases": {name: round(seconds, 3) for name, seconds in self.phases.items()},
+            "uptime": round(time.perf_counter() - self._started_at, 3),
+        }
+        if self.error:
+            status["error"] = self.error
+        return status
+
+    async def _phase(self, name: str, run):
+        started = time.perf_counter()
+        try:
+            await run()
+        except Exception as exc:
+            self.state = "failed"
+            self.error = f"{name}: {exc}"
+            raise
+        finally:
+            self.phases[name] = time.perf_counter() - started
+        logger.info("Startup phase %s took %.2fs", name, self.phases[name])
+
+    async def _run(self):
+        from app.db import get_supabase
+        from app.services.chatbot import get_chatbot_service
+        from app.services.emotion import get_emotion_service
+        from app.services.inference_client import get_inference_client
+
+        try:
+            if settings.SERVICES_PRELOAD:
+                await self._phase("supabase", lambda: run_io(get_supabase))
+                await self._phase("chatbot", lambda: run_io(get_chatbot_service))
+                if settings.EMOTION_INFERENCE_MODE == "server":
+                    # The inference server loads and warms up the model itself
+                    await self._phase("inference_server", lambda: run_io(get_inference_client().connect))
+                else:
+                    await self._phase("emotion_model", lambda: run_inference(get_emotion_service))
+                    if settings.EMOTION_WARMUP:
+                        await self._phase("emotion_warmup", lambda: run_inference(get_emotion_service().warmup))
+        except Exception as exc:
+            logger.error("Startup failed: %s", exc, exc_info=True)
+            return
+
+        self.state = "ready"
+        logger.info("Startup complete in %.2fs", sum(self.phases.values()))
+
+
+startup = Startup()
@@ -2,13 +2,56 @@
 FastAPI application entry point
 """
 
-from fastapi import FastAPI
+import hmac
+from contextlib import asynccontextmanager
+from fastapi import FastAPI, Header, HTTPException
 from fastapi.middleware.cors import CORSMiddleware
+from fastapi.responses import JSONResponse, PlainTextResponse
+from app.api.routes import router
+from app.config import settings
+from app.lifecycle import startup
+from app.request_context import RequestContextMiddleware, configure_logging
+from app.upload_guard import MULTIPART_OVERHEAD, UploadGuardMiddleware
+from app.services.metrics import REGISTRY
+
+configure_logging(settings.LOG_LEVEL)
+
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    from app.services.persistence import message_writer
+
+    message_writer.start()
+    # Models and clients load in the background; /ready reports progress
+    startup.start()
+
+    yield
+
+    from app.services.batching import get_emotion_batcher
+    from app.services.executors import shutdown_executors
+    from app.services.inference_client import get_inference_client
+
+    await startup.stop()
+    await get_emotion_batcher().close()
+    get_inference_client().close()
+    # Flush queued messages before the process exits
+    message_writer.close()
+    shutdown_executors()
+
 
 # Create app first - minimal, test if it works
 app = FastAPI(
     title="Thera.py API",
     version="1.0.0",
+    lifespan=lifespan,
+)
+
+# Reject oversize / non-audio uploads before their body is read (inside CORS,
+# so rejections still carry the CORS headers)
+app.add_middleware(
+    UploadGuardMiddleware,
+    paths=("/chat", "/chat/stream"),
+    max_body=settings.MAX_AUDIO_SIZE + MULTIPART_OVERHEAD,
 )
 
 # Add CORS
@@ -18,7 +61,10 @@ app.add_middleware(
     allow_credentials=True,
     allow_methods=["*"],
     allow_headers=["*"],
+    expose_headers=["X-Request-ID"],
 )
+# Added last so it wraps everything, CORS included
+app.add_middleware(RequestContextMiddleware)
 
 
 # Basic endpoints
@@ -29,16 +75,30 @@ async def root():
 
 @app.get("/health")
 async def health():
+    """Liveness: the process is up (models may still be loading)."""
     return {"status": "healthy"}
 
 
-# Try importing routes if possible
-try:
-    from app.api.routes import router
+@app.get("/ready")
+async def ready():
+    """Readiness: 200 once every service is built and warmed up, else 503."""
+    return JSONResponse(startup.status(), status_code=200 if startup.ready else 503)
+
+
+@app.get("/metrics")
+async def metrics(authorization: str = Header(default=None)):
+    """Prometheus text format: stage latencies, LLM routing, caches, queues.
+
+    Requires the METRICS_TOKEN bearer token; 404 when no token is configured.
+    """
+    if not settings.METRICS_TOKEN:
+        raise HTTPException(status_code=404, detail="Not Found")
+    if not hmac.compare_digest(authorization or "", f"Bearer {settings.METRICS_TOKEN}"):
+        raise HTTPException(status_code=401, detail="Invalid token", headers={"WWW-Authenticate": "Bearer"})
+    return PlainTextResponse(REGISTRY.render(), media_type="text/plain; version=0.0.4")
+
 
-    app.include_router(router)
-except Exception as e:
-    print(f"Warning: Could not load routes: {e}")
+app.include_router(router)
 
 if __name__ == "__main__":
     import uvicorn
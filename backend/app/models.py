@@ -6,12 +6,22 @@ from pydantic import BaseModel
 from typing import Optional
 
 
+class EmotionSegment(BaseModel):
+    """Emotion of one window of a long recording."""
+    start: float
+    end: float
+    emotion: str
+    confidence: float
+    speech_ratio: Optional[float] = None
+
+
 class ChatResponse(BaseModel):
     """Standard chat response format."""
     user_text: str
     reply_text: str
     emotion: str
     confidence: Optional[float] = None
+    segments: Optional[list[EmotionSegment]] = None
 
 
 class HealthResponse(BaseModel):
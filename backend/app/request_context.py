@@ -0,0 +1,84 @@
+"""
+Request id propagation and per-request timing.
+
+RequestContextMiddleware gives every HTTP request an id. It takes the
+client's X-Request-ID if present, otherwise generates one. The id is:
+
+- stored in a contextvar, which the executors copy into the worker
+  threads (see app.services.executors);
+- returned in the X-Request-ID response header;
+- added to every log line by RequestIdFilter.
+
+The middleware also records the request latency histogram, keyed by route
+template so ids in paths don't blow up cardinality.
+"""
+
+import logging
+import time
+import uuid
+from contextvars import ContextVar
+from app.services.metrics import REQUEST_SECONDS
+
+request_id_var: ContextVar[str] = ContextVar("request_id", default="-")
+
+LOG_FORMAT = "%(asctime)s %(levelname)s [%(request_id)s] %(name)s: %(message)s"
+
+
+class RequestIdFilter(logging.Filter):
+    def filter(self, record: logging.LogRecord) -> bool:
+        record.request_id = request_id_var.get()
+        return True
+
+
+def configure_logging(level: str = "INFO") -> None:
+    """Root handler with the request id in every line (idempotent)."""
+    root = logging.getLogger()
+    if any(isinstance(f, RequestIdFilter) for h in root.handlers for f in h.filters):
+        return
+    handler = logging.StreamHandler()
+    handler.setFormatter(logging.Formatter(LOG_FORMAT))
+    handler.addFilter(RequestIdFilter())
+    root.addHandler(handler)
+    root.setLevel(level.upper())
+
+
+class RequestContextMiddleware:
+    """Pure ASGI middleware (no per-request task or body buffering, safe for SSE)."""
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            return await self.app(scope, receive, send)
+
+        request_id = None
+        for name, value in scope.get("headers", ()):
+            if name == b"x-request-id":
+                request_id = value.decode("latin-1")[:64]
+                break
+        request_id = request_id or uuid.uuid4().hex[:16]
+        token = request_id_var.set(request_id)
+
+        started = time.perf_counter()
+        status = 500
+
+        async def send_with_id(message):
+            nonlocal status
+            if message["type"] == "http.response.start":
+                status = message["status"]
+                message.setdefault("headers", [])
+                message["headers"] = [*message["headers"], (b"x-request-id", request_id.encode("latin-1"))]
+            await send(message)
+
+        try:
+            await self.app(scope, receive, send_with_id)
+        finally:
+            route = scope.get("route")
+            REQUEST_SECONDS.observe(
+                time.perf_counter() - started,
+                method=scope["method"],
+                route=getattr(route, "path", "unmatched"),
+                status=status,
+            )
+            request_id_var.reset(token)
@@ -1,13 +1,18 @@
 """
 Services package.
+
+Heavy services (model weights, API clients) are built on first use through
+these getters, or ahead of time by the startup task in app.lifecycle.
 """
 
-from app.services.emotion import emotion_service
-from app.services.chatbot import chatbot_service
+from app.services.emotion import get_emotion_service
+from app.services.batching import get_emotion_batcher
+from app.services.chatbot import get_chatbot_service
 from app.services.storage import storage_service
 
 __all__ = [
-    "emotion_service",
-    "chatbot_service",
+    "get_emotion_service",
+    "get_emotion_batcher",
+    "get_chatbot_service",
     "storage_service",
 ]
@@ -0,0 +1,174 @@
+"""
+Server-side decode of compressed uploads (Opus, Vorbis, FLAC, MP3, AAC).
+
+Opus speech is roughly a tenth the size of the 16-bit PCM the frontend
+used to send, so on slow uplinks /chat spends much less time receiving the
+upload. decode_to_wav() turns such an upload into a 16 kHz mono float32
+WAV in a spooled temp file. The emotion pipeline then reads it like any
+WAV upload, and AudioFrontend.decode_into() takes its no-conversion path
+straight into the batch row.
+
+- Ogg (Opus, Vorbis), FLAC and MP3 are read with libsndfile (soundfile)
+  one block at a time. Each block is resampled with the same windowed-sinc
+  kernel AudioFrontend uses (see StreamResampler).
+- WebM and MP4 (Chrome and Safari MediaRecorder) need PyAV. FFmpeg
+  demuxes and decodes them, and libswresample converts to 16 kHz mono
+  float.
+
+CPU and memory are bounded:
+
+- Decoding runs on the decode pool (executors.run_decode), never on the
+  event loop or the inference pool.
+- It stops after AUDIO_DECODE_MAX_SECONDS. A 25 MB Opus upload is hours
+  of audio and must not pin a core.
+- Working memory is one decode block plus the resampler context. The
+  output spools to disk past 1 MB.
+"""
+
+import logging
+import tempfile
+from typing import BinaryIO
+import numpy as np
+import soundfile as sf
+import torch
+import torchaudio
+from app.config import settings
+from app.services.audio_frontend import DECODE_BLOCK_SECONDS, SAMPLE_RATE
+from app.services.audio_input import AudioSource, open_audio
+
+logger = logging.getLogger(__name__)
+
+SPOOL_SIZE = 1024 * 1024
+
+
+class AudioDecodeError(ValueError):
+    """The upload looked like a supported container but could not be decoded."""
+
+
+class StreamResampler:
+    """Block-by-block resampling to 16 kHz, identical to resampling the
+    whole signal with torchaudio.transforms.Resample.
+
+    Each output frame of the sinc kernel reads `width` input samples on
+    either side. Blocks are therefore resampled with `context` samples of
+    the previous and next input around them, cut at multiples of the
+    kernel stride, and only the frames whose whole window was available
+    are emitted.
+    """
+
+    def __init__(self, sample_rate: int):
+        self.resampler = torchaudio.transforms.Resample(sample_rate, SAMPLE_RATE)
+        self.stride = sample_rate // self.resampler.gcd
+        self.outputs_per_stride = SAMPLE_RATE // self.resampler.gcd
+        self.context = (self.resampler.width // self.stride + 2) * self.stride
+        self.pending = torch.empty(0)
+        self.emitted = 0  # leading samples of `pending` kept only as left context
+
+    def push(self, block: np.ndarray) -> torch.Tensor:
+        self.pending = torch.cat([self.pending, torch.from_numpy(block)])
+        ready = (len(self.pending) - self.emitted - self.context) // self.stride * self.stride
+        if ready <= 0:
+            return self.pending[:0]
+        end = self.emitted + ready
+        out = self._frames(self.pending[: end + self.context], self.emitted, end)
+        keep = min(end, self.context)
+        self.pending = self.pending[end - keep:]
+        self.emitted = keep
+        return out
+
+    def flush(self) -> torch.Tensor:
+        if len(self.pending) <= self.emitted:
+            return self.pending[:0]
+        out = self._frames(self.pending, self.emitted, None)
+        self.pending, self.emitted = self.pending[:0], 0
+        return out
+
+    def _frames(self, waveform: torch.Tensor, start: int, end: int | None) -> torch.Tensor:
+        out = self.resampler(waveform)
+        first = start // self.stride * self.outputs_per_stride
+        last = None if end is None else end // self.stride * self.outputs_per_stride
+        return out[first:last]
+
+
+class _WavWriter:
+    """16 kHz mono float32 WAV in a spooled temp file, capped at max_samples."""
+
+    def __init__(self, max_samples: int):
+        self.file = tempfile.SpooledTemporaryFile(max_size=SPOOL_SIZE)
+        self.wav = sf.SoundFile(self.file, "w", SAMPLE_RATE, 1, "FLOAT", format="WAV")
+        self.remaining = max_samples
+
+    @property
+    def full(self) -> bool:
+        return self.remaining <= 0
+
+    def write(self, samples) -> None:
+        samples = samples[: self.remaining]
+        if len(samples):
+            self.wav.write(np.asarray(samples, dtype=np.float32))
+            self.remaining -= len(samples)
+
+    def close(self) -> BinaryIO:
+        self.wav.close()
+        self.file.seek(0)
+        return self.file
+
+    def discard(self) -> None:
+        self.wav.close()
+        self.file.close()
+
+
+def _decode_soundfile(source: BinaryIO, out: _WavWriter) -> None:
+    with sf.SoundFile(source) as f:
+        block = np.empty((max(1, int(DECODE_BLOCK_SECONDS * f.samplerate)), f.channels), dtype=np.float32)
+        resampler = StreamResampler(f.samplerate) if f.samplerate != SAMPLE_RATE else None
+        while not out.full:
+            chunk = f.read(len(block), dtype="float32", always_2d=True, out=block)
+            if not len(chunk):
+                break
+            mono = chunk.mean(axis=1) if f.channels > 1 else chunk[:, 0]
+            out.write(resampler.push(mono) if resampler else mono)
+        if resampler and not out.full:
+            out.write(resampler.flush())
+
+
+def _decode_av(source: BinaryIO, out: _WavWriter) -> None:
+    import av
+
+    with av.open(source, mode="r") as container:
+        if not container.streams.audio:
+            raise AudioDecodeError("no audio stream")
+        stream = container.streams.audio[0]
+        stream.codec_context.thread_count = 1
+        resampler = av.AudioResampler(format="flt", layout="mono", rate=SAMPLE_RATE)
+        for frame in container.decode(stream):
+            for converted in resampler.resample(frame):
+                out.write(converted.to_ndarray()[0])
+            if out.full:
+                return
+        for converted in resampler.resample(None):
+            out.write(converted.to_ndarray()[0])
+
+
+def decode_to_wav(source: AudioSource, container: str) -> BinaryIO:
+    """Decode a compressed upload (container from audio_format) into a
+    16 kHz mono float32 WAV file, truncated at AUDIO_DECODE_MAX_SECONDS.
+
+    Blocking and CPU-bound; call it through executors.run_decode().
+    """
+    out = _WavWriter(int(settings.AUDIO_DECODE_MAX_SECONDS * SAMPLE_RATE))
+    try:
+        if container in ("webm", "mp4"):
+            _decode_av(open_audio(source), out)
+        else:
+            _decode_soundfile(open_audio(source), out)
+    except Exception as exc:
+        out.discard()
+        if isinstance(exc, AudioDecodeError):
+            raise
+        raise AudioDecodeError(f"{container}: {exc}") from exc
+    wav = out.close()
+
+    if out.full:
+        logger.info(f"Decoded {container} upload truncated at {settings.AUDIO_DECODE_MAX_SECONDS:g}s")
+    return wav
@@ -0,0 +1,190 @@
+"""
+Audio front-end for the emotion model: decode -> mono -> 16 kHz -> log-mel.
+
+Replaces WhisperFeatureExtractor on the hot path:
+
+- The mel filterbank and Hann window are computed once. The filterbank is
+  the same Slaney-normalised bank the Whisper extractor uses.
+- WAV decoding reads from bytes or a file (e.g. a spooled upload), block
+  by block. 16 kHz mono goes straight into the clip's row of the batch;
+  anything else is downmixed into a per-thread buffer, resampled, then
+  copied into the row. Only the first 30 s (max_seconds) are ever
+  decoded, so the decode buffers of one inference thread are bounded by
+  30 s of audio at the source rate, whatever the upload size.
+- Clips that aren't 16 kHz are resampled with a windowed-sinc polyphase
+  resampler. Its kernel is built once per source rate and cached.
+- Clips are copied into a reusable [B, N] waveform batch, and the STFT and
+  log-mel of the whole batch run as single torch ops.
+
+Output matches WhisperFeatureExtractor: per-clip log10 mel clamped to
+(max - 8), scaled as (x + 4) / 4, with N // 160 frames per clip.
+"""
+
+import threading
+import numpy as np
+import soundfile as sf
+import torch
+import torchaudio
+from transformers.audio_utils import mel_filter_bank
+from app.services.audio_input import AudioSource, open_audio
+from app.services.metrics import stage
+
+SAMPLE_RATE = 16000
+N_FFT = 400
+HOP_LENGTH = 160
+N_MELS = 80
+DECODE_BLOCK_SECONDS = 1.0
+
+
+class AudioFrontend:
+    """Batched WAV -> log-mel feature stage."""
+
+    def __init__(self, device: torch.device, max_seconds: float = 30.0):
+        self.device = device
+        self.max_samples = int(max_seconds * SAMPLE_RATE)
+
+        # [80, 201], precomputed once
+        self.mel_filters = torch.from_numpy(
+            mel_filter_bank(
+                num_frequency_bins=1 + N_FFT // 2,
+                num_mel_filters=N_MELS,
+                min_frequency=0.0,
+                max_frequency=8000.0,
+                sampling_rate=SAMPLE_RATE,
+                norm="slaney",
+                mel_scale="slaney",
+            ).T.astype(np.float32)
+        ).to(device)
+        self.window = torch.hann_window(N_FFT, device=device)
+
+        self._resamplers: dict[int, torchaudio.transforms.Resample] = {}
+        self._resampler_lock = threading.Lock()
+        self._local = threading.local()
+
+    # -- buffers ---------------------------------------------------------------
+
+    def _buffer(self, name: str, shape: tuple[int, ...]) -> np.ndarray:
+        """Per-thread reusable float32 array, grown (never shrunk) on demand."""
+        buffer = getattr(self._local, name, None)
+        if buffer is None or buffer.shape[1:] != shape[1:] or buffer.shape[0] < shape[0]:
+            buffer = np.empty(shape, dtype=np.float32)
+            setattr(self._local, name, buffer)
+        return buffer[: shape[0]]
+
+    def _batch_buffer(self, rows: int) -> torch.Tensor:
+        """Per-thread reusable [rows, max_samples] waveform batch."""
+        batch = getattr(self._local, "batch", None)
+        if batch is None or batch.shape[0] < rows:
+            batch = torch.zeros((rows, self.max_samples), dtype=torch.float32)
+            self._local.batch = batch
+        return batch[:rows]
+
+    # -- decode / resample ------------------------------------------------------
+
+    def _resampler(self, sample_rate: int) -> torchaudio.transforms.Resample:
+        with self._resampler_lock:
+            resampler = self._resamplers.get(sample_rate)
+            if resampler is None:
+                resampler = torchaudio.transforms.Resample(sample_rate, SAMPLE_RATE)
+                self._resamplers[sample_rate] = resampler
+            return resampler
+
+    def decode_into(self, source: AudioSource, row: torch.Tensor) -> int:
+        """Decode WAV audio into `row` (a [max_samples] CPU tensor) as 16 kHz
+        mono float32, zero-padded. Returns the number of samples written."""
+        with sf.SoundFile(open_audio(source)) as f:
+            sample_rate, channels = f.samplerate, f.channels
+            frames = min(f.frames, -(-self.max_samples * sample_rate // SAMPLE_RATE))
+
+            if sample_rate == SAMPLE_RATE and channels == 1:
+                # Fast path: no conversion, decode straight into the batch row
+                read = len(f.read(frames, dtype="float32", out=row.numpy()[:frames]))
+                row[read:].zero_()
+                return read
+
+            # Downmix block by block into one native-rate buffer, then resample
+            mono = self._buffer("mono", (frames,))
+            block = self._buffer("block", (max(1, int(DECODE_BLOCK_SECONDS * sample_rate)), channels))
+            read = 0
+            while read < frames:
+                chunk = f.read(min(len(block), frames - read), dtype="float32", always_2d=True, out=block)
+                if not len(chunk):
+                    break
+                if channels > 1:
+                    np.mean(chunk, axis=1, out=mono[read:read + len(chunk)])
+                else:
+                    mono[read:read + len(chunk)] = chunk[:, 0]
+                read += len(chunk)
+
+        waveform = self.resample(torch.from_numpy(mono[:read]), sample_rate)[: self.max_samples]
+        self._fill_row(row, waveform)
+        return len(waveform)
+
+    # -- features ---------------------------------------------------------------
+
+    def log_mel(self, waveforms: torch.Tensor) -> torch.Tensor:
+        """[B, N] 16 kHz waveforms -> [B, 80, N // 160] Whisper log-mel."""
+        waveforms = waveforms.to(self.device, non_blocking=True)
+        stft = torch.stft(waveforms, N_FFT, HOP_LENGTH, window=self.window, return_complex=True)
+        magnitudes = stft[..., :-1].abs() ** 2
+
+        mel = self.mel_filters @ magnitudes
+        log_spec = torch.clamp(mel, min=1e-10).log10()
+        peak = log_spec.amax(dim=(1, 2), keepdim=True)
+        log_spec = torch.maximum(log_spec, peak - 8.0)
+        return (log_spec + 4.0) / 4.0
+
+    def features(self, audios: list[AudioSource], pad_to_max: bool = True) -> list[torch.Tensor | Exception]:
+        """Log-mel features [80, T] per clip, or the decode error for that clip.
+
+        pad_to_max pads every clip to max_samples (Whisper's fixed 30 s
+        input, T = 3000). Otherwise each clip keeps its own length and the
+        batch is only as long as its longest clip.
+        """
+        results: list[torch.Tensor | Exception | None] = [None] * len(audios)
+        batch = self._batch_buffer(len(audios))
+        decoded: list[tuple[int, int]] = []  # (clip index, samples)
+
+        with stage("decode"):
+            for i, source in enumerate(audios):
+                try:
+                    samples = self.decode_into(source, batch[len(decoded)])
+                    if samples == 0:
+                        raise ValueError("audio has no samples")
+                except Exception as exc:
+                    results[i] = exc
+                    continue
+                decoded.append((i, samples))
+
+        for (i, _), features in zip(decoded, self._batch_features(batch, [n for _, n in decoded], pad_to_max)):
+            results[i] = features
+        return results
+
+    def features_from_waveforms(self, waveforms: list[torch.Tensor], pad_to_max: bool = True) -> list[torch.Tensor]:
+        """Same as features(), for already decoded 16 kHz mono waveforms."""
+        batch = self._batch_buffer(len(waveforms))
+        for row, waveform in zip(batch, waveforms):
+            self._fill_row(row, waveform[: self.max_samples])
+        return self._batch_features(batch, [min(len(w), self.max_samples) for w in waveforms], pad_to_max)
+
+    @staticmethod
+    def _fill_row(row: torch.Tensor, waveform: torch.Tensor) -> None:
+        row[: len(waveform)].copy_(waveform)
+        row[len(waveform):].zero_()
+
+    def _batch_features(self, batch: torch.Tensor, lengths: list[int], pad_to_max: bool) -> list[torch.Tensor]:
+        if not lengths:
+            return []
+        samples = self.max_samples if pad_to_max else max(lengths)
+        with stage("features"):
+            mel = self.log_mel(batch[: len(lengths), :samples])
+        return [
+            mel[row, :, : (samples if pad_to_max else n) // HOP_LENGTH]
+            for row, n in enumerate(lengths)
+        ]
+
+    def resample(self, waveform: torch.Tensor, sample_rate: int) -> torch.Tensor:
+        """Resample a mono waveform to 16 kHz with the cached resampler."""
+        if sample_rate == SAMPLE_RATE:
+            return waveform
+        return self._resampler(sample_rate)(waveform)
@@ -0,0 +1,102 @@
+"""
+Audio sources and upload intake.
+
+The emotion pipeline reads audio from an `AudioSource`: either bytes, or a
+seekable binary file such as the upload that Starlette's multipart parser
+spooled (in memory up to 1 MB, on disk beyond). /chat passes the spooled
+file straight through, so an upload is never materialised as one `bytes`
+object:
+
+- the route sniffs the container from the first bytes (see audio_format),
+  then hashes the file in CHUNK_SIZE reads for the cache key;
+- compressed uploads (Opus/Vorbis in Ogg or WebM, FLAC, MP3, AAC) are
+  decoded to a 16 kHz mono float32 WAV on the decode pool first (see
+  audio_decode); WAV goes through as is;
+- AudioFrontend.decode_into() decodes in blocks into per-thread buffers
+  and the batch row;
+- long recordings are windowed block by block (segmenter), and server mode
+  copies the file into shared memory in chunks.
+
+Per request that leaves at most 1 MB of spooled upload in memory plus one
+hashing chunk. Decode buffers belong to the inference threads, not to
+requests (see audio_frontend).
+"""
+
+import hashlib
+import importlib.util
+import io
+import os
+from typing import BinaryIO, Union
+from app.config import settings
+
+AudioSource = Union[bytes, BinaryIO]
+
+CHUNK_SIZE = 64 * 1024
+HEADER_SIZE = 12
+
+# libsndfile reads Ogg (Opus, Vorbis), FLAC and MP3; WebM and MP4 need PyAV
+SUPPORTED_FORMATS = {"wav", "ogg", "flac", "mp3"}
+if importlib.util.find_spec("av") is not None:
+    SUPPORTED_FORMATS |= {"webm", "mp4"}
+
+# Browsers label MediaRecorder output with codec parameters
+# ("audio/webm;codecs=opus"); only the media type is checked here, the
+# container itself is sniffed from the first bytes.
+AUDIO_CONTENT_TYPES = {
+    "audio/wav", "audio/x-wav", "audio/wave",
+    "audio/ogg", "audio/opus", "audio/webm", "video/webm",
+    "audio/flac", "audio/x-flac", "audio/mpeg", "audio/mp3",
+    "audio/mp4", "audio/x-m4a", "audio/aac", "video/mp4",
+}
+
+UNSUPPORTED_AUDIO = "Định dạng audio không được hỗ trợ (WAV, OGG/Opus, WebM, FLAC, MP3)"
+TOO_LARGE = f"File quá lớn (max {settings.MAX_AUDIO_SIZE / (1024*1024):.0f}MB)"
+
+
+def audio_format(header: bytes) -> str | None:
+    """Container format from the first HEADER_SIZE bytes, None if unsupported."""
+    if header[:4] in (b"RIFF", b"RF64") and header[8:12] == b"WAVE":
+        container = "wav"
+    elif header[:4] == b"OggS":
+        container = "ogg"
+    elif header[:4] == b"\x1a\x45\xdf\xa3":  # EBML: WebM / Matroska
+        container = "webm"
+    elif header[:4] == b"fLaC":
+        container = "flac"
+    elif header[4:8] == b"ftyp":
+        container = "mp4"
+    elif header[:3] == b"ID3" or (len(header) > 1 and header[0] == 0xFF and header[1] & 0xE0 == 0xE0 and header[1] & 0x06):
+        container = "mp3"  # MPEG frame sync; layer 0 would be AAC (ADTS)
+    else:
+        return None
+    return container if container in SUPPORTED_FORMATS else None
+
+
+def is_audio_content_type(content_type: str | None) -> bool:
+    media_type = (content_type or "").split(";")[0].strip().lower()
+    return media_type in AUDIO_CONTENT_TYPES
+
+
+def open_audio(source: AudioSource) -> BinaryIO:
+    """A file positioned at the start of the audio."""
+    if isinstance(source, (bytes, bytearray, memoryview)):
+        return io.BytesIO(source)
+    source.seek(0)
+    return source
+
+
+def audio_size(source: AudioSource) -> int:
+    if isinstance(source, (bytes, bytearray, memoryview)):
+        return len(source)
+    return source.seek(0, os.SEEK_END)
+
+
+def audio_digest(source: AudioSource) -> str:
+    """blake2b of the audio, read in chunks for files."""
+    if isinstance(source, (bytes, bytearray, memoryview)):
+        return hashlib.blake2b(source, digest_size=16).hexdigest()
+    digest = hashlib.blake2b(digest_size=16)
+    f = open_audio(source)
+    while chunk := f.read(CHUNK_SIZE):
+        digest.update(chunk)
+    return digest.hexdigest()
@@ -1,11 +1,111 @@
-from app.db import supabase
+"""Resolve the user id behind a Supabase access token.
+
+Tokens are verified locally (signature + exp) whenever a key is available:
+HS256 tokens with SUPABASE_JWT_SECRET, asymmetric tokens with the project's
+JWKS, whose keys are fetched once and cached. Verified ids are kept in a
+bounded TTL cache keyed by a hash of the token. supabase.auth.get_user is
+only called when a token cannot be checked locally.
+"""
+
+import hashlib
+import logging
+import time
+import jwt
+from app.config import settings
+from app.db import get_supabase
+from app.services.cache import TTLCache
+from app.services.metrics import register_cache, stage
+
+logger = logging.getLogger(__name__)
+
+_ASYMMETRIC_ALGORITHMS = {"RS256", "ES256"}
+
+_jwks_client = (
+    jwt.PyJWKClient(
+        f"{settings.SUPABASE_URL.rstrip('/')}/auth/v1/.well-known/jwks.json",
+        cache_keys=True,
+        lifespan=settings.AUTH_JWKS_TTL,
+    )
+    if settings.SUPABASE_URL
+    else None
+)
+
+token_cache = TTLCache(maxsize=settings.AUTH_CACHE_SIZE, ttl=settings.AUTH_CACHE_TTL)
+register_cache("auth_token", token_cache.stats)
+
+
+def _signing_key(token: str, algorithm: str):
+    """Return the key to verify this token with, or None if we have none."""
+    if algorithm == "HS256":
+        return settings.SUPABASE_JWT_SECRET or None
+
+    if algorithm in _ASYMMETRIC_ALGORITHMS and _jwks_client is not None:
+        try:
+            return _jwks_client.get_signing_key_from_jwt(token).key
+        except jwt.PyJWKClientError as exc:
+            logger.warning("JWKS lookup failed, using remote auth: %s", exc)
+
+    return None
+
+
+def _verify_locally(token: str) -> tuple[str, float] | None:
+    """Return (user_id, exp) for a valid token, None if it can't be checked locally.
+
+    Raises jwt.InvalidTokenError if the token is checked and rejected.
+    """
+    algorithm = jwt.get_unverified_header(token).get("alg")
+    key = _signing_key(token, algorithm)
+    if key is None:
+        return None
+
+    claims = jwt.decode(
+        token,
+        key,
+        algorithms=[algorithm],
+        audience=settings.SUPABASE_JWT_AUDIENCE,
+        options={"require": ["exp", "sub"]},
+    )
+    return claims["sub"], claims["exp"]
+
+
+def _verify_remotely(token: str) -> tuple[str, float | None]:
+    res = get_supabase().auth.get_user(token)
+    if not res.user:
+        raise RuntimeError("Invalid token")
+
+    # Still bound the cache entry by the token's own expiry
+    exp = jwt.decode(token, options={"verify_signature": False}).get("exp")
+    return res.user.id, exp
+
 
 def get_user_id_from_token(token: str) -> str:
+    with stage("auth"):
+        return _resolve_user_id(token)
+
+
+def _resolve_user_id(token: str) -> str:
     if token.lower().startswith("bearer "):
         token = token[7:]
 
-    res = supabase.auth.get_user(token)
-    if not res.user:
-        raise RuntimeError("Invalid token")
+    cache_key = hashlib.sha256(token.encode()).digest()
+    user_id = token_cache.get(cache_key)
+    if user_id is not None:
+        return user_id
+
+    try:
+        verified = _verify_locally(token)
+    except jwt.InvalidTokenError as exc:
+        raise RuntimeError(f"Invalid token: {exc}")
+
+    if verified is None:
+        user_id, exp = _verify_remotely(token)
+    else:
+        user_id, exp = verified
+
+    ttl = settings.AUTH_CACHE_TTL
+    if exp is not None:
+        ttl = min(ttl, exp - time.time())
+    if ttl > 0:
+        token_cache.set(cache_key, user_id, ttl=ttl)
 
-    return res.user.id
+    return user_id
@@ -0,0 +1,151 @@
+"""
+Dynamic micro-batching for emotion inference.
+
+Concurrent requests are queued and grouped until either
+EMOTION_BATCH_MAX_SIZE items are waiting or EMOTION_BATCH_MAX_WAIT_MS has
+passed since the first one arrived. Each group runs as a single batched
+encoder pass and every caller gets back its own result.
+
+The queue lives as long as the batcher. If the worker task dies, a new
+one is started on the same queue, so clips already waiting are still
+processed; callers in the batch that was running when it died get an
+error rather than waiting forever.
+"""
+
+import asyncio
+import logging
+from app.config import settings
+from app.services.audio_input import AudioSource
+from app.services.emotion import EmotionModel, get_emotion_service
+from app.services.executors import run_inference
+from app.services.metrics import register_queue
+
+logger = logging.getLogger(__name__)
+
+
+class EmotionBatcher:
+    """Groups concurrent predict calls into batched forward passes."""
+
+    def __init__(self, model: EmotionModel | None, max_batch_size: int, max_wait_ms: float):
+        # None: use the shared model, loaded on the inference thread on first use
+        self.model = model
+        self.max_batch_size = max(1, max_batch_size)
+        self.max_wait = max(0.0, max_wait_ms) / 1000
+        self._queue: asyncio.Queue | None = None
+        self._worker: asyncio.Task | None = None
+
+    async def predict(self, audio: AudioSource, transcribe: bool = False) -> dict:
+        """Queue a clip and wait for its {"emotion", "confidence"} result
+        (plus "text" when transcribe is set)."""
+        self._ensure_worker()
+        future = asyncio.get_running_loop().create_future()
+        await self._queue.put((audio, transcribe, future))
+        return await future
+
+    async def close(self):
+        """Stop the batching worker and fail the clips still queued."""
+        if self._worker is not None:
+            worker, self._worker = self._worker, None
+            worker.cancel()
+            try:
+                await worker
+            except asyncio.CancelledError:
+                pass
+        if self._queue is not None:
+            while not self._queue.empty():
+                _fail(self._queue.get_nowait()[-1], RuntimeError("Emotion batcher closed"))
+
+    def _ensure_worker(self):
+        if self._queue is None:
+            self._queue = asyncio.Queue()
+        if self._worker is None or self._worker.done():
+            self._worker = asyncio.create_task(self._run())
+            self._worker.add_done_callback(self._worker_done)
+
+    def _worker_done(self, worker: asyncio.Task):
+        if worker.cancelled() or worker is not self._worker:
+            return
+        logger.error("Emotion batch worker died", exc_info=worker.exception())
+        # Keep serving the clips already queued
+        if not self._queue.empty():
+            self._ensure_worker()
+
+    async def _collect(self) -> list:
+        """Wait for one item, then keep collecting until size or time limit."""
+        loop = asyncio.get_running_loop()
+        batch = [await self._queue.get()]
+        deadline = loop.time() + self.max_wait
+
+        while len(batch) < self.max_batch_size:
+            timeout = deadline - loop.time()
+            if timeout <= 0:
+                break
+            try:
+                batch.append(await asyncio.wait_for(self._queue.get(), timeout))
+            except asyncio.TimeoutError:
+                break
+
+        return batch
+
+    async def _run(self):
+        # The task was created inside the first caller's request; batches
+        # belong to many requests, so don't tag their logs with that one id
+        from app.request_context import request_id_var
+
+        request_id_var.set("batch")
+        batch = []
+        try:
+            while True:
+                batch = [item for item in await self._collect() if not item[-1].cancelled()]
+                if not batch:
+                    continue
+
+                try:
+                    results = await run_inference(
+                        self._run_batch,
+                        [audio for audio, _, _ in batch],
+                        [transcribe for _, transcribe, _ in batch],
+                    )
+                except Exception as exc:
+                    logger.error("Emotion batch failed: %s", exc, exc_info=True)
+                    results = [RuntimeError(f"Emotion detection error: {exc}")] * len(batch)
+
+                for (_, _, future), result in zip(batch, results):
+                    if future.done():
+                        continue
+                    if isinstance(result, Exception):
+                        future.set_exception(result)
+                    else:
+                        future.set_result(result)
+                batch = []
+        finally:
+            # Stopped or crashed mid-batch: don't leave its callers waiting
+            for _, _, future in batch:
+                _fail(future, RuntimeError("Emotion batch worker stopped"))
+
+    def _run_batch(self, audios: list[bytes], transcribe: list[bool]) -> list[dict | Exception]:
+        results = (self.model or get_emotion_service()).predict_batch(audios, transcribe)
+        logger.debug("Emotion batch of %d processed", len(audios))
+        return results
+
+
+def _fail(future: asyncio.Future, exc: Exception) -> None:
+    if not future.done():
+        future.set_exception(exc)
+
+
+_batcher: EmotionBatcher | None = None
+
+
+def get_emotion_batcher() -> EmotionBatcher:
+    """Shared batcher. Only touched from the event loop, so no lock is needed;
+    the model itself is loaded on the inference thread."""
+    global _batcher
+    if _batcher is None:
+        _batcher = EmotionBatcher(
+            None,
+            max_batch_size=settings.EMOTION_BATCH_MAX_SIZE,
+            max_wait_ms=settings.EMOTION_BATCH_MAX_WAIT_MS,
+        )
+        register_queue("emotion_batch", lambda: _batcher._queue.qsize() if _batcher._queue else 0)
+    return _batcher
@@ -1,12 +1,88 @@
 """Utilities for persisting chat messages."""
 
 import logging
-from datetime import date, datetime, timedelta
-from app.db import supabase
+import re
+from collections import deque
+from datetime import date, datetime, time, timedelta, timezone
+from zoneinfo import ZoneInfo
+from app.config import settings
+from app.db import get_supabase
+from app.services.cache import TTLCache
+from app.services.metrics import register_cache, stage
+from app.services.persistence import message_writer
 
 logger = logging.getLogger(__name__)
 
 
+class ConversationCache:
+    """Per-user ring buffer of the most recent messages.
+
+    Filled from Supabase on a miss and kept current by save_message, so a
+    user's next turn doesn't need a history query. Users are evicted LRU
+    once max_users is reached, which bounds memory to roughly
+    max_users * window messages.
+
+    Each process only sees its own writes, which is enough for the single
+    worker we deploy, so a hit costs no database query. With several
+    workers or replicas and no sticky routing, set
+    CONVERSATION_CACHE_VERIFY: each hit is then checked against the newest
+    created_at in the messages table (one indexed single-row query) and the
+    window is refilled if another process has written for the user since.
+    Entries also expire ttl seconds after they were filled.
+    """
+
+    def __init__(self, window: int, max_users: int, ttl: float):
+        self.window = window
+        self._users = TTLCache(maxsize=max_users, ttl=ttl)
+
+    def get(self, user_id: str, limit: int) -> list[dict] | None:
+        """Last `limit` messages (oldest first), or None on a miss."""
+        if limit > self.window:
+            return None
+        messages = self._users.get(user_id)
+        if messages is None:
+            return None
+        return list(messages)[-limit:] if limit > 0 else []
+
+    def fill(self, user_id: str, messages: list[dict]) -> None:
+        """Seed a user's window from the database (oldest first)."""
+        self._users.set(user_id, deque(messages, maxlen=self.window))
+
+    def append(self, user_id: str, message: dict) -> None:
+        """Write-through: record a saved message if the user is cached."""
+        messages = self._users.peek(user_id)
+        if messages is not None:
+            messages.append(message)
+
+    def newest(self, user_id: str) -> str | None:
+        """created_at of the newest message this process knows of for the user."""
+        messages = self._users.peek(user_id)
+        return messages[-1]["created_at"] if messages else None
+
+    def invalidate(self, user_id: str | None = None) -> None:
+        """Drop one user's window, or every window if user_id is None."""
+        if user_id is None:
+            self._users.clear()
+        else:
+            self._users.pop(user_id)
+
+    def stats(self) -> dict:
+        return self._users.stats()
+
+
+conversation_cache = ConversationCache(
+    window=settings.CONVERSATION_CACHE_WINDOW,
+    max_users=settings.CONVERSATION_CACHE_MAX_USERS,
+    ttl=settings.CONVERSATION_CACHE_TTL,
+)
+register_cache("conversation", conversation_cache.stats)
+
+
+def invalidate_conversation(user_id: str | None = None) -> None:
+    """Forget cached history for a user (or everyone)."""
+    conversation_cache.invalidate(user_id)
+
+
 def save_message(
     user_id: str,
     role: str,
@@ -14,28 +90,42 @@ def save_message(
     emotion: str | None = None,
     confidence: float | None = None,
 ):
-    """Insert a message row into the messages table."""
+    """Queue a message row for the messages table.
+
+    The row is written by the background message_writer; created_at is
+    stamped here so per-user ordering doesn't depend on flush timing.
+    """
     if not user_id:
         raise ValueError("user_id is required to save a message")
 
-    try:
-        # Build payload dynamically to avoid inserting NULLs into non-nullable columns
-        payload = {
-            "user_id": user_id,
-            "role": "assistant",
-            "content": content,
-        }
-
-        # Only include optional fields when they have values
-        if emotion is not None:
-            payload["emotion"] = emotion
-        if confidence is not None:
-            payload["confidence"] = confidence
-
-        return supabase.table("messages").insert(payload).execute()
-    except Exception as exc:
-        logger.error("Failed to save message to Supabase: %s", exc, exc_info=True)
-        raise
+    created_at = datetime.now(timezone.utc).isoformat()
+
+    # Build payload dynamically to avoid inserting NULLs into non-nullable columns
+    payload = {
+        "user_id": user_id,
+        "role": role,
+        "content": content,
+        "created_at": created_at,
+    }
+
+    # Only include optional fields when they have values
+    if emotion is not None:
+        payload["emotion"] = emotion
+    if confidence is not None:
+        payload["confidence"] = confidence
+
+    message_writer.enqueue(payload)
+
+    if settings.CONVERSATION_CACHE_ENABLED:
+        conversation_cache.append(
+            user_id,
+            {
+                "role": role,
+                "content": content,
+                "emotion": emotion,
+                "created_at": created_at,
+            },
+        )
 
 
 def get_recent_messages(user_id: str, limit: int = 5) -> list[dict]:
@@ -50,29 +140,242 @@ def get_recent_messages(user_id: str, limit: int = 5) -> list[dict]:
     """
     if not user_id:
         raise ValueError("user_id is required to fetch messages")
-    
+
+    use_cache = settings.CONVERSATION_CACHE_ENABLED and limit <= conversation_cache.window
+    if use_cache:
+        cached = conversation_cache.get(user_id, limit)
+        if cached is not None and (not settings.CONVERSATION_CACHE_VERIFY or _cache_current(user_id)):
+            return cached
+
     try:
-        response = (
-            supabase.table("messages")
-            .select("role, content, emotion, created_at")
-            .eq("user_id", user_id)
-            .order("created_at", desc=True)
-            .limit(limit)
-            .execute()
-        )
+        with stage("supabase_read"):
+            response = (
+                get_supabase().table("messages")
+                .select("role, content, emotion, created_at")
+                .eq("user_id", user_id)
+                .order("created_at", desc=True)
+                .limit(conversation_cache.window if use_cache else limit)
+                .execute()
+            )
         
         # Return reversed so oldest message is first
-        return list(reversed(response.data)) if response.data else []
+        messages = list(reversed(response.data)) if response.data else []
+        if use_cache:
+            conversation_cache.fill(user_id, messages)
+            return messages[-limit:] if limit > 0 else []
+        return messages
     except Exception as exc:
         logger.error("Failed to fetch recent messages: %s", exc, exc_info=True)
         return []
 
-def get_emotion_stats_by_date(user_id: str, target_date: date | str) -> dict:
+def _cache_current(user_id: str) -> bool:
+    """False if the messages table has a row newer than the cached window,
+    i.e. another process wrote for the user since the window was filled."""
+    try:
+        with stage("supabase_read"):
+            response = (
+                get_supabase().table("messages")
+                .select("created_at")
+                .eq("user_id", user_id)
+                .order("created_at", desc=True)
+                .limit(1)
+                .execute()
+            )
+    except Exception as exc:
+        logger.warning("Conversation cache check failed, refetching: %s", exc)
+        return False
+
+    if not response.data:
+        return True
+    cached = conversation_cache.newest(user_id)
+    if cached is None or _parse_timestamp(response.data[0]["created_at"]) > _parse_timestamp(cached):
+        conversation_cache.invalidate(user_id)
+        return False
+    return True
+
+
+EMOTION_KEYS = ("happy", "neutral", "sad", "angry")
+BUCKETS = ("day", "hour")
+
+# A day's rollup stops changing once it is over and the write-behind queue has
+# drained. The grace period covers messages stamped just before midnight but
+# flushed just after.
+_CLOSED_DAY_GRACE = timedelta(minutes=5)
+
+# Closed days never change, so their stats are cached without expiry
+closed_day_stats = TTLCache(maxsize=settings.STATS_CACHE_SIZE)
+register_cache("closed_day_stats", closed_day_stats.stats)
+
+_FRACTION_RE = re.compile(r"\.(\d+)")
+
+
+def _empty_stats() -> dict:
+    return {emotion: 0 for emotion in EMOTION_KEYS}
+
+
+def _is_utc(tz: ZoneInfo) -> bool:
+    return tz.key in ("UTC", "Etc/UTC")
+
+
+def _local_midnight(day: date, tz: ZoneInfo) -> datetime:
+    """Start of a calendar day in tz, as an aware UTC datetime."""
+    return datetime.combine(day, time.min, tzinfo=tz).astimezone(timezone.utc)
+
+
+def _is_closed_day(target_date: date, tz: ZoneInfo) -> bool:
+    day_end = _local_midnight(target_date + timedelta(days=1), tz)
+    return datetime.now(timezone.utc) >= day_end + _CLOSED_DAY_GRACE
+
+
+def _parse_timestamp(value: str) -> datetime:
+    """Parse a Postgres timestamptz string (fromisoformat is strict before 3.11)."""
+    value = value.replace("Z", "+00:00")
+    value = _FRACTION_RE.sub(lambda m: "." + m.group(1)[:6].ljust(6, "0"), value, count=1)
+    return datetime.fromisoformat(value)
+
+
+def _bucket_label(moment: datetime, bucket: str) -> str:
+    return moment.strftime("%Y-%m-%d" if bucket == "day" else "%Y-%m-%dT%H:00")
+
+
+def _bucket_labels(start: date, end: date, bucket: str, tz: ZoneInfo) -> list[str]:
+    """Every bucket label from the start of `start` to the end of `end` in tz."""
+    if bucket == "day":
+        return [(start + timedelta(days=i)).isoformat() for i in range((end - start).days + 1)]
+
+    labels = []
+    moment = _local_midnight(start, tz)
+    stop = _local_midnight(end + timedelta(days=1), tz)
+    while moment < stop:
+        label = _bucket_label(moment.astimezone(tz), bucket)
+        if not labels or labels[-1] != label:
+            labels.append(label)
+        moment += timedelta(hours=1)
+    return labels
+
+
+def _read_rollups(user_id: str, start: date, end: date) -> dict[str, dict]:
+    """Read UTC day rollups (see sql/emotion_daily_rollups.sql) in one query."""
+    with stage("supabase_read"):
+        response = (
+            get_supabase().table("emotion_daily_rollups")
+            .select("day, " + ", ".join(EMOTION_KEYS))
+            .eq("user_id", user_id)
+            .gte("day", start.isoformat())
+            .lte("day", end.isoformat())
+            .execute()
+        )
+    return {
+        row["day"]: {emotion: int(row.get(emotion) or 0) for emotion in EMOTION_KEYS}
+        for row in response.data or []
+    }
+
+
+def _read_grouped(
+    user_id: str, start: date, end: date, bucket: str, tz: ZoneInfo
+) -> dict[str, dict]:
+    """Grouped counts via the emotion_counts_by_bucket RPC."""
+    with stage("supabase_read"):
+        response = get_supabase().rpc(
+            "emotion_counts_by_bucket",
+            {
+                "p_user_id": user_id,
+                "p_start": _local_midnight(start, tz).isoformat(),
+                "p_end": _local_midnight(end + timedelta(days=1), tz).isoformat(),
+                "p_bucket": bucket,
+                "p_tz": tz.key,
+            },
+        ).execute()
+
+    counts = {}
+    for row in response.data or []:
+        label = _bucket_label(_parse_timestamp(row["bucket"]), bucket)
+        stats = counts.setdefault(label, _empty_stats())
+        for emotion in EMOTION_KEYS:
+            stats[emotion] += int(row.get(emotion) or 0)
+    return counts
+
+
+def _count_from_messages(
+    user_id: str, start: date, end: date, bucket: str, tz: ZoneInfo
+) -> dict[str, dict]:
+    """Count emotions by scanning raw message rows (used if the SQL isn't applied)."""
+    with stage("supabase_read"):
+        response = (
+            get_supabase().table("messages")
+            .select("emotion, created_at")
+            .eq("user_id", user_id)
+            .gte("created_at", _local_midnight(start, tz).isoformat())
+            .lt("created_at", _local_midnight(end + timedelta(days=1), tz).isoformat())
+            .execute()
+        )
+
+    counts = {}
+    # Count emotions (only count user messages with emotion data)
+    for msg in response.data or []:
+        emotion = (msg.get("emotion") or "").lower()
+        if emotion not in EMOTION_KEYS:
+            continue
+        label = _bucket_label(_parse_timestamp(msg["created_at"]).astimezone(tz), bucket)
+        counts.setdefault(label, _empty_stats())[emotion] += 1
+    return counts
+
+
+def get_emotion_stats_range(
+    user_id: str,
+    start: date,
+    end: date,
+    bucket: str = "day",
+    tz: str = "UTC",
+) -> dict:
+    """Get per-bucket emotion counts for an inclusive date range.
+
+    Days are calendar days in `tz`. UTC day buckets come straight from the
+    rollup table; anything else is one grouped query over messages.
+
+    Returns:
+        {"start", "end", "bucket", "timezone", "buckets": [label, ...],
+         "counts": {emotion: [count per bucket]}, "totals": {emotion: count}}
+    """
+    if not user_id:
+        raise ValueError("user_id is required to fetch emotion stats")
+    if bucket not in BUCKETS:
+        raise ValueError(f"bucket must be one of {BUCKETS}")
+    if end < start:
+        raise ValueError("end must not be before start")
+    zone = ZoneInfo(tz)
+
+    try:
+        if bucket == "day" and _is_utc(zone):
+            counts = _read_rollups(user_id, start, end)
+        else:
+            counts = _read_grouped(user_id, start, end, bucket, zone)
+    except Exception as exc:
+        # Rollup table / RPC not migrated yet: fall back to the raw scan
+        logger.warning("Grouped stats query failed, counting raw messages: %s", exc)
+        counts = _count_from_messages(user_id, start, end, bucket, zone)
+
+    labels = _bucket_labels(start, end, bucket, zone)
+    series = {emotion: [counts.get(label, {}).get(emotion, 0) for label in labels] for emotion in EMOTION_KEYS}
+
+    return {
+        "start": start.isoformat(),
+        "end": end.isoformat(),
+        "bucket": bucket,
+        "timezone": zone.key,
+        "buckets": labels,
+        "counts": series,
+        "totals": {emotion: sum(values) for emotion, values in series.items()},
+    }
+
+
+def get_emotion_stats_by_date(user_id: str, target_date: date | str, tz: str = "UTC") -> dict:
     """Get emotion statistics for a specific date.
     
     Args:
         user_id: User ID to fetch messages for
         target_date: Date to get stats for (can be date object or string "YYYY-MM-DD")
+        tz: IANA timezone whose calendar day is used (default UTC)
         
     Returns:
         Dictionary with emotion counts: {"happy": 0, "sad": 0, "neutral": 0, "angry": 0}
@@ -85,38 +388,41 @@ def get_emotion_stats_by_date(user_id: str, target_date: date | str) -> dict:
         target_date = datetime.strptime(target_date, "%Y-%m-%d").date()
     elif isinstance(target_date, datetime):
         target_date = target_date.date()
-    
+
+    cache_key = (user_id, target_date, tz)
     try:
-        # Define date range (start and end of day)
-        start_of_day = datetime.combine(target_date, datetime.min.time()).isoformat() + "Z"
-        end_of_day = datetime.combine(target_date, datetime.max.time()).isoformat() + "Z"
-        
-        # Query messages for the date with emotion field
-        response = (
-            supabase.table("messages")
-            .select("emotion")
-            .eq("user_id", user_id)
-            .gte("created_at", start_of_day)
-            .lte("created_at", end_of_day)
-            .execute()
-        )
-        
-        # Initialize emotion counts
-        emotion_counts = {
-            "happy": 0,
-            "neutral": 0,
-            "sad": 0,
-            "angry": 0,
-        }
-        
-        # Count emotions (only count user messages with emotion data)
-        for msg in response.data:
-            if msg.get("emotion"):
-                emotion = msg["emotion"].lower()
-                if emotion in emotion_counts:
-                    emotion_counts[emotion] += 1
-        
-        return emotion_counts
+        closed = _is_closed_day(target_date, ZoneInfo(tz))
+    except Exception as exc:
+        logger.error("Invalid timezone %r: %s", tz, exc)
+        return _empty_stats()
+
+    if closed:
+        cached = closed_day_stats.get(cache_key)
+        if cached is not None:
+            return dict(cached)
+
+    try:
+        stats = get_emotion_stats_range(user_id, target_date, target_date, "day", tz)["totals"]
     except Exception as exc:
         logger.error("Failed to fetch emotion stats: %s", exc, exc_info=True)
-        return {"happy": 0, "neutral": 0, "sad": 0, "angry": 0}
\ No newline at end of file
+        return _empty_stats()
+
+    if closed:
+        closed_day_stats.set(cache_key, dict(stats))
+    return stats
+
+
+def rebuild_emotion_rollups(user_id: str | None = None, since: date | None = None) -> int:
+    """Recompute emotion_daily_rollups from the messages table.
+
+    Returns the number of (user, day) rows written.
+    """
+    response = get_supabase().rpc(
+        "rebuild_emotion_rollups",
+        {
+            "p_user_id": user_id,
+            "p_since": since.isoformat() if since else None,
+        },
+    ).execute()
+    closed_day_stats.clear()
+    return int(response.data or 0)
@@ -1,122 +1,222 @@
 import os
+import threading
 import warnings
 import logging
+from typing import Iterator
 from groq import Groq
 import google.generativeai as genai
 from app.config import settings
+from app.services.llm_router import AllProvidersFailed, LLMRequest, Provider, ProviderRouter, ReplyInterrupted
 
 warnings.filterwarnings("ignore", category=FutureWarning, module="google.generativeai")
 logger = logging.getLogger(__name__)
 
-class ChatbotService:
-    def __init__(self):
-        """Khởi tạo Groq làm model chính, Gemini làm fallback."""
-
-        groq_api_key = os.getenv("GROQ_API_KEY")
-        self.groq_model = os.getenv("GROQ_MODEL", "llama-3.1-8b-instant")
-        self.groq_client = Groq(api_key=groq_api_key) if groq_api_key else None
-
-        # Gemini fallback (tùy chọn)
-        gemini_api_key = settings.GOOGLE_API_KEY or os.getenv("GEMINI_API_KEY")
-        self.gemini_enabled = bool(gemini_api_key)
-        if self.gemini_enabled:
-            genai.configure(api_key=gemini_api_key)
-            self.safety_settings = [
-                {"category": "HARM_CATEGORY_HARASSMENT", "threshold": "BLOCK_ONLY_HIGH"},
-                {"category": "HARM_CATEGORY_HATE_SPEECH", "threshold": "BLOCK_ONLY_HIGH"},
-                {"category": "HARM_CATEGORY_SEXUALLY_EXPLICIT", "threshold": "BLOCK_ONLY_HIGH"},
-                {"category": "HARM_CATEGORY_DANGEROUS_CONTENT", "threshold": "BLOCK_ONLY_HIGH"},
-            ]
-            self.generation_config = {
-                "temperature": settings.LLM_TEMPERATURE,
-                "max_output_tokens": settings.LLM_MAX_TOKENS,
-                "top_p": 0.95,
-            }
-            self.model_name = settings.GEMINI_MODEL
+SYSTEM_PROMPT = (
+    "Bạn là chatbot giao tiếp bằng giọng nói. "
+    "Luôn trả lời hoàn toàn bằng tiếng Việt, ngắn gọn, tự nhiên, thân thiện. "
+    "Giọng điệu phải thích ứng với trạng thái người dùng dựa trên ngữ cảnh được cung cấp. "
+    "Nếu người dùng buồn hoặc tiêu cực: ưu tiên an ủi, nhẹ nhàng. "
+    "Nếu người dùng vui hoặc tích cực: phản hồi tích cực nhưng không phấn khích quá mức. "
+    "Nếu trạng thái bình thường: phản hồi trung tính, rõ ràng, đi thẳng vào nội dung. "
+    "KHÔNG nhắc tên cảm xúc. KHÔNG phán xét. KHÔNG đưa lời khuyên quá mức."
+)
+BUSY_REPLY = "Hệ thống đang bận chút xíu."
+EMPTY_REPLY = "Xin lỗi, tôi chưa nghe rõ."
+INTERRUPTED_REPLY = "Câu trả lời bị gián đoạn, bạn thử lại nhé."
+
+class GroqProvider(Provider):
+    """Groq chat completions. The client (and its HTTP connection pool) is created once."""
+
+    name = "groq"
+
+    def __init__(self, api_key: str, model: str, timeout: float):
+        super().__init__(timeout)
+        self.model = model
+        # Retries are the router's job (fallback/hedging), not the SDK's
+        self.client = Groq(
+            api_key=api_key, base_url=settings.GROQ_BASE_URL or None, timeout=timeout, max_retries=0
+        )
+
+    def _create(self, request: LLMRequest, stream: bool):
+        return self.client.chat.completions.create(
+            model=self.model,
+            messages=request.messages,
+            temperature=settings.LLM_TEMPERATURE,
+            max_tokens=settings.LLM_MAX_TOKENS,
+            stream=stream,
+        )
+
+    def complete(self, request: LLMRequest) -> str:
+        completion = self._create(request, stream=False)
+        return (completion.choices[0].message.content or "").strip()
+
+    def stream(self, request: LLMRequest) -> Iterator[str]:
+        for chunk in self._create(request, stream=True):
+            delta = chunk.choices[0].delta.content if chunk.choices else None
+            if delta:
+                yield delta
+
+
+class GeminiProvider(Provider):
+    """Gemini via google-generativeai, one GenerativeModel per emotion, reused."""
+
+    name = "gemini"
+
+    def __init__(self, api_key: str, model_name: str, timeout: float):
+        super().__init__(timeout)
+        if settings.GEMINI_API_ENDPOINT:
+            genai.configure(
+                api_key=api_key, transport="rest", client_options={"api_endpoint": settings.GEMINI_API_ENDPOINT}
+            )
         else:
-            self.safety_settings = []
-            self.generation_config = {}
-            self.model_name = ""
+            genai.configure(api_key=api_key)
+        self.model_name = model_name
+        self.safety_settings = [
+            {"category": "HARM_CATEGORY_HARASSMENT", "threshold": "BLOCK_ONLY_HIGH"},
+            {"category": "HARM_CATEGORY_HATE_SPEECH", "threshold": "BLOCK_ONLY_HIGH"},
+            {"category": "HARM_CATEGORY_SEXUALLY_EXPLICIT", "threshold": "BLOCK_ONLY_HIGH"},
+            {"category": "HARM_CATEGORY_DANGEROUS_CONTENT", "threshold": "BLOCK_ONLY_HIGH"},
+        ]
+        self.generation_config = {
+            "temperature": settings.LLM_TEMPERATURE,
+            "max_output_tokens": settings.LLM_MAX_TOKENS,
+            "top_p": 0.95,
+        }
+        self._models: dict[str, genai.GenerativeModel] = {}
+        self._lock = threading.Lock()
+
+    def _model(self, emotion: str):
+        """System instruction depends on the emotion, so keep one model per emotion."""
+        with self._lock:
+            model = self._models.get(emotion)
+            if model is None:
+                dynamic_instruction = (
+                    SYSTEM_PROMPT
+                    + f"Người dùng đang cảm thấy: '{emotion}'. Điều chỉnh giọng điệu phù hợp."
+                )
+                model = genai.GenerativeModel(
+                    model_name=self.model_name,
+                    system_instruction=dynamic_instruction,
+                    generation_config=self.generation_config,
+                    safety_settings=self.safety_settings,
+                )
+                self._models[emotion] = model
+            return model
 
-        if not self.groq_client and not self.gemini_enabled:
-            raise RuntimeError("Missing both GROQ_API_KEY and GEMINI/GOOGLE_API_KEY")
+    def _generate(self, request: LLMRequest, stream: bool):
+        return self._model(request.emotion).generate_content(
+            request.user_text, stream=stream, request_options={"timeout": self.timeout}
+        )
 
-    def get_reply(self, user_text: str, emotion: str = "neutral", recent_messages: list[dict] | None = None) -> str:
-        try:
-            history_messages = []
-            if recent_messages:
-                limited_messages = recent_messages[-10:]
-                for msg in limited_messages:
-                    role = "assistant" if msg.get("role") != "user" else "user"
-                    history_messages.append({"role": role, "content": msg.get("content", "")})
-
-            system_prompt = (
-                "Bạn là chatbot giao tiếp bằng giọng nói. "
-                "Luôn trả lời hoàn toàn bằng tiếng Việt, ngắn gọn, tự nhiên, thân thiện. "
-                "Giọng điệu phải thích ứng với trạng thái người dùng dựa trên ngữ cảnh được cung cấp. "
-                "Nếu người dùng buồn hoặc tiêu cực: ưu tiên an ủi, nhẹ nhàng. "
-                "Nếu người dùng vui hoặc tích cực: phản hồi tích cực nhưng không phấn khích quá mức. "
-                "Nếu trạng thái bình thường: phản hồi trung tính, rõ ràng, đi thẳng vào nội dung. "
-                "KHÔNG nhắc tên cảm xúc. KHÔNG phán xét. KHÔNG đưa lời khuyên quá mức."
-            )
+    def complete(self, request: LLMRequest) -> str:
+        return (self._generate(request, stream=False).text or "").strip()
 
+    def stream(self, request: LLMRequest) -> Iterator[str]:
+        for chunk in self._generate(request, stream=True):
+            text = chunk.text if chunk.parts else ""
+            if text:
+                yield text
 
-            user_prompt = (
-                f"Ngữ cảnh cảm xúc (ẩn, không được nhắc): {emotion}\n"
-                f"Người dùng nói: \"{user_text}\""
-            )
 
-            messages = [{"role": "system", "content": system_prompt}] + history_messages + [
-                {"role": "user", "content": user_prompt}
-            ]
+class ChatbotService:
+    def __init__(self):
+        """Khởi tạo các provider theo thứ tự LLM_PROVIDERS (mặc định Groq rồi Gemini)."""
 
-            completion = self.groq_client.chat.completions.create(
-                model=self.groq_model,
-                messages=messages,
-                temperature=settings.LLM_TEMPERATURE,
-                max_tokens=settings.LLM_MAX_TOKENS,
+        available: dict[str, Provider] = {}
+
+        groq_api_key = os.getenv("GROQ_API_KEY")
+        if groq_api_key:
+            available["groq"] = GroqProvider(
+                groq_api_key, os.getenv("GROQ_MODEL", "llama-3.1-8b-instant"), settings.GROQ_TIMEOUT
             )
 
-            reply_text = (completion.choices[0].message.content or "").strip()
-            if reply_text:
-                return reply_text
+        # Gemini fallback (tùy chọn)
+        gemini_api_key = settings.GOOGLE_API_KEY or os.getenv("GEMINI_API_KEY")
+        if gemini_api_key:
+            available["gemini"] = GeminiProvider(gemini_api_key, settings.GEMINI_MODEL, settings.GEMINI_TIMEOUT)
 
-            raise RuntimeError("Groq trả về rỗng")
+        if not available:
+            raise RuntimeError("Missing both GROQ_API_KEY and GEMINI/GOOGLE_API_KEY")
 
-        except Exception as groq_err:
-            logger.error("Groq error, fallback to Gemini if enabled: %s", groq_err, exc_info=True)
+        order = [name.strip() for name in settings.LLM_PROVIDERS.split(",") if name.strip()]
+        providers = [available[name] for name in order if name in available]
+        providers += [p for name, p in available.items() if name not in order]
+
+        self.router = ProviderRouter(
+            providers,
+            hedge_enabled=settings.LLM_HEDGE_ENABLED,
+            hedge_quantile=settings.LLM_HEDGE_QUANTILE,
+            hedge_min_samples=settings.LLM_HEDGE_MIN_SAMPLES,
+            breaker_failures=settings.LLM_BREAKER_FAILURES,
+            breaker_cooldown=settings.LLM_BREAKER_COOLDOWN,
+            ewma_alpha=settings.LLM_EWMA_ALPHA,
+            max_concurrency=settings.LLM_MAX_CONCURRENCY,
+        )
+
+    def _build_messages(self, user_text: str, emotion: str, recent_messages: list[dict] | None) -> list[dict]:
+        """Prompt Groq: system prompt + tối đa 10 tin nhắn gần nhất + câu hiện tại."""
+        history_messages = []
+        if recent_messages:
+            limited_messages = recent_messages[-10:]
+            for msg in limited_messages:
+                role = "assistant" if msg.get("role") != "user" else "user"
+                history_messages.append({"role": role, "content": msg.get("content", "")})
+
+        user_prompt = (
+            f"Ngữ cảnh cảm xúc (ẩn, không được nhắc): {emotion}\n"
+            f"Người dùng nói: \"{user_text}\""
+        )
+
+        return [{"role": "system", "content": SYSTEM_PROMPT}] + history_messages + [
+            {"role": "user", "content": user_prompt}
+        ]
+
+    def _request(self, user_text: str, emotion: str, recent_messages: list[dict] | None) -> LLMRequest:
+        return LLMRequest(
+            user_text=user_text,
+            emotion=emotion,
+            messages=self._build_messages(user_text, emotion, recent_messages),
+        )
 
-            if not self.gemini_enabled:
-                return "Hệ thống đang bận chút xíu."
+    def get_reply(self, user_text: str, emotion: str = "neutral", recent_messages: list[dict] | None = None) -> str:
+        try:
+            reply_text = self.router.complete(self._request(user_text, emotion, recent_messages)).strip()
+            return reply_text if reply_text else EMPTY_REPLY
+        except AllProvidersFailed as err:
+            logger.error("LLM providers failed: %s", err)
+            return EMPTY_REPLY if err.empty else BUSY_REPLY
+        except ReplyInterrupted as err:
+            logger.error("LLM reply interrupted: %s", err)
+            return BUSY_REPLY
+
+    def get_reply_stream(
+        self, user_text: str, emotion: str = "neutral", recent_messages: list[dict] | None = None
+    ) -> Iterator[str]:
+        """Giống get_reply nhưng trả từng đoạn text ngay khi model sinh ra.
+
+        Router chỉ chuyển provider khi chưa gửi được token nào; nếu provider
+        lỗi giữa chừng thì ReplyInterrupted được raise cho route xử lý.
+        """
+        try:
+            yield from self.router.stream(self._request(user_text, emotion, recent_messages))
+        except AllProvidersFailed as err:
+            logger.error("LLM providers failed: %s", err)
+            yield EMPTY_REPLY if err.empty else BUSY_REPLY
 
-            try:
-                
-                dynamic_instruction = (
-                    "Bạn là chatbot giao tiếp bằng giọng nói. "
-                    "Luôn trả lời hoàn toàn bằng tiếng Việt, ngắn gọn, tự nhiên, thân thiện. "
-                    "Giọng điệu phải thích ứng với trạng thái người dùng dựa trên ngữ cảnh được cung cấp. "
-                    "Nếu người dùng buồn hoặc tiêu cực: ưu tiên an ủi, nhẹ nhàng. "
-                    "Nếu người dùng vui hoặc tích cực: phản hồi tích cực nhưng không phấn khích quá mức. "
-                    "Nếu trạng thái bình thường: phản hồi trung tính, rõ ràng, đi thẳng vào nội dung. "
-                    "KHÔNG nhắc tên cảm xúc. KHÔNG phán xét. KHÔNG đưa lời khuyên quá mức."
-                    f"Người dùng đang cảm thấy: '{emotion}'. Điều chỉnh giọng điệu phù hợp."
-                )
+    def stats(self) -> dict:
+        return self.router.snapshot()
 
-                model = genai.GenerativeModel(
-                    model_name=self.model_name,
-                    system_instruction=dynamic_instruction,
-                    generation_config=self.generation_config,
-                    safety_settings=self.safety_settings,
-                )
 
-                chat = model.start_chat(history=[])
-                response = chat.send_message(user_text)
-                reply_text = (response.text or "").strip()
-                return reply_text if reply_text else "Xin lỗi, tôi chưa nghe rõ."
+_service: ChatbotService | None = None
+_service_lock = threading.Lock()
 
-            except Exception as gemini_err:
-                logger.error("Gemini fallback error: %s", gemini_err, exc_info=True)
-                return "Hệ thống đang bận chút xíu."
 
-chatbot_service = ChatbotService()
+def get_chatbot_service() -> ChatbotService:
+    """Shared ChatbotService, created on first use (or by the startup task)."""
+    global _service
+    if _service is None:
+        with _service_lock:
+            if _service is None:
+                _service = ChatbotService()
+    return _service
 
@@ -1,18 +1,95 @@
+import hashlib
+import io
+import logging
+import os
+import threading
+import numpy as np
+import soundfile as sf
 import torch
 import torch.nn as nn
 import torch.nn.functional as F
-from transformers import WhisperModel, WhisperFeatureExtractor
-import numpy as np
-import soundfile as sf
-import io
+from transformers import WhisperConfig
+from transformers.models.whisper.modeling_whisper import WhisperEncoder
+from app.services.audio_frontend import HOP_LENGTH, SAMPLE_RATE, AudioFrontend
+from app.services.audio_input import AudioSource
+from app.services.inference_backends import build_backend, configure_threads
+from app.services.metrics import EMOTION_RESULTS, stage
+
+logger = logging.getLogger(__name__)
+
+# Whisper's fixed input: 30 s of 10 ms mel frames
+FULL_FRAMES = 3000
+
+# openai/whisper-tiny encoder; every Whisper size uses 64-dim attention heads
+WHISPER_TINY = dict(
+    d_model=384,
+    encoder_layers=4,
+    encoder_attention_heads=6,
+    encoder_ffn_dim=1536,
+    num_mel_bins=80,
+    max_source_positions=1500,
+)
+WHISPER_HEAD_DIM = 64
+
+
+def _parse_buckets(value: str) -> list[int]:
+    """"500,1000,3000" -> sorted even frame counts, always ending at 3000."""
+    buckets = {min(FULL_FRAMES, int(v) + int(v) % 2) for v in value.split(",") if v.strip()}
+    buckets.add(FULL_FRAMES)
+    return sorted(buckets)
+
+
+def model_fingerprint(model_path: str, *extra) -> str:
+    """
+    Short id of the weights file (path, mtime, size) plus anything else that
+    changes the model's output (backend, input length settings...).
+    If the file can't be stat'ed (not there yet, no permission), the id is
+    built from the path alone.
+    """
+    try:
+        stat = os.stat(model_path)
+        parts = [os.path.abspath(model_path), stat.st_mtime_ns, stat.st_size, *extra]
+    except OSError as e:
+        logger.warning("Cannot stat %s for the model fingerprint: %s", model_path, e)
+        parts = [os.path.abspath(model_path), *extra]
+    return hashlib.sha256("|".join(map(str, parts)).encode()).hexdigest()[:16]
+
+
+def model_version() -> str:
+    """Fingerprint of the configured weights and inference settings (no model load needed)."""
+    from app.config import settings
+
+    buckets = _parse_buckets(settings.EMOTION_LENGTH_BUCKETS) if settings.EMOTION_VARIABLE_LENGTH else [FULL_FRAMES]
+    return model_fingerprint(settings.EMOTION_MODEL_PATH, settings.EMOTION_BACKEND, buckets, settings.EMOTION_LABELS)
+
+
+def encoder_config(state_dict: dict | None = None) -> WhisperConfig:
+    """
+    Encoder config read off the checkpoint's tensor shapes (whisper-tiny
+    without one), so no Hugging Face download or config file is needed.
+    """
+    if state_dict is None:
+        return WhisperConfig(**WHISPER_TINY)
+
+    d_model, num_mel_bins, _ = state_dict["encoder.conv1.weight"].shape
+    layers = {int(key.split(".")[2]) for key in state_dict if key.startswith("encoder.layers.")}
+    return WhisperConfig(
+        d_model=d_model,
+        encoder_layers=len(layers),
+        encoder_attention_heads=d_model // WHISPER_HEAD_DIM,
+        encoder_ffn_dim=state_dict["encoder.layers.0.fc1.weight"].shape[0],
+        num_mel_bins=num_mel_bins,
+        max_source_positions=state_dict["encoder.embed_positions.weight"].shape[0],
+    )
 
 
 class WhisperAttentionClassifier(nn.Module):
-    def __init__(self, num_labels=4):
+    def __init__(self, num_labels=4, config: WhisperConfig | None = None):
         super().__init__()
-        self.encoder = WhisperModel.from_pretrained("openai/whisper-tiny").encoder
+        config = config or encoder_config()
+        self.encoder = WhisperEncoder(config)
 
-        hidden_size = 384  # whisper-tiny
+        hidden_size = config.d_model
 
         # Attention layer
         self.attn_query = nn.Linear(hidden_size, 1, bias=False)
@@ -25,16 +102,28 @@ class WhisperAttentionClassifier(nn.Module):
             nn.Linear(128, num_labels),
         )
 
-    def forward(self, input_features, labels=None):
-        out = self.encoder(input_features=input_features)
-        hidden = out.last_hidden_state  # [B, T, 384]
+    def encode(self, input_features):
+        """
+        Whisper encoder pass that accepts any even number of mel frames <= 3000.
 
-        attn_scores = self.attn_query(hidden)  # [B, T, 1]
-        attn_weights = F.softmax(attn_scores, dim=1)  # [B, T, 1]
+        Same computation as WhisperEncoder.forward, but positional embeddings
+        are trimmed to the input length instead of requiring a 30 s input.
+        """
+        encoder = self.encoder
+        hidden = F.gelu(encoder.conv1(input_features))
+        hidden = F.gelu(encoder.conv2(hidden))
+        hidden = hidden.permute(0, 2, 1)  # [B, T/2, 384]
+        hidden = hidden + encoder.embed_positions.weight[: hidden.shape[1]]
 
-        context = (attn_weights * hidden).sum(dim=1)  # [B, 384]
+        for layer in encoder.layers:
+            out = layer(hidden, None, layer_head_mask=None)
+            hidden = out[0] if isinstance(out, tuple) else out
 
-        logits = self.fc(context)
+        return encoder.layer_norm(hidden)
+
+    def forward(self, input_features, labels=None, frame_lengths=None):
+        hidden = self.encode(input_features)  # [B, T, 384]
+        logits = self.head(hidden, frame_lengths)
 
         loss = None
         if labels is not None:
@@ -42,6 +131,61 @@ class WhisperAttentionClassifier(nn.Module):
 
         return {"logits": logits, "loss": loss}
 
+    def head(self, hidden, frame_lengths=None):
+        """Attention pooling + classifier over encoder states -> logits [B, num_labels]."""
+        attn_scores = self.attn_query(hidden)  # [B, T, 1]
+
+        # Padded frames must not take part in attention pooling
+        if frame_lengths is not None:
+            valid = (frame_lengths + 1) // 2  # conv2 has stride 2
+            positions = torch.arange(hidden.shape[1], device=hidden.device)
+            padded = positions[None, :] >= valid[:, None]
+            attn_scores = attn_scores.masked_fill(padded[..., None], float("-inf"))
+
+        attn_weights = F.softmax(attn_scores, dim=1)  # [B, T, 1]
+
+        context = (attn_weights * hidden).sum(dim=1)  # [B, 384]
+
+        return self.fc(context)
+
+
+def load_checkpoint(path: str, mmap: bool = True) -> dict:
+    """
+    Read a state dict on CPU. With mmap the tensors point into the page
+    cache instead of private memory, so every process that maps the same
+    file shares one physical copy of the weights.
+    """
+    try:
+        return torch.load(path, map_location="cpu", mmap=mmap, weights_only=True)
+    except RuntimeError as exc:
+        if not mmap:
+            raise
+        # Checkpoints saved with the legacy (non-zip) format can't be mapped
+        logger.warning("Cannot mmap %s (%s), loading it into memory", path, exc)
+        return torch.load(path, map_location="cpu", weights_only=True)
+
+
+def load_classifier(path: str, device: torch.device, mmap: bool = True) -> WhisperAttentionClassifier:
+    """
+    Build the classifier from one local checkpoint.
+
+    Modules are created on the meta device (no allocation, no init), then
+    the checkpoint tensors are assigned in place of the parameters, so on
+    CPU the model runs directly on the mapped file.
+    """
+    state_dict = load_checkpoint(path, mmap=mmap)
+    num_labels = state_dict["fc.3.weight"].shape[0]
+
+    with torch.device("meta"):
+        model = WhisperAttentionClassifier(num_labels=num_labels, config=encoder_config(state_dict))
+    model.load_state_dict(state_dict, assign=True)
+
+    missing = [name for name, t in (*model.named_parameters(), *model.named_buffers()) if t.is_meta]
+    if missing:
+        raise RuntimeError(f"Checkpoint {path} has no values for {', '.join(missing)}")
+
+    return model.to(device).eval()
+
 
 class EmotionModel:
     def __init__(self):
@@ -50,51 +194,211 @@ class EmotionModel:
         self.device = torch.device("cuda" if torch.cuda.is_available() else "cpu")
         self.labels = settings.EMOTION_LABELS
 
-        self.model = WhisperAttentionClassifier(num_labels=len(self.labels)).to(
-            self.device
+        self.model = load_classifier(settings.EMOTION_MODEL_PATH, self.device, mmap=settings.EMOTION_MMAP)
+        if self.model.fc[-1].out_features != len(self.labels):
+            raise RuntimeError(
+                f"Checkpoint has {self.model.fc[-1].out_features} classes, EMOTION_LABELS has {len(self.labels)}"
+            )
+
+        # Variable-length input: pad each clip only up to its length bucket
+        self.variable_length = settings.EMOTION_VARIABLE_LENGTH
+        self.length_buckets = (
+            _parse_buckets(settings.EMOTION_LENGTH_BUCKETS) if self.variable_length else [FULL_FRAMES]
         )
 
-        state_dict = torch.load(settings.EMOTION_MODEL_PATH, map_location=self.device)
-        self.model.load_state_dict(state_dict)
+        # Optimized inference graph (see inference_backends)
+        configure_threads(settings.TORCH_INTRA_OP_THREADS, settings.TORCH_INTER_OP_THREADS)
+        self.backend = settings.EMOTION_BACKEND
+        self.forward = build_backend(
+            self.model,
+            self.backend,
+            device=self.device,
+            example=(
+                torch.zeros(1, 80, FULL_FRAMES, device=self.device),
+                torch.full((1,), FULL_FRAMES, device=self.device),
+            ),
+            onnx_path=settings.EMOTION_ONNX_PATH,
+            source_path=settings.EMOTION_MODEL_PATH,
+            threads=settings.TORCH_INTRA_OP_THREADS,
+        )
 
-        self.model.eval()
+        # Decode/resample/log-mel front-end (thay cho WhisperFeatureExtractor)
+        self.frontend = AudioFrontend(self.device)
 
-        # Feature extractor của Whisper
-        self.feature_extractor = WhisperFeatureExtractor.from_pretrained(
-            "openai/whisper-tiny"
-        )
+        # Server-side STT: a Whisper decoder reading this model's encoder states
+        self.transcriber = None
+        if settings.STT_ENABLED:
+            from app.services.transcription import WhisperTranscriber
+
+            self.transcriber = WhisperTranscriber(self.model.encoder, self.device)
+
+        # Version of the loaded weights + inference settings, used to key cached results
+        self.version = model_version()
+
+    def extract_features_batch(self, audios: list[AudioSource]) -> list[torch.Tensor | Exception]:
+        """
+        WAV audio bytes -> log-mel features [80, T] per clip, in one batched pass.
+
+        T is 3000 (30 s) in fixed mode, or the clip's own length in
+        variable-length mode (still capped at 30 s). A clip that fails to
+        decode gets its exception instead of features.
+        """
+        return self.frontend.features(audios, pad_to_max=not self.variable_length)
+
+    def extract_features(self, audio: AudioSource) -> torch.Tensor:
+        """
+        audio: WAV audio (bytes or file) -> log-mel features [80, T]
+        """
+        features = self.extract_features_batch([audio])[0]
+        if isinstance(features, Exception):
+            raise features
+        return features
+
+    def bucket_for(self, frames: int) -> int:
+        """Smallest length bucket that fits `frames` mel frames."""
+        for bucket in self.length_buckets:
+            if frames <= bucket:
+                return bucket
+        return self.length_buckets[-1]
+
+    @staticmethod
+    def _pad(features: torch.Tensor, frames: int) -> torch.Tensor:
+        """Pad/trim to `frames`, filling with the clip's silence floor."""
+        length = features.shape[-1]
+        if length >= frames:
+            return features[:, :frames]
+        return F.pad(features, (0, frames - length), value=features.min().item())
 
     @torch.no_grad()
-    def predict(self, audio_bytes: bytes):
+    def probabilities(self, features: list[torch.Tensor]) -> torch.Tensor:
         """
-        audio_bytes: WAV audio bytes
+        Class probabilities [N, num_labels] for a list of [80, T] feature tensors.
+
+        Clips are grouped by length bucket and each group runs as one
+        batched forward pass, with padded frames masked out of pooling.
         """
-        try:
-            # 1. Đọc audio từ bytes
-            data, sr = sf.read(io.BytesIO(audio_bytes), dtype="float32")
+        groups: dict[int, list[int]] = {}
+        for i, feature in enumerate(features):
+            groups.setdefault(self.bucket_for(feature.shape[-1]), []).append(i)
+
+        probs = torch.empty(len(features), len(self.labels))
+        for frames, indices in groups.items():
+            input_features = torch.stack([self._pad(features[i], frames) for i in indices]).to(self.device)
+            frame_lengths = torch.tensor(
+                [min(features[i].shape[-1], frames) for i in indices], device=self.device
+            )
+
+            with stage("encoder"):
+                logits = self.forward(input_features, frame_lengths)
+            probs[indices] = torch.softmax(logits.float(), dim=-1).cpu()
+
+        return probs
+
+    def classify(self, features: list[torch.Tensor]) -> list[dict]:
+        """
+        Classify a list of [80, T] feature tensors.
+        """
+        return self._label(self.probabilities(features))
+
+    @torch.no_grad()
+    def classify_and_transcribe(self, features: list[torch.Tensor]) -> list[dict]:
+        """
+        Classify and transcribe a list of [80, T] feature tensors.
+
+        With a shared encoder, one encoder pass at the full 30 s input feeds
+        both the emotion head and the STT decoder. Otherwise emotion goes
+        through the usual backend and the decoder runs its own encoder.
+        """
+        input_features = torch.stack([self._pad(f, FULL_FRAMES) for f in features]).to(self.device)
+        if self.transcriber.shared:
+            frame_lengths = torch.tensor([min(f.shape[-1], FULL_FRAMES) for f in features], device=self.device)
+            with stage("encoder"):
+                hidden = self.model.encode(input_features)
+                logits = self.model.head(hidden, frame_lengths)
+            probs = torch.softmax(logits.float(), dim=-1).cpu()
+            texts = self.transcriber.transcribe(encoder_states=hidden)
+        else:
+            probs = self.probabilities(features)
+            texts = self.transcriber.transcribe(input_features=input_features)
+
+        results = self._label(probs)
+        for result, text in zip(results, texts):
+            result["text"] = text
+        return results
+
+    def _label(self, probs: torch.Tensor) -> list[dict]:
+        confidences, pred_ids = probs.max(dim=-1)
+        for pred_id in pred_ids.tolist():
+            EMOTION_RESULTS.inc(emotion=self.labels[pred_id])
+        return [
+            {"emotion": self.labels[pred_id], "confidence": confidence}
+            for pred_id, confidence in zip(pred_ids.tolist(), confidences.tolist())
+        ]
+
+    def predict_batch(self, audios: list[bytes], transcribe: list[bool] | None = None) -> list[dict | Exception]:
+        """
+        Extract features for the whole batch, then classify all valid clips
+        at once. A clip that fails to decode gets its exception as its result.
+
+        Clips flagged in `transcribe` are also transcribed, and their result
+        gets a "text" key (needs STT_ENABLED).
+        """
+        transcribe = transcribe or [False] * len(audios)
+        results: list[dict | Exception | None] = [None] * len(audios)
+        groups: dict[bool, tuple[list, list]] = {False: ([], []), True: ([], [])}
 
-            # 2. Force mono
-            if data.ndim > 1:
-                data = np.mean(data, axis=1)
+        for i, extracted in enumerate(self.extract_features_batch(audios)):
+            if isinstance(extracted, Exception):
+                results[i] = RuntimeError(f"Emotion detection error: {extracted}")
+            elif transcribe[i] and self.transcriber is None:
+                results[i] = RuntimeError("Server-side STT is disabled (STT_ENABLED)")
+            else:
+                features, indices = groups[transcribe[i]]
+                features.append(extracted)
+                indices.append(i)
 
-            # 3. Feature extraction
-            inputs = self.feature_extractor(data, sampling_rate=sr, return_tensors="pt")
-            input_features = inputs.input_features.to(self.device)
+        for with_text, (features, indices) in groups.items():
+            if features:
+                run = self.classify_and_transcribe if with_text else self.classify
+                for i, result in zip(indices, run(features)):
+                    results[i] = result
 
-            # 4. Predict
-            outputs = self.model(input_features)
-            logits = outputs["logits"]
+        return results
 
-            probs = torch.softmax(logits, dim=-1)[0]
-            pred_id = torch.argmax(probs).item()
+    def warmup(self) -> None:
+        """
+        Run a dummy clip per length bucket through the full WAV -> label path,
+        so allocator growth, JIT/ORT graph setup and resampler kernels happen
+        before the first real request.
+        """
+        rng = np.random.default_rng(0)
+        for frames in self.length_buckets:
+            buffer = io.BytesIO()
+            noise = rng.normal(0, 0.01, frames * HOP_LENGTH).astype(np.float32)
+            sf.write(buffer, noise, SAMPLE_RATE, format="WAV", subtype="PCM_16")
+            self.classify([self.extract_features(buffer.getvalue())])
+        if self.transcriber is not None:
+            self.classify_and_transcribe([self.extract_features(buffer.getvalue())])
 
-            return {
-                "emotion": self.labels[pred_id],
-                "confidence": probs[pred_id].item(),
-            }
+    def predict(self, audio: AudioSource):
+        """
+        audio: WAV audio (bytes or file)
+        """
+        try:
+            return self.classify([self.extract_features(audio)])[0]
         except Exception as e:
             raise RuntimeError(f"Emotion detection error: {str(e)}")
 
 
-# Singleton instance
-emotion_service = EmotionModel()
+_service: EmotionModel | None = None
+_service_lock = threading.Lock()
+
+
+def get_emotion_service() -> EmotionModel:
+    """Shared EmotionModel, loaded on first use (or by the startup task)."""
+    global _service
+    if _service is None:
+        with _service_lock:
+            if _service is None:
+                _service = EmotionModel()
+    return _service
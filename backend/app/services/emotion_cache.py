@@ -0,0 +1,194 @@
+"""
+Content-addressed cache for emotion results.
+
+Mobile clients retry /chat on flaky networks and upload the same WAV bytes
+again. This cache makes those retries skip the forward pass.
+
+- Key: blake2b hash of the audio (audio_digest) plus the model version (weights
+  path/mtime/size, backend, length buckets, window settings). New weights
+  or settings therefore never hit old entries.
+- Memory tier: TTLCache (LRU, hit/miss counters).
+- Optional disk tier under EMOTION_CACHE_DIR/<version>/. Every write
+  touches its version directory. On startup, directories of other versions
+  that nobody has written to for longer than the entry TTL are removed:
+  all their entries have expired. A version still in use by another
+  process (rolling deploy, workers on different weights) keeps its
+  directory.
+- Concurrent requests for the same clip share one computation instead of
+  each running the model.
+"""
+
+import asyncio
+import hashlib
+import json
+import logging
+import os
+import shutil
+import time
+from typing import Awaitable, Callable
+from app.config import settings
+from app.services.cache import TTLCache
+from app.services.emotion import model_version
+from app.services.executors import run_io
+from app.services.metrics import register_cache
+
+logger = logging.getLogger(__name__)
+
+
+def _cache_version(model_version: str) -> str:
+    """Model version plus the long-audio settings that change results."""
+    parts = [
+        model_version,
+        settings.EMOTION_LONG_AUDIO_SECONDS,
+        settings.EMOTION_WINDOW_SECONDS,
+        settings.EMOTION_WINDOW_HOP_SECONDS,
+        settings.EMOTION_MIN_WINDOW_SECONDS,
+        settings.EMOTION_VAD_ENABLED,
+        settings.EMOTION_VAD_THRESHOLD_DB,
+        settings.EMOTION_VAD_MIN_SPEECH_RATIO,
+    ]
+    if settings.STT_ENABLED:
+        # Transcripts are cached too (key suffix ":text")
+        parts += [settings.WHISPER_MODEL, settings.STT_SHARE_ENCODER, settings.STT_LANGUAGE, settings.STT_MAX_NEW_TOKENS]
+    return hashlib.sha256("|".join(map(str, parts)).encode()).hexdigest()[:16]
+
+
+class EmotionCache:
+    """Two-tier (memory, optional disk) cache of emotion results."""
+
+    def __init__(self, version: str, maxsize: int, ttl: float, disk_dir: str = ""):
+        self.version = version
+        self.ttl = ttl
+        self.memory = TTLCache(maxsize=maxsize, ttl=ttl)
+        self.disk_hits = 0
+        self.shared = 0  # requests served by another request's in-flight computation
+        self._inflight: dict[str, asyncio.Future] = {}
+
+        self.disk_dir = os.path.join(disk_dir, version) if disk_dir else ""
+        if self.disk_dir:
+            self._prepare_disk(disk_dir)
+
+    async def get_or_compute(self, key: str, compute: Callable[[], Awaitable[dict]]) -> dict:
+        """Return the cached result for the clip whose audio_digest() is key,
+        or run compute() once and cache it."""
+
+        result = self.memory.get(key)
+        if result is not None:
+            return dict(result)
+
+        inflight = self._inflight.get(key)
+        if inflight is not None:
+            self.shared += 1
+            try:
+                return dict(await asyncio.shield(inflight))
+            except asyncio.CancelledError:
+                if not inflight.cancelled():
+                    raise
+                # The request doing the work went away; compute it ourselves
+            return await self.get_or_compute(key, compute)
+
+        future = asyncio.get_running_loop().create_future()
+        self._inflight[key] = future
+        try:
+            result = await self._read_disk(key) if self.disk_dir else None
+            if result is None:
+                result = await compute()
+                if self.disk_dir:
+                    await self._write_disk(key, result)
+            else:
+                self.disk_hits += 1
+            self.memory.set(key, result)
+            future.set_result(result)
+        except Exception as exc:
+            future.set_exception(exc)
+            # Mark the exception as retrieved when nobody else was waiting
+            future.exception()
+            raise
+        except BaseException:
+            future.cancel()
+            raise
+        finally:
+            self._inflight.pop(key, None)
+
+        return dict(result)
+
+    def stats(self) -> dict:
+        stats = self.memory.stats()
+        stats.update({
+            "version": self.version,
+            "disk_enabled": bool(self.disk_dir),
+            "disk_hits": self.disk_hits,
+            "shared": self.shared,
+            "inflight": len(self._inflight),
+        })
+        return stats
+
+    # -- disk tier ----------------------------------------------------------------
+
+    def _prepare_disk(self, root: str) -> None:
+        """Create this version's directory and drop versions idle past the TTL."""
+        os.makedirs(self.disk_dir, exist_ok=True)
+        os.utime(self.disk_dir)
+        now = time.time()
+        for name in os.listdir(root):
+            path = os.path.join(root, name)
+            if name == self.version or not os.path.isdir(path):
+                continue
+            try:
+                idle = now - os.path.getmtime(path)
+            except OSError:
+                continue  # removed by another worker meanwhile
+            if idle > self.ttl:
+                shutil.rmtree(path, ignore_errors=True)
+                logger.info(f"Removed stale emotion cache version {name} (idle {idle:.0f}s)")
+
+    def _path(self, key: str) -> str:
+        return os.path.join(self.disk_dir, key[:2], f"{key}.json")
+
+    async def _read_disk(self, key: str) -> dict | None:
+        try:
+            return await run_io(self._read_file, self._path(key))
+        except Exception as e:
+            logger.warning(f"Emotion cache read failed: {e}")
+            return None
+
+    async def _write_disk(self, key: str, result: dict) -> None:
+        try:
+            await run_io(self._write_file, self._path(key), result)
+        except Exception as e:
+            logger.warning(f"Emotion cache write failed: {e}")
+
+    def _read_file(self, path: str) -> dict | None:
+        try:
+            if time.time() - os.path.getmtime(path) > self.ttl:
+                os.remove(path)
+                return None
+            with open(path, encoding="utf-8") as f:
+                return json.load(f)
+        except FileNotFoundError:
+            return None
+
+    def _write_file(self, path: str, result: dict) -> None:
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        tmp = f"{path}.{os.getpid()}.tmp"
+        with open(tmp, "w", encoding="utf-8") as f:
+            json.dump(result, f)
+        os.replace(tmp, path)  # atomic, so other workers never read half a file
+        os.utime(self.disk_dir)  # marks the version as in use for _prepare_disk
+
+
+_cache: EmotionCache | None = None
+
+
+def get_emotion_cache() -> EmotionCache:
+    """Shared cache, created on first use (event loop only)."""
+    global _cache
+    if _cache is None:
+        _cache = EmotionCache(
+            version=_cache_version(model_version()),
+            maxsize=settings.EMOTION_CACHE_SIZE,
+            ttl=settings.EMOTION_CACHE_TTL,
+            disk_dir=settings.EMOTION_CACHE_DIR,
+        )
+        register_cache("emotion", _cache.stats)
+    return _cache
@@ -0,0 +1,87 @@
+"""
+Bounded executors for blocking work.
+
+The /chat handler is async, but torch inference and the Supabase, Groq and
+Gemini SDKs are all synchronous. Running them directly on the event loop
+stalls every other request on the worker, so blocking calls are dispatched
+to a dedicated pool per resource class:
+
+- inference: CPU-bound torch work, sized to the cores we want to give it.
+- io: network-bound SDK calls, sized for many requests in flight.
+- decode: decoding compressed uploads (Opus, Vorbis, ...). Kept apart
+  from inference so a burst of uploads can't starve the model, and small
+  so decode CPU stays bounded whatever the upload rate.
+
+The caller's contextvars (request id) are copied into the worker thread, so
+log lines from blocking calls still carry the request they belong to.
+"""
+
+import asyncio
+import contextvars
+import functools
+import logging
+from concurrent.futures import ThreadPoolExecutor
+from typing import Iterator
+from app.config import settings
+from app.services.metrics import register_queue
+
+logger = logging.getLogger(__name__)
+
+inference_executor = ThreadPoolExecutor(
+    max_workers=settings.INFERENCE_WORKERS,
+    thread_name_prefix="inference",
+)
+io_executor = ThreadPoolExecutor(
+    max_workers=settings.IO_WORKERS,
+    thread_name_prefix="io",
+)
+decode_executor = ThreadPoolExecutor(
+    max_workers=settings.AUDIO_DECODE_WORKERS,
+    thread_name_prefix="decode",
+)
+
+_DONE = object()
+
+
+async def _run(executor: ThreadPoolExecutor, func, *args, **kwargs):
+    loop = asyncio.get_running_loop()
+    context = contextvars.copy_context()
+    return await loop.run_in_executor(executor, functools.partial(context.run, func, *args, **kwargs))
+
+
+async def run_inference(func, *args, **kwargs):
+    """Run a CPU-bound callable on the inference pool."""
+    return await _run(inference_executor, func, *args, **kwargs)
+
+
+async def run_io(func, *args, **kwargs):
+    """Run a blocking network call on the I/O pool."""
+    return await _run(io_executor, func, *args, **kwargs)
+
+
+async def run_decode(func, *args, **kwargs):
+    """Run an audio decode on the decode pool."""
+    return await _run(decode_executor, func, *args, **kwargs)
+
+
+async def iterate_io(iterator: Iterator):
+    """Drain a blocking iterator (e.g. an LLM token stream) on the I/O pool."""
+    iterator = iter(iterator)
+    while True:
+        item = await run_io(next, iterator, _DONE)
+        if item is _DONE:
+            break
+        yield item
+
+
+register_queue("inference_executor", lambda: inference_executor._work_queue.qsize())
+register_queue("io_executor", lambda: io_executor._work_queue.qsize())
+register_queue("decode_executor", lambda: decode_executor._work_queue.qsize())
+
+
+def shutdown_executors():
+    """Wait for in-flight work and release pool threads."""
+    inference_executor.shutdown(wait=True)
+    io_executor.shutdown(wait=True)
+    decode_executor.shutdown(wait=True)
+    logger.info("Executors shut down")
@@ -0,0 +1,164 @@
+"""
+Inference backends for WhisperAttentionClassifier.
+
+Each backend turns the eager float32 model into a callable mapping
+(input_features [B, 80, T], frame_lengths [B]) -> logits [B, num_labels].
+Selected with
+EMOTION_BACKEND:
+
+- eager:       plain PyTorch (reference).
+- int8:        dynamic int8 quantization of every nn.Linear (encoder
+               attention/MLP projections and the head). CPU only.
+- torchscript: traced + frozen TorchScript graph.
+- compile:     torch.compile (Inductor) with dynamic shapes.
+- onnx:        ONNX export run by onnxruntime. CPU only; needs the optional
+               onnx/onnxruntime packages.
+
+Check a backend against eager before switching a deployment:
+    python -m benchmarks.inference_backends --clips <dir>
+"""
+
+import copy
+import logging
+import os
+from typing import Callable
+import torch
+import torch.nn as nn
+
+logger = logging.getLogger(__name__)
+
+BACKENDS = ("eager", "int8", "torchscript", "compile", "onnx")
+CPU_ONLY_BACKENDS = ("int8", "onnx")
+
+Forward = Callable[[torch.Tensor, torch.Tensor], torch.Tensor]
+Example = tuple[torch.Tensor, torch.Tensor]
+
+
+class _LogitsOnly(nn.Module):
+    """Tensor-in/tensor-out wrapper so the model can be traced/exported."""
+
+    def __init__(self, model: nn.Module):
+        super().__init__()
+        self.model = model
+
+    def forward(self, input_features, frame_lengths):
+        return self.model(input_features, frame_lengths=frame_lengths)["logits"]
+
+
+def configure_threads(intra_op: int, inter_op: int) -> None:
+    """Set torch's per-process thread budget (0 keeps the torch default)."""
+    if intra_op > 0:
+        torch.set_num_threads(intra_op)
+    if inter_op > 0:
+        try:
+            torch.set_num_interop_threads(inter_op)
+        except RuntimeError as exc:
+            # Only allowed before the first inter-op parallel work
+            logger.warning("Could not set inter-op threads: %s", exc)
+    logger.info(
+        "Torch threads: intra-op=%d inter-op=%d",
+        torch.get_num_threads(),
+        torch.get_num_interop_threads(),
+    )
+
+
+def _eager(model: nn.Module, example: Example) -> Forward:
+    return _LogitsOnly(model).eval()
+
+
+def _int8(model: nn.Module, example: Example) -> Forward:
+    quantized = torch.ao.quantization.quantize_dynamic(
+        copy.deepcopy(model).cpu(), {nn.Linear}, dtype=torch.qint8
+    )
+    return _LogitsOnly(quantized).eval()
+
+
+def _torchscript(model: nn.Module, example: Example) -> Forward:
+    with torch.no_grad():
+        traced = torch.jit.trace(_LogitsOnly(model).eval(), example, check_trace=False)
+    return torch.jit.freeze(traced.eval())
+
+
+def _compile(model: nn.Module, example: Example) -> Forward:
+    return torch.compile(_LogitsOnly(model).eval(), dynamic=True)
+
+
+def _onnx(
+    model: nn.Module, example: Example, onnx_path: str, source_path: str, threads: int
+) -> Forward:
+    try:
+        import onnxruntime as ort
+    except ImportError as exc:
+        raise RuntimeError("EMOTION_BACKEND=onnx requires the onnx and onnxruntime packages") from exc
+
+    # Re-export whenever the checkpoint is newer than the exported graph
+    stale = not os.path.exists(onnx_path) or (
+        os.path.exists(source_path) and os.path.getmtime(source_path) > os.path.getmtime(onnx_path)
+    )
+    if stale:
+        os.makedirs(os.path.dirname(onnx_path) or ".", exist_ok=True)
+        with torch.no_grad():
+            torch.onnx.export(
+                _LogitsOnly(model).eval().cpu(),
+                tuple(t.cpu() for t in example),
+                onnx_path,
+                input_names=["input_features", "frame_lengths"],
+                output_names=["logits"],
+                dynamic_axes={
+                    "input_features": {0: "batch", 2: "frames"},
+                    "frame_lengths": {0: "batch"},
+                    "logits": {0: "batch"},
+                },
+                opset_version=17,
+            )
+        logger.info("Exported ONNX graph to %s", onnx_path)
+
+    options = ort.SessionOptions()
+    options.graph_optimization_level = ort.GraphOptimizationLevel.ORT_ENABLE_ALL
+    if threads > 0:
+        options.intra_op_num_threads = threads
+    session = ort.InferenceSession(onnx_path, options, providers=["CPUExecutionProvider"])
+
+    def forward(input_features: torch.Tensor, frame_lengths: torch.Tensor) -> torch.Tensor:
+        (logits,) = session.run(
+            ["logits"],
+            {
+                "input_features": input_features.cpu().numpy(),
+                "frame_lengths": frame_lengths.cpu().numpy(),
+            },
+        )
+        return torch.from_numpy(logits)
+
+    return forward
+
+
+def build_backend(
+    model: nn.Module,
+    name: str,
+    device: torch.device,
+    example: Example,
+    onnx_path: str = "",
+    source_path: str = "",
+    threads: int = 0,
+) -> Forward:
+    """Return a logits callable for the requested backend."""
+    if name not in BACKENDS:
+        raise ValueError(f"Unknown EMOTION_BACKEND {name!r}, expected one of {BACKENDS}")
+
+    if name in CPU_ONLY_BACKENDS and device.type != "cpu":
+        logger.warning("Backend %s is CPU only, using eager on %s", name, device)
+        name = "eager"
+
+    if name == "int8":
+        forward = _int8(model, example)
+    elif name == "torchscript":
+        forward = _torchscript(model, example)
+    elif name == "compile":
+        forward = _compile(model, example)
+    elif name == "onnx":
+        forward = _onnx(model, example, onnx_path, source_path, threads)
+    else:
+        forward = _eager(model, example)
+
+    logger.info("Emotion inference backend: %s", name)
+    return forward
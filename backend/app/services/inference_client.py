@@ -0,0 +1,277 @@
+"""
+Client side of the inference server (EMOTION_INFERENCE_MODE=server).
+
+Emotion inference runs in a separate pool of processes (see
+app.inference_server). Each process listens on its own unix socket,
+EMOTION_INFERENCE_SOCKET.<index>. A web worker keeps one connection per
+inference process and sends each clip to the one with the fewest requests
+in flight.
+
+Only a small message goes over the socket: (kind, request_id, segment
+name, size). The audio itself is written once into a shared-memory
+segment that the inference process reads in place. Segments come from a
+pool and are reused; a segment goes back to the pool only after its reply
+arrives, so a cancelled request never has its buffer overwritten while
+the server is still reading it.
+"""
+
+import asyncio
+import itertools
+import logging
+import threading
+import time
+from multiprocessing import resource_tracker
+from multiprocessing.connection import Client, Connection
+from multiprocessing.shared_memory import SharedMemory
+from app.config import settings
+from app.services.audio_input import CHUNK_SIZE, AudioSource, audio_size, open_audio
+from app.services.executors import run_io
+from app.services.metrics import register_queue
+
+logger = logging.getLogger(__name__)
+
+_MIN_SEGMENT = 64 * 1024
+
+
+def attach_shared_memory(name: str) -> SharedMemory:
+    """Open an existing segment without letting this process's resource
+    tracker unlink it on exit (the creator owns it)."""
+    try:
+        return SharedMemory(name=name, track=False)  # Python 3.13+
+    except TypeError:
+        segment = SharedMemory(name=name)
+        resource_tracker.unregister(segment._name, "shared_memory")
+        return segment
+
+
+def write_segment(segment: SharedMemory, audio: AudioSource) -> None:
+    """Copy the audio into the segment, in chunks for files."""
+    if isinstance(audio, (bytes, bytearray, memoryview)):
+        segment.buf[: len(audio)] = audio
+        return
+    f = open_audio(audio)
+    offset = 0
+    while chunk := f.read(CHUNK_SIZE):
+        segment.buf[offset:offset + len(chunk)] = chunk
+        offset += len(chunk)
+
+
+def socket_paths(base: str, processes: int) -> list[str]:
+    return [f"{base}.{index}" for index in range(processes)]
+
+
+def authkey() -> bytes:
+    """Shared secret for the sockets. Messages are pickled, so an
+    unauthenticated peer could run code in the other process: no default."""
+    if not settings.INFERENCE_SERVER_AUTHKEY:
+        raise RuntimeError("INFERENCE_SERVER_AUTHKEY must be set for EMOTION_INFERENCE_MODE=server")
+    return settings.INFERENCE_SERVER_AUTHKEY.encode()
+
+
+class SegmentPool:
+    """Reusable shared-memory segments for audio payloads."""
+
+    def __init__(self, max_free: int):
+        self.max_free = max_free
+        self._free: list[SharedMemory] = []
+        self._lock = threading.Lock()
+
+    def acquire(self, size: int) -> SharedMemory:
+        with self._lock:
+            fitting = [segment for segment in self._free if segment.size >= size]
+            if fitting:
+                segment = min(fitting, key=lambda s: s.size)
+                self._free.remove(segment)
+                return segment
+        # Power-of-two sizes keep segments reusable across similar clip lengths
+        return SharedMemory(create=True, size=max(_MIN_SEGMENT, 1 << (size - 1).bit_length()))
+
+    def release(self, segment: SharedMemory) -> None:
+        with self._lock:
+            if len(self._free) < self.max_free:
+                self._free.append(segment)
+                return
+        self._destroy(segment)
+
+    def close(self) -> None:
+        with self._lock:
+            segments, self._free = self._free, []
+        for segment in segments:
+            self._destroy(segment)
+
+    @staticmethod
+    def _destroy(segment: SharedMemory) -> None:
+        segment.close()
+        try:
+            segment.unlink()
+        except FileNotFoundError:
+            pass
+
+
+class _Worker:
+    """Connection to one inference process plus its reply-reader thread."""
+
+    def __init__(self, path: str, conn: Connection, pool: SegmentPool):
+        self.path = path
+        self.conn = conn
+        self.pool = pool
+        self.alive = True
+        self._pending: dict[int, tuple[asyncio.Future, SharedMemory]] = {}
+        self._lock = threading.Lock()
+        threading.Thread(target=self._read_replies, name=f"inference-client-{path}", daemon=True).start()
+
+    @property
+    def inflight(self) -> int:
+        return len(self._pending)
+
+    def submit(self, future: asyncio.Future, request_id: int, kind: str, segment: SharedMemory, size: int):
+        with self._lock:
+            if not self.alive:
+                raise RuntimeError(f"Inference worker {self.path} disconnected")
+            self._pending[request_id] = (future, segment)
+            try:
+                self.conn.send((kind, request_id, segment.name, size))
+            except Exception:
+                self._pending.pop(request_id, None)
+                self.alive = False
+                raise
+
+    def close(self):
+        self.alive = False
+        self.conn.close()
+
+    def _read_replies(self):
+        while True:
+            try:
+                status, request_id, payload = self.conn.recv()
+            except (EOFError, OSError):
+                break
+            future, segment = self._pending.pop(request_id, (None, None))
+            if future is None:
+                continue
+            self.pool.release(segment)
+            if status == "ok":
+                self._resolve(future, payload)
+            else:
+                self._resolve(future, RuntimeError(payload))
+
+        # Process gone: fail everything still waiting on it
+        self.alive = False
+        with self._lock:
+            pending, self._pending = self._pending, {}
+        for future, segment in pending.values():
+            self.pool.release(segment)
+            self._resolve(future, RuntimeError(f"Inference worker {self.path} disconnected"))
+
+    @staticmethod
+    def _resolve(future: asyncio.Future, result):
+        def apply():
+            if future.done():
+                return
+            if isinstance(result, Exception):
+                future.set_exception(result)
+            else:
+                future.set_result(result)
+
+        future.get_loop().call_soon_threadsafe(apply)
+
+
+class InferenceClient:
+    """Sends audio to the inference server processes and awaits results."""
+
+    def __init__(self, socket_base: str, processes: int, connect_timeout: float, max_free_segments: int = 32):
+        self.paths = socket_paths(socket_base, processes)
+        self.connect_timeout = connect_timeout
+        self.pool = SegmentPool(max_free_segments)
+        self._workers: dict[str, _Worker] = {}
+        self._ids = itertools.count()
+        self._connect_lock = threading.Lock()
+
+    def connect(self, timeout: float | None = None) -> None:
+        """(Re)connect to every inference process, waiting up to `timeout`
+        (default connect_timeout) for processes that are still starting."""
+        deadline = time.monotonic() + (self.connect_timeout if timeout is None else timeout)
+        with self._connect_lock:
+            for path in self.paths:
+                worker = self._workers.get(path)
+                if worker is not None and worker.alive:
+                    continue
+                while True:
+                    try:
+                        conn = Client(path, family="AF_UNIX", authkey=authkey())
+                        break
+                    except (FileNotFoundError, ConnectionRefusedError):
+                        if time.monotonic() > deadline:
+                            raise RuntimeError(f"Inference server not reachable at {path}")
+                        time.sleep(0.2)
+                self._workers[path] = _Worker(path, conn, self.pool)
+                logger.info("Connected to inference worker %s", path)
+
+    def _alive(self) -> list[_Worker]:
+        return [worker for worker in self._workers.values() if worker.alive]
+
+    async def predict(self, audio: AudioSource, long_audio: bool = False, transcribe: bool = False) -> dict:
+        """Emotion result for one clip; long_audio runs the sliding-window
+        analysis, transcribe adds the clip's "text" (server-side STT)."""
+        workers = self._alive()
+        if len(workers) < len(self.paths):
+            # Reconnect restarted processes; only wait for them if none are up
+            try:
+                await run_io(self.connect, None if not workers else 0)
+            except RuntimeError:
+                if not workers:
+                    raise
+            workers = self._alive()
+
+        worker = min(workers, key=lambda w: w.inflight)
+        size = audio_size(audio)
+        segment = self.pool.acquire(size)
+        if isinstance(audio, (bytes, bytearray, memoryview)):
+            write_segment(segment, audio)
+        else:
+            # The file may be on disk: copy on the IO pool. If we are cancelled
+            # meanwhile, the segment goes back to the pool only once the copy stops.
+            copy = asyncio.ensure_future(run_io(write_segment, segment, audio))
+            try:
+                await asyncio.shield(copy)
+            except asyncio.CancelledError:
+                copy.add_done_callback(lambda _: self.pool.release(segment))
+                raise
+            except Exception:
+                self.pool.release(segment)
+                raise
+
+        future = asyncio.get_running_loop().create_future()
+        try:
+            kind = "analyze" if long_audio else "transcribe" if transcribe else "predict"
+            worker.submit(future, next(self._ids), kind, segment, size)
+        except Exception:
+            self.pool.release(segment)
+            raise
+        return await future
+
+    def inflight(self) -> int:
+        """Requests sent to the inference processes and not answered yet."""
+        return sum(worker.inflight for worker in self._alive())
+
+    def close(self) -> None:
+        for worker in self._workers.values():
+            worker.close()
+        self._workers.clear()
+        self.pool.close()
+
+
+_client: InferenceClient | None = None
+
+
+def get_inference_client() -> InferenceClient:
+    """Shared client for this web worker (connects lazily)."""
+    global _client
+    if _client is None:
+        _client = InferenceClient(
+            settings.EMOTION_INFERENCE_SOCKET,
+            settings.INFERENCE_SERVER_PROCESSES,
+            connect_timeout=settings.INFERENCE_SERVER_CONNECT_TIMEOUT,
+        )
+        register_queue("inference_server", _client.inflight)
+    return _client
@@ -0,0 +1,398 @@
+"""
+Routing of chat completions across LLM providers.
+
+Providers are tried in their configured order (LLM_PROVIDERS), with:
+
+- Health tracking: an EWMA of latency and error rate per provider and call
+  kind, plus a window of recent latencies for percentiles. For streams,
+  latency means time to first token.
+- Circuit breaker: after LLM_BREAKER_FAILURES consecutive failures a
+  provider is skipped for LLM_BREAKER_COOLDOWN seconds. A single probe
+  request then decides whether it closes again. A probe that is abandoned
+  (lost a hedge, caller went away) reopens the breaker for another
+  cooldown, and one that hasn't reported back within the provider's
+  timeout is considered lost, so the breaker can always probe again.
+- Timeouts: every provider has its own. A provider that hasn't produced
+  its first chunk (or its next chunk, for streams) in time counts as
+  failed, and the next provider starts right away instead of after the
+  SDK's own timeout.
+- Hedging: when the provider that is running passes its p95 latency, the
+  next one is started in parallel. Whichever produces the first chunk wins
+  and the other is abandoned.
+- Once a provider has produced output, a failure or timeout can't be
+  handed to another one mid-reply: the stream raises ReplyInterrupted, so
+  callers can report the broken reply instead of treating it as complete.
+
+Provider calls run on a dedicated thread pool, so the caller can keep
+waiting on whichever call finishes first.
+"""
+
+import abc
+import contextvars
+import logging
+import math
+import queue
+import threading
+import time
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+from dataclasses import dataclass, field
+from typing import Callable, Iterator
+from app.services.metrics import LLM_CALLS, LLM_ROUTING, LLM_SECONDS
+
+logger = logging.getLogger(__name__)
+
+COMPLETE = "complete"
+STREAM = "stream"
+
+
+@dataclass
+class LLMRequest:
+    user_text: str
+    emotion: str
+    messages: list[dict] = field(default_factory=list)
+
+
+class AllProvidersFailed(RuntimeError):
+    """No provider produced any output. empty=True if one answered with nothing."""
+
+    def __init__(self, message: str, empty: bool = False):
+        super().__init__(message)
+        self.empty = empty
+
+
+class ReplyInterrupted(RuntimeError):
+    """The provider that was streaming the reply failed after output was sent."""
+
+
+class Provider(abc.ABC):
+    """One LLM backend. Subclasses implement complete() and stream()."""
+
+    name = "provider"
+
+    def __init__(self, timeout: float):
+        self.timeout = timeout
+
+    @abc.abstractmethod
+    def complete(self, request: LLMRequest) -> str:
+        ...
+
+    @abc.abstractmethod
+    def stream(self, request: LLMRequest) -> Iterator[str]:
+        ...
+
+
+class ProviderStats:
+    """Latency / error EWMA plus a window of recent latencies."""
+
+    def __init__(self, alpha: float, window: int = 200):
+        self.alpha = alpha
+        self.latency_ewma: float | None = None
+        self.error_ewma = 0.0
+        self.requests = 0
+        self.failures = 0
+        self._latencies: deque[float] = deque(maxlen=window)
+        self._lock = threading.Lock()
+
+    def success(self, latency: float) -> None:
+        with self._lock:
+            self.requests += 1
+            self._latencies.append(latency)
+            self.latency_ewma = latency if self.latency_ewma is None else (
+                self.alpha * latency + (1 - self.alpha) * self.latency_ewma
+            )
+            self.error_ewma *= 1 - self.alpha
+
+    def failure(self) -> None:
+        with self._lock:
+            self.requests += 1
+            self.failures += 1
+            self.error_ewma = self.alpha + (1 - self.alpha) * self.error_ewma
+
+    def quantile(self, q: float, min_samples: int) -> float | None:
+        with self._lock:
+            if len(self._latencies) < max(1, min_samples):
+                return None
+            ordered = sorted(self._latencies)
+        return ordered[min(len(ordered) - 1, math.ceil(q * len(ordered)) - 1)]
+
+    def snapshot(self) -> dict:
+        return {
+            "requests": self.requests,
+            "failures": self.failures,
+            "latency_ewma": self.latency_ewma,
+            "error_ewma": self.error_ewma,
+            "p95": self.quantile(0.95, 1),
+        }
+
+
+class CircuitBreaker:
+    """closed -> open after N consecutive failures -> half-open probe after cooldown."""
+
+    def __init__(self, name: str, failures: int, cooldown: float, probe_timeout: float):
+        self.name = name
+        self.max_failures = max(1, failures)
+        self.cooldown = cooldown
+        self.probe_timeout = probe_timeout
+        self.state = "closed"
+        self._failures = 0
+        self._opened_at = 0.0
+        self._probing = False
+        self._probe_started = 0.0
+        self._lock = threading.Lock()
+
+    def allow(self) -> str | None:
+        """"closed" or "probe" if the call may go ahead, None to skip the provider."""
+        with self._lock:
+            if self.state == "closed":
+                return "closed"
+            now = time.monotonic()
+            if self.state == "open" and now - self._opened_at >= self.cooldown:
+                self.state = "half_open"
+                self._probing = False
+            if self.state == "half_open" and self._probing and now - self._probe_started > self.probe_timeout:
+                logger.warning("LLM provider %s probe never reported back, probing again", self.name)
+                self._probing = False
+            if self.state == "half_open" and not self._probing:
+                self._probing = True
+                self._probe_started = now
+                return "probe"
+            return None
+
+    def abandon(self) -> None:
+        """The probe was cancelled before it succeeded or failed: wait another cooldown."""
+        with self._lock:
+            if self.state == "half_open" and self._probing:
+                self.state = "open"
+                self._opened_at = time.monotonic()
+                self._probing = False
+
+    def success(self) -> None:
+        with self._lock:
+            if self.state != "closed":
+                logger.info("LLM provider %s recovered, closing breaker", self.name)
+            self.state = "closed"
+            self._failures = 0
+            self._probing = False
+
+    def failure(self) -> None:
+        with self._lock:
+            self._failures += 1
+            if self.state == "half_open" or self._failures >= self.max_failures:
+                if self.state != "open":
+                    logger.warning("LLM provider %s failing, opening breaker for %.0fs", self.name, self.cooldown)
+                self.state = "open"
+                self._opened_at = time.monotonic()
+                self._probing = False
+
+
+class _Run:
+    """One provider call, running on the router's pool, reporting into a queue."""
+
+    def __init__(
+        self, provider: Provider, produce: Callable[[], Iterator[str]], events: queue.Queue, probe: bool = False
+    ):
+        self.provider = provider
+        self.probe = probe  # the half-open breaker's probe call
+        self.produce = produce
+        self.events = events
+        self.started = time.monotonic()
+        self.deadline = self.started + provider.timeout
+        self.cancelled = threading.Event()
+
+    def __call__(self):
+        iterator = None
+        try:
+            iterator = self.produce()
+            for chunk in iterator:
+                if self.cancelled.is_set():
+                    break
+                if chunk:
+                    self.events.put((self, "chunk", chunk))
+            self.events.put((self, "end", None))
+        except Exception as exc:
+            self.events.put((self, "error", exc))
+        finally:
+            close = getattr(iterator, "close", None)
+            if close is not None:
+                try:
+                    close()
+                except Exception:
+                    pass
+
+
+class ProviderRouter:
+    """Fallback + circuit breaking + hedging over an ordered list of providers."""
+
+    def __init__(
+        self,
+        providers: list[Provider],
+        hedge_enabled: bool,
+        hedge_quantile: float,
+        hedge_min_samples: int,
+        breaker_failures: int,
+        breaker_cooldown: float,
+        ewma_alpha: float,
+        max_concurrency: int,
+    ):
+        self.providers = providers
+        self.hedge_enabled = hedge_enabled
+        self.hedge_quantile = hedge_quantile
+        self.hedge_min_samples = hedge_min_samples
+        self.breakers = {
+            p.name: CircuitBreaker(p.name, breaker_failures, breaker_cooldown, p.timeout) for p in providers
+        }
+        self.stats = {
+            (p.name, kind): ProviderStats(ewma_alpha) for p in providers for kind in (COMPLETE, STREAM)
+        }
+        self.hedges = 0
+        self._executor = ThreadPoolExecutor(max_workers=max(2, max_concurrency), thread_name_prefix="llm")
+
+    def complete(self, request: LLMRequest) -> str:
+        return "".join(self._generate(COMPLETE, request))
+
+    def stream(self, request: LLMRequest) -> Iterator[str]:
+        return self._generate(STREAM, request)
+
+    def snapshot(self) -> dict:
+        return {
+            "hedges": self.hedges,
+            "providers": {
+                p.name: {
+                    "breaker": self.breakers[p.name].state,
+                    COMPLETE: self.stats[(p.name, COMPLETE)].snapshot(),
+                    STREAM: self.stats[(p.name, STREAM)].snapshot(),
+                }
+                for p in self.providers
+            },
+        }
+
+    def close(self) -> None:
+        self._executor.shutdown(wait=False, cancel_futures=True)
+
+    # -- internals ----------------------------------------------------------------
+
+    def _hedge_delay(self, provider: Provider, kind: str) -> float | None:
+        if not self.hedge_enabled:
+            return None
+        delay = self.stats[(provider.name, kind)].quantile(self.hedge_quantile, self.hedge_min_samples)
+        return None if delay is None or delay >= provider.timeout else delay
+
+    def _failed(self, run: _Run, kind: str, reason, outcome: str = "error") -> None:
+        LLM_CALLS.inc(provider=run.provider.name, kind=kind, outcome=outcome)
+        self.stats[(run.provider.name, kind)].failure()
+        self.breakers[run.provider.name].failure()
+        run.cancelled.set()
+        logger.warning("LLM provider %s failed: %s", run.provider.name, reason)
+
+    def _abandon(self, run: _Run) -> None:
+        """Stop a run that will never report success or failure (lost a hedge,
+        consumer went away), releasing the breaker's probe if it was one."""
+        run.cancelled.set()
+        if run.probe:
+            self.breakers[run.provider.name].abandon()
+
+    def _generate(self, kind: str, request: LLMRequest) -> Iterator[str]:
+        events: queue.Queue = queue.Queue()
+        candidates = iter(self.providers)
+        active: list[_Run] = []
+        winner: _Run | None = None
+        hedge_at: float | None = None
+        empty = False
+
+        def start_next() -> bool:
+            nonlocal hedge_at
+            for provider in candidates:
+                admitted = self.breakers[provider.name].allow()
+                if admitted is None:
+                    continue
+                if kind == STREAM:
+                    produce = lambda p=provider: p.stream(request)
+                else:
+                    produce = lambda p=provider: iter([p.complete(request)])
+                run = _Run(provider, produce, events, probe=admitted == "probe")
+                active.append(run)
+                # Copy the request id into the pool thread for its log lines
+                self._executor.submit(contextvars.copy_context().run, run)
+                delay = self._hedge_delay(provider, kind)
+                hedge_at = run.started + delay if delay is not None else None
+                return True
+            return False
+
+        if not start_next():
+            raise AllProvidersFailed("No LLM provider available")
+
+        try:
+            while True:
+                now = time.monotonic()
+                wake = min(run.deadline for run in active)
+                if winner is None and hedge_at is not None:
+                    wake = min(wake, hedge_at)
+
+                try:
+                    run, event, payload = events.get(timeout=max(0.0, wake - now))
+                except queue.Empty:
+                    now = time.monotonic()
+                    for run in [r for r in active if r.deadline <= now]:
+                        active.remove(run)
+                        reason = f"timed out after {run.provider.timeout:.1f}s"
+                        self._failed(run, kind, reason, "timeout")
+                        if run is winner:
+                            raise ReplyInterrupted(f"LLM provider {run.provider.name} {reason} mid-reply")
+                    if winner is None and hedge_at is not None and now >= hedge_at:
+                        hedge_at = None
+                        if start_next():
+                            self.hedges += 1
+                            LLM_ROUTING.inc(event="hedge")
+                            logger.info("Hedging LLM request to %s", active[-1].provider.name)
+                    if not active:
+                        if not start_next():
+                            raise AllProvidersFailed("Every LLM provider timed out")
+                        LLM_ROUTING.inc(event="fallback")
+                    continue
+
+                if run not in active:
+                    continue  # a run we already gave up on
+
+                if event == "chunk":
+                    if winner is None:
+                        winner = run
+                        latency = time.monotonic() - run.started
+                        LLM_SECONDS.observe(latency, provider=run.provider.name, kind=kind)
+                        LLM_CALLS.inc(provider=run.provider.name, kind=kind, outcome="success")
+                        self.stats[(run.provider.name, kind)].success(latency)
+                        self.breakers[run.provider.name].success()
+                        for other in active:
+                            if other is not run:
+                                self._abandon(other)
+                        active[:] = [run]
+                    # Streams get a fresh timeout per chunk
+                    run.deadline = time.monotonic() + run.provider.timeout
+                    yield payload
+                    continue
+
+                active.remove(run)
+                if event == "end" and run is winner:
+                    return
+                if run is winner:
+                    # Stream broke after output was sent; we can't switch providers mid-reply
+                    self._failed(run, kind, payload)
+                    raise ReplyInterrupted(f"LLM provider {run.provider.name} failed mid-reply: {payload}")
+
+                empty = empty or event == "end"
+                if event == "error":
+                    self._failed(run, kind, payload)
+                else:
+                    self._failed(run, kind, "empty response", "empty")
+                if not active:
+                    if not start_next():
+                        raise AllProvidersFailed("Every LLM provider failed", empty=empty)
+                    LLM_ROUTING.inc(event="fallback")
+        finally:
+            # Consumer stopped early (e.g. client disconnected) or we are done:
+            # abandon calls that are still running
+            for run in active:
+                if run is winner:
+                    run.cancelled.set()  # already reported success
+                else:
+                    self._abandon(run)
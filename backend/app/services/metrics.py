@@ -0,0 +1,222 @@
+"""
+In-process metrics, rendered in the Prometheus text format at /metrics.
+
+- Counter and Histogram are updated on the hot path. An update is a
+  perf_counter call, a bisect and one lock; no allocation after a label
+  set is first seen.
+- Callback metrics (cache hit counters, queue depths) are read only when
+  /metrics is scraped, so they cost nothing per request.
+
+Every process keeps its own numbers. With several uvicorn workers, scrape
+each one (or run one worker per container).
+"""
+
+import abc
+import bisect
+import threading
+import time
+from contextlib import contextmanager
+from typing import Callable
+
+# Seconds; covers sub-ms cache hits up to slow LLM calls
+DEFAULT_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0)
+
+
+def _labels(names: tuple[str, ...], values: tuple, extra: str = "") -> str:
+    pairs = [f'{name}="{str(value)}"' for name, value in zip(names, values)]
+    if extra:
+        pairs.append(extra)
+    return "{" + ",".join(pairs) + "}" if pairs else ""
+
+
+class _Metric(abc.ABC):
+    type = "untyped"
+
+    def __init__(self, name: str, help: str, labelnames: tuple[str, ...] = ()):
+        self.name = name
+        self.help = help
+        self.labelnames = tuple(labelnames)
+        self._lock = threading.Lock()
+        REGISTRY.register(self)
+
+    def _key(self, labels: dict) -> tuple:
+        return tuple(labels.get(name, "") for name in self.labelnames)
+
+    def render(self) -> list[str]:
+        return [f"# HELP {self.name} {self.help}", f"# TYPE {self.name} {self.type}", *self.samples()]
+
+    @abc.abstractmethod
+    def samples(self) -> list[str]:
+        ...
+
+
+class Counter(_Metric):
+    type = "counter"
+
+    def __init__(self, name: str, help: str, labelnames: tuple[str, ...] = ()):
+        super().__init__(name, help, labelnames)
+        self._values: dict[tuple, float] = {}
+
+    def inc(self, amount: float = 1, **labels) -> None:
+        key = self._key(labels)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0) + amount
+
+    def samples(self) -> list[str]:
+        with self._lock:
+            items = list(self._values.items())
+        return [f"{self.name}{_labels(self.labelnames, key)} {value}" for key, value in items]
+
+
+class Histogram(_Metric):
+    type = "histogram"
+
+    def __init__(self, name: str, help: str, labelnames: tuple[str, ...] = (), buckets=DEFAULT_BUCKETS):
+        super().__init__(name, help, labelnames)
+        self.buckets = tuple(sorted(buckets))
+        # label values -> [per-bucket counts..., +Inf count], sum
+        self._values: dict[tuple, tuple[list[int], list[float]]] = {}
+
+    def observe(self, value: float, **labels) -> None:
+        key = self._key(labels)
+        index = bisect.bisect_left(self.buckets, value)
+        with self._lock:
+            entry = self._values.get(key)
+            if entry is None:
+                entry = self._values[key] = ([0] * (len(self.buckets) + 1), [0.0])
+            entry[0][index] += 1
+            entry[1][0] += value
+
+    @contextmanager
+    def time(self, **labels):
+        started = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe(time.perf_counter() - started, **labels)
+
+    def samples(self) -> list[str]:
+        with self._lock:
+            items = [(key, list(counts), total[0]) for key, (counts, total) in self._values.items()]
+        lines = []
+        for key, counts, total in items:
+            cumulative = 0
+            for bound, count in zip((*self.buckets, "+Inf"), counts):
+                cumulative += count
+                le = 'le="%s"' % bound
+                lines.append(f"{self.name}_bucket{_labels(self.labelnames, key, le)} {cumulative}")
+            lines.append(f"{self.name}_sum{_labels(self.labelnames, key)} {total}")
+            lines.append(f"{self.name}_count{_labels(self.labelnames, key)} {cumulative}")
+        return lines
+
+
+class CallbackMetric(_Metric):
+    """Values computed at scrape time: callback() -> {label values tuple: value}."""
+
+    def __init__(self, name: str, help: str, type: str, labelnames: tuple[str, ...], callback: Callable[[], dict]):
+        self.type = type
+        self.callback = callback
+        super().__init__(name, help, labelnames)
+
+    def samples(self) -> list[str]:
+        try:
+            values = self.callback()
+        except Exception:
+            return []
+        return [f"{self.name}{_labels(self.labelnames, key)} {value}" for key, value in values.items()]
+
+
+class Registry:
+    def __init__(self):
+        self._metrics: dict[str, _Metric] = {}
+
+    def register(self, metric: _Metric) -> None:
+        self._metrics[metric.name] = metric
+
+    def render(self) -> str:
+        lines = []
+        for metric in list(self._metrics.values()):
+            lines.extend(metric.render())
+        return "\n".join(lines) + "\n"
+
+
+REGISTRY = Registry()
+
+# -- shared metrics ------------------------------------------------------------------
+
+REQUEST_SECONDS = Histogram(
+    "thera_http_request_duration_seconds", "HTTP request latency", ("method", "route", "status")
+)
+STAGE_SECONDS = Histogram(
+    "thera_stage_duration_seconds",
+    "Time spent per pipeline stage (decode, features, encoder, auth, supabase_read, ...)",
+    ("stage",),
+)
+LLM_SECONDS = Histogram(
+    "thera_llm_first_output_seconds",
+    "Time to the first chunk (stream) or full reply (complete), per provider",
+    ("provider", "kind"),
+)
+LLM_CALLS = Counter(
+    "thera_llm_calls_total", "LLM provider calls by outcome (success, error, timeout, empty)",
+    ("provider", "kind", "outcome"),
+)
+LLM_ROUTING = Counter(
+    "thera_llm_routing_total", "Router decisions: fallback to the next provider, or hedge", ("event",)
+)
+EMOTION_RESULTS = Counter("thera_emotion_results_total", "Emotion predictions by label", ("emotion",))
+ADMISSION_WAIT = Histogram(
+    "thera_admission_wait_seconds", "Time spent waiting for a slot, per admission stage", ("stage",)
+)
+ADMISSION_REJECTED = Counter(
+    "thera_admission_rejected_total", "Requests turned away per stage (queue_full, deadline)", ("stage", "reason")
+)
+MESSAGES_DROPPED = Counter(
+    "thera_messages_dropped_total", "Chat messages not persisted (queue_full, insert_failed)", ("reason",)
+)
+
+
+def stage(name: str):
+    """`with stage("decode"): ...` records the block's duration."""
+    return STAGE_SECONDS.time(stage=name)
+
+
+# -- scrape-time sources ---------------------------------------------------------------
+
+_caches: dict[str, Callable[[], dict]] = {}
+_queues: dict[str, Callable[[], int]] = {}
+
+
+def register_cache(name: str, stats: Callable[[], dict]) -> None:
+    """Expose a cache's stats() (hits, misses, evictions, size) at scrape time."""
+    _caches[name] = stats
+
+
+def register_queue(name: str, depth: Callable[[], int]) -> None:
+    """Expose a queue depth read at scrape time."""
+    _queues[name] = depth
+
+
+def _collect(sources: dict, read: Callable) -> Callable[[], dict]:
+    def collect() -> dict:
+        values = {}
+        for name, source in list(sources.items()):
+            try:
+                values[(name,)] = read(source)
+            except Exception:
+                continue  # source not built yet / gone
+        return values
+
+    return collect
+
+
+for _field, _type in (("hits", "counter"), ("misses", "counter"), ("evictions", "counter"), ("size", "gauge")):
+    CallbackMetric(
+        f"thera_cache_{_field}" + ("_total" if _type == "counter" else ""),
+        f"Cache {_field}",
+        _type,
+        ("cache",),
+        _collect(_caches, lambda stats, field=_field: stats()[field]),
+    )
+
+CallbackMetric("thera_queue_depth", "Items waiting per queue", "gauge", ("queue",), _collect(_queues, lambda depth: depth()))
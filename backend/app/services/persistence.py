@@ -0,0 +1,174 @@
+"""
+Write-behind persistence for chat messages.
+
+save_message hands rows to a background writer instead of inserting
+inline. The writer accumulates rows and flushes them as multi-row inserts
+once PERSIST_BATCH_SIZE rows are waiting or the oldest row has waited
+PERSIST_FLUSH_INTERVAL_MS. Transient Supabase errors are retried with
+exponential backoff.
+
+Ordering: there is a single writer thread, and every row carries a
+client-side created_at stamped at enqueue time, so reads that order by
+created_at see each user's messages in the order they were saved.
+
+Backpressure: at most PERSIST_MAX_PENDING rows wait in memory. Past that,
+enqueue drops the row (logged, thera_messages_dropped_total{reason=
+"queue_full"}) rather than insert inline: it is called from the event
+loop, and a synchronous insert there would stall every request on the
+worker exactly when the database is already behind.
+"""
+
+import logging
+import threading
+import time
+from collections import deque
+from app.config import settings
+from app.db import get_supabase
+from app.services.metrics import MESSAGES_DROPPED, register_queue, stage
+
+logger = logging.getLogger(__name__)
+
+
+class MessageWriter:
+    """Background thread that batches message inserts."""
+
+    def __init__(
+        self,
+        table: str,
+        batch_size: int,
+        flush_interval_ms: float,
+        max_retries: int,
+        retry_backoff_ms: float,
+        max_pending: int,
+    ):
+        self.table = table
+        self.batch_size = max(1, batch_size)
+        self.flush_interval = flush_interval_ms / 1000
+        self.max_retries = max_retries
+        self.retry_backoff = retry_backoff_ms / 1000
+        self.max_pending = max_pending
+
+        self._pending: deque[tuple[float, dict]] = deque()
+        self._cond = threading.Condition()
+        self._thread: threading.Thread | None = None
+        self._closing = False
+
+    def start(self):
+        """Start the writer thread (idempotent)."""
+        with self._cond:
+            if self._thread is not None and self._thread.is_alive():
+                return
+            self._closing = False
+            self._thread = threading.Thread(target=self._run, name="message-writer", daemon=True)
+            self._thread.start()
+
+    def enqueue(self, row: dict) -> None:
+        """Queue a row for insertion. Never blocks on the database; drops the
+        row if PERSIST_MAX_PENDING rows are already waiting."""
+        if self._thread is None:
+            self.start()
+
+        with self._cond:
+            if len(self._pending) < self.max_pending:
+                self._pending.append((time.monotonic(), row))
+                self._cond.notify()
+                return
+
+        # Queue full: the database is not keeping up. Inserting inline would
+        # block the event loop, so the row is dropped and counted.
+        MESSAGES_DROPPED.inc(reason="queue_full")
+        logger.error(
+            "Message queue full (%d), dropping %s message for user %s",
+            self.max_pending, row.get("role"), row.get("user_id"),
+        )
+
+    def pending_count(self) -> int:
+        return len(self._pending)
+
+    def close(self, timeout: float | None = None):
+        """Flush everything still queued and stop the writer."""
+        with self._cond:
+            self._closing = True
+            self._cond.notify()
+        if self._thread is not None:
+            self._thread.join(timeout)
+            self._thread = None
+        logger.info("Message writer closed (%d rows left)", len(self._pending))
+
+    def _next_batch(self) -> list[dict] | None:
+        """Block until a batch is due; None once closed and drained."""
+        with self._cond:
+            while not self._pending and not self._closing:
+                self._cond.wait()
+            if not self._pending:
+                return None
+
+            deadline = self._pending[0][0] + self.flush_interval
+            while len(self._pending) < self.batch_size and not self._closing:
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    break
+                self._cond.wait(remaining)
+
+            count = min(self.batch_size, len(self._pending))
+            return [self._pending.popleft()[1] for _ in range(count)]
+
+    def _run(self):
+        while True:
+            batch = self._next_batch()
+            if batch is None:
+                return
+            try:
+                self._flush(batch)
+            except Exception as exc:
+                logger.error("Unexpected message writer error: %s", exc, exc_info=True)
+
+    def _flush(self, rows: list[dict]):
+        # PostgREST bulk inserts need identical keys in every object (optional
+        # columns like emotion are omitted, not NULL), so insert one group per
+        # key set. Order across groups is carried by created_at.
+        groups: dict[tuple, list[dict]] = {}
+        for row in rows:
+            groups.setdefault(tuple(sorted(row)), []).append(row)
+
+        for group in groups.values():
+            if self._insert_with_retry(group):
+                continue
+            # The whole batch failed: save what we can one row at a time
+            for row in group:
+                if not self._insert_with_retry([row], retries=0):
+                    MESSAGES_DROPPED.inc(reason="insert_failed")
+
+    def _insert_with_retry(self, rows: list[dict], retries: int | None = None) -> bool:
+        retries = self.max_retries if retries is None else retries
+        for attempt in range(retries + 1):
+            try:
+                self._insert(rows)
+                return True
+            except Exception as exc:
+                if attempt == retries:
+                    logger.error(
+                        "Failed to save %d message(s) after %d attempt(s): %s",
+                        len(rows), attempt + 1, exc, exc_info=True,
+                    )
+                    return False
+                delay = self.retry_backoff * (2 ** attempt)
+                logger.warning("Message insert failed (%s), retrying in %.2fs", exc, delay)
+                time.sleep(delay)
+        return False
+
+    def _insert(self, rows: list[dict]):
+        with stage("supabase_write"):
+            get_supabase().table(self.table).insert(rows).execute()
+
+
+# Singleton instance
+message_writer = MessageWriter(
+    table="messages",
+    batch_size=settings.PERSIST_BATCH_SIZE,
+    flush_interval_ms=settings.PERSIST_FLUSH_INTERVAL_MS,
+    max_retries=settings.PERSIST_MAX_RETRIES,
+    retry_backoff_ms=settings.PERSIST_RETRY_BACKOFF_MS,
+    max_pending=settings.PERSIST_MAX_PENDING,
+)
+register_queue("message_writer", message_writer.pending_count)
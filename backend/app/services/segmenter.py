@@ -0,0 +1,155 @@
+"""
+Sliding-window emotion analysis for recordings longer than one encoder pass.
+
+The Whisper encoder sees at most 30 s, so longer audio is split into
+overlapping windows (EMOTION_WINDOW_SECONDS long, every
+EMOTION_WINDOW_HOP_SECONDS). Windows that are mostly silence, according to
+a cheap frame-energy VAD, are skipped. The rest are classified in batches
+of EMOTION_SEGMENT_BATCH and combined into:
+
+- a clip-level emotion: the mean of the window probabilities, weighted by
+  how much speech each window contains;
+- a per-segment timeline.
+
+Audio is decoded block by block straight from the file, so memory is
+bounded by one batch of windows regardless of recording length, and cost
+grows linearly with duration.
+"""
+
+import logging
+import soundfile as sf
+import torch
+from app.config import settings
+from app.services.audio_input import AudioSource, open_audio
+from app.services.emotion import EmotionModel, get_emotion_service
+from app.services.metrics import stage
+
+logger = logging.getLogger(__name__)
+
+_VAD_FRAME_SECONDS = 0.025
+
+
+def audio_duration(audio: AudioSource) -> float:
+    """Duration in seconds, read from the header only."""
+    return sf.info(open_audio(audio)).duration
+
+
+def is_long_audio(audio: AudioSource) -> bool:
+    """True if the clip is longer than EMOTION_LONG_AUDIO_SECONDS."""
+    try:
+        return audio_duration(audio) > settings.EMOTION_LONG_AUDIO_SECONDS
+    except Exception:
+        # Let the regular path report the decode error
+        return False
+
+
+def speech_ratio(waveform: torch.Tensor, sample_rate: int, threshold_db: float) -> float:
+    """Fraction of 25 ms frames whose RMS level is above threshold_db (dBFS)."""
+    frame = max(1, int(sample_rate * _VAD_FRAME_SECONDS))
+    usable = len(waveform) // frame * frame
+    if usable == 0:
+        return 0.0
+    rms = waveform[:usable].view(-1, frame).pow(2).mean(dim=1).sqrt()
+    level_db = 20 * torch.log10(rms.clamp(min=1e-10))
+    return (level_db > threshold_db).float().mean().item()
+
+
+def _windows(audio: AudioSource, window_seconds: float, hop_seconds: float):
+    """Yield (start_s, end_s, mono waveform, sample_rate) for each window, at the file's native rate."""
+    with sf.SoundFile(open_audio(audio)) as f:
+        sample_rate = f.samplerate
+        blocksize = int(window_seconds * sample_rate)
+        overlap = blocksize - int(hop_seconds * sample_rate)
+        min_samples = int(settings.EMOTION_MIN_WINDOW_SECONDS * sample_rate)
+
+        start = 0
+        for block in f.blocks(blocksize=blocksize, overlap=overlap, dtype="float32", always_2d=True):
+            if len(block) < min_samples and start > 0:
+                break
+            mono = torch.from_numpy(block.mean(axis=1) if block.shape[1] > 1 else block[:, 0])
+            yield start / sample_rate, (start + len(block)) / sample_rate, mono, sample_rate
+            start += blocksize - overlap
+
+
+def analyze_long_audio(audio: AudioSource, model: EmotionModel | None = None) -> dict:
+    with stage("long_audio"):
+        return _analyze_long_audio(audio, model)
+
+
+def _analyze_long_audio(audio: AudioSource, model: EmotionModel | None) -> dict:
+    """
+    Clip-level emotion plus a per-window timeline for audio of any length.
+
+    Returns {"emotion", "confidence", "duration",
+             "segments": [{"start", "end", "emotion", "confidence", "speech_ratio"}]}
+    """
+    model = model or get_emotion_service()
+    vad = settings.EMOTION_VAD_ENABLED
+    batch_size = max(1, settings.EMOTION_SEGMENT_BATCH)
+
+    segments: list[dict] = []
+    total = torch.zeros(len(model.labels))
+    total_weight = 0.0
+    pending: list[tuple[float, float, float, torch.Tensor]] = []
+    best_silent = None  # loudest skipped window, used if nothing passes the VAD
+
+    def flush():
+        nonlocal total, total_weight
+        if not pending:
+            return
+        features = model.frontend.features_from_waveforms(
+            [waveform for *_, waveform in pending], pad_to_max=not model.variable_length
+        )
+        probs = model.probabilities(features)
+        for (start, end, ratio, _), p in zip(pending, probs):
+            pred_id = int(p.argmax())
+            segments.append({
+                "start": round(start, 2),
+                "end": round(end, 2),
+                "emotion": model.labels[pred_id],
+                "confidence": p[pred_id].item(),
+                "speech_ratio": round(ratio, 3),
+            })
+            weight = max(ratio, 1e-3) * (end - start)
+            total += p * weight
+            total_weight += weight
+        pending.clear()
+
+    duration = 0.0
+    with torch.no_grad():
+        for start, end, waveform, sample_rate in _windows(
+            audio, settings.EMOTION_WINDOW_SECONDS, settings.EMOTION_WINDOW_HOP_SECONDS
+        ):
+            duration = end
+            ratio = speech_ratio(waveform, sample_rate, settings.EMOTION_VAD_THRESHOLD_DB) if vad else 1.0
+            waveform = model.frontend.resample(waveform, sample_rate)
+
+            if vad and ratio < settings.EMOTION_VAD_MIN_SPEECH_RATIO:
+                if best_silent is None or ratio > best_silent[2]:
+                    best_silent = (start, end, ratio, waveform)
+                continue
+
+            pending.append((start, end, ratio, waveform))
+            if len(pending) >= batch_size:
+                flush()
+
+        if not segments and not pending and best_silent is not None:
+            pending.append(best_silent)
+        flush()
+
+    if total_weight == 0:
+        raise RuntimeError("Emotion detection error: audio has no samples")
+
+    clip_probs = total / total_weight
+    pred_id = int(clip_probs.argmax())
+    logger.info(
+        "Long audio analysed: duration=%.1fs windows=%d emotion=%s",
+        duration, len(segments), model.labels[pred_id],
+    )
+
+    return {
+        "emotion": model.labels[pred_id],
+        "confidence": clip_probs[pred_id].item(),
+        "duration": round(duration, 2),
+        "segments": segments,
+    }
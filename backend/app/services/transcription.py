@@ -0,0 +1,104 @@
+"""
+Server-side speech-to-text on the emotion model's encoder.
+
+With STT_ENABLED, /chat and /chat/stream accept a clip without `text` and
+transcribe it on the server. The emotion classifier already runs a Whisper
+encoder over the clip, so the transcript comes from a Whisper decoder
+(WHISPER_MODEL) cross-attending to those same encoder states. The clip is
+encoded once per turn, for both the emotion head and the decoder.
+
+- Sharing needs a decoder of the encoder's size (whisper-tiny for the
+  shipped classifier). The Whisper checkpoint's own encoder is then
+  replaced by the classifier's module, so those weights are in memory once.
+- If the classifier's encoder was fine-tuned, the decoder reads states it
+  was not trained on; loading logs how far the weights moved. With
+  STT_SHARE_ENCODER=false (or a size mismatch) the decoder keeps its own
+  encoder, at the cost of a second encoder pass per transcribed clip.
+- Transcribed clips are encoded at Whisper's fixed 30 s input, which is
+  what the decoder expects, whatever EMOTION_VARIABLE_LENGTH says.
+"""
+
+import logging
+import os
+import torch
+import torch.nn as nn
+from app.config import settings
+from app.services.metrics import stage
+
+logger = logging.getLogger(__name__)
+
+
+def whisper_model_id(name: str) -> str:
+    """"tiny" -> "openai/whisper-tiny"; Hub ids and local directories as is."""
+    if "/" in name or os.path.isdir(name):
+        return name
+    return f"openai/whisper-{name}"
+
+
+def _same_shapes(a: nn.Module, b: nn.Module) -> bool:
+    shapes = lambda module: {name: t.shape for name, t in module.state_dict().items()}
+    return shapes(a) == shapes(b)
+
+
+def _max_difference(a: nn.Module, b: nn.Module) -> float:
+    other = b.state_dict()
+    return max(
+        (t.float().cpu() - other[name].float().cpu()).abs().max().item()
+        for name, t in a.state_dict().items()
+    )
+
+
+class WhisperTranscriber:
+    """Whisper decoder + tokenizer; generates text from encoder states."""
+
+    def __init__(self, encoder: nn.Module, device: torch.device):
+        from transformers import WhisperForConditionalGeneration, WhisperTokenizer
+
+        model_id = whisper_model_id(settings.WHISPER_MODEL)
+        local_only = settings.STT_LOCAL_FILES_ONLY
+        self.model = WhisperForConditionalGeneration.from_pretrained(model_id, local_files_only=local_only)
+        self.tokenizer = WhisperTokenizer.from_pretrained(model_id, local_files_only=local_only)
+
+        own_encoder = self.model.model.encoder
+        self.shared = settings.STT_SHARE_ENCODER and _same_shapes(own_encoder, encoder)
+        if self.shared:
+            drift = _max_difference(own_encoder, encoder)
+            if drift > 1e-6:
+                logger.warning(
+                    "Emotion encoder differs from %s (max |dw| = %.3g); transcripts are decoded from its states",
+                    model_id, drift,
+                )
+            self.model.model.encoder = encoder
+            del own_encoder
+        elif settings.STT_SHARE_ENCODER:
+            logger.warning("%s encoder does not match the emotion encoder; transcribing with its own", model_id)
+
+        self.model.to(device).eval()
+        self.generate_kwargs = {
+            "task": "transcribe",
+            "max_new_tokens": settings.STT_MAX_NEW_TOKENS,
+        }
+        if settings.STT_LANGUAGE:
+            self.generate_kwargs["language"] = settings.STT_LANGUAGE
+        logger.info("STT model %s loaded (shared encoder: %s)", model_id, self.shared)
+
+    @torch.no_grad()
+    def transcribe(
+        self,
+        encoder_states: torch.Tensor | None = None,
+        input_features: torch.Tensor | None = None,
+    ) -> list[str]:
+        """
+        Text per clip, from the shared encoder's states [B, 1500, d_model],
+        or from full 30 s log-mel features [B, 80, 3000] (own encoder).
+        """
+        if encoder_states is not None:
+            from transformers.modeling_outputs import BaseModelOutput
+
+            inputs = {"encoder_outputs": BaseModelOutput(last_hidden_state=encoder_states)}
+        else:
+            inputs = {"input_features": input_features}
+
+        with stage("stt_decoder"):
+            tokens = self.model.generate(**inputs, **self.generate_kwargs)
+        return [text.strip() for text in self.tokenizer.batch_decode(tokens, skip_special_tokens=True)]
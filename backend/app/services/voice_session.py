@@ -0,0 +1,257 @@
+"""
+Incremental emotion inference for a voice turn streamed over /chat/session.
+
+The client sends the turn as PCM frames while the user speaks. A
+VoiceTurn classifies the audio in the background as it arrives, so when
+the client ends the turn there is little or nothing left to run:
+
+- Windows are laid out like the long-audio segmenter's:
+  EMOTION_WINDOW_SECONDS long, starting every EMOTION_WINDOW_HOP_SECONDS.
+  Each window is classified once, as soon as its last sample arrives.
+- The open window runs from the last window start to the newest sample.
+  It is classified provisionally every SESSION_EMOTION_UPDATE_SECONDS of
+  new audio, and as soon as the speaker pauses for SESSION_PAUSE_SECONDS
+  (same energy VAD as the segmenter). Each estimate is passed to
+  `on_estimate`, so the client can show a live emotion.
+- At the end of the turn, the last estimate is reused if it already
+  covers the last voiced frame, which is the usual case since speech ends
+  in a pause. Otherwise the open window is classified once more.
+
+The turn's emotion is a vote over its windows: confidence, weighted by
+speech ratio and length. Windows the VAD marks as silence are skipped,
+as in analyze_long_audio.
+
+Each turn has one classification in flight at a time. Only the audio from
+the oldest unfinished window on is kept: one window plus one hop while
+inference keeps up, never more than SESSION_MAX_TURN_SECONDS.
+"""
+
+import asyncio
+import io
+import logging
+from typing import Awaitable, Callable
+import numpy as np
+import soundfile as sf
+from app.config import settings
+from app.services.audio_decode import StreamResampler
+from app.services.audio_frontend import SAMPLE_RATE
+from app.services.executors import run_decode
+
+logger = logging.getLogger(__name__)
+
+# Same 25 ms frames as segmenter.speech_ratio
+VAD_FRAME = int(SAMPLE_RATE * 0.025)
+
+PCM_FORMATS = {"pcm_f32le": np.dtype("<f4"), "pcm_s16le": np.dtype("<i2")}
+
+Classifier = Callable[[io.BytesIO], Awaitable[dict]]
+
+
+def frame_levels_db(samples: np.ndarray) -> np.ndarray:
+    """RMS level (dBFS) of each whole VAD_FRAME of `samples`."""
+    usable = len(samples) // VAD_FRAME * VAD_FRAME
+    frames = samples[:usable].reshape(-1, VAD_FRAME)
+    rms = np.sqrt(np.mean(np.square(frames, dtype=np.float32), axis=1))
+    return 20 * np.log10(np.maximum(rms, 1e-10))
+
+
+def window_wav(samples: np.ndarray) -> tuple[bytes, float]:
+    """16 kHz float32 WAV of a window, and its speech ratio."""
+    buffer = io.BytesIO()
+    sf.write(buffer, samples, SAMPLE_RATE, format="WAV", subtype="FLOAT")
+    if not settings.EMOTION_VAD_ENABLED:
+        return buffer.getvalue(), 1.0
+    levels = frame_levels_db(samples)
+    ratio = float(np.mean(levels > settings.EMOTION_VAD_THRESHOLD_DB)) if len(levels) else 0.0
+    return buffer.getvalue(), ratio
+
+
+def combine(segments: list[dict]) -> dict:
+    """Turn-level {"emotion", "confidence"} from classified windows."""
+    scores: dict[str, float] = {}
+    total = 0.0
+    for segment in segments:
+        weight = max(segment["speech_ratio"], 1e-3) * (segment["end"] - segment["start"])
+        scores[segment["emotion"]] = scores.get(segment["emotion"], 0.0) + segment["confidence"] * weight
+        total += weight
+    emotion = max(scores, key=scores.get)
+    return {"emotion": emotion, "confidence": scores[emotion] / total}
+
+
+class VoiceTurn:
+    """One turn's audio, classified window by window while it arrives."""
+
+    def __init__(
+        self,
+        classify: Classifier,
+        sample_rate: int = SAMPLE_RATE,
+        pcm_format: str = "pcm_f32le",
+        on_estimate: Callable[[dict], Awaitable[None]] | None = None,
+    ):
+        self.classify = classify
+        self.on_estimate = on_estimate
+        self.dtype = PCM_FORMATS[pcm_format]
+        self.resampler = StreamResampler(sample_rate) if sample_rate != SAMPLE_RATE else None
+
+        self.window = int(settings.EMOTION_WINDOW_SECONDS * SAMPLE_RATE)
+        self.hop = int(settings.EMOTION_WINDOW_HOP_SECONDS * SAMPLE_RATE)
+        self.min_window = int(settings.EMOTION_MIN_WINDOW_SECONDS * SAMPLE_RATE)
+        self.update = int(settings.SESSION_EMOTION_UPDATE_SECONDS * SAMPLE_RATE)
+        self.pause = int(settings.SESSION_PAUSE_SECONDS * SAMPLE_RATE)
+        self.max_samples = int(settings.SESSION_MAX_TURN_SECONDS * SAMPLE_RATE)
+
+        # Positions are sample indices from the start of the turn
+        self.audio = np.empty(0, dtype=np.float32)  # samples from `offset` on
+        self.offset = 0
+        self.length = 0
+        self.vad_pos = 0  # analysed by the VAD up to here
+        self.last_voiced = 0  # end of the last voiced frame
+
+        self.next_start = 0  # first window not classified yet
+        self.final_end = 0  # end of the last classified window
+        self.segments: list[dict] = []  # classified windows that passed the VAD
+        self.estimate: dict | None = None  # open window, provisional
+        self.estimate_end = 0  # audio the estimate (or the final windows) cover
+
+        self.ended = False
+        self._wake = asyncio.Event()
+        self._worker = asyncio.create_task(self._run())
+
+    @property
+    def full(self) -> bool:
+        return self.length >= self.max_samples
+
+    @property
+    def seconds(self) -> float:
+        return self.length / SAMPLE_RATE
+
+    def push(self, data: bytes) -> None:
+        """Append one PCM frame (in the session's format and rate)."""
+        samples = np.frombuffer(data[: len(data) // self.dtype.itemsize * self.dtype.itemsize], dtype=self.dtype)
+        if self.dtype.kind == "i":
+            samples = samples.astype(np.float32) / 32768.0
+        else:
+            samples = samples.astype(np.float32)
+        if self.resampler:
+            samples = self.resampler.push(samples).numpy()
+        self._append(samples)
+
+    async def finish(self) -> dict:
+        """End of the turn: {"emotion", "confidence", "duration"}, plus
+        "segments" when the turn spans several windows."""
+        if self.resampler:
+            self._append(self.resampler.flush().numpy())
+        self.ended = True
+        self._wake.set()
+        await self._worker
+        if self.length == 0:
+            raise ValueError("audio has no samples")
+
+        segments = list(self.segments)
+        if self.length > self.final_end and (self.length - self.next_start >= self.min_window or not segments):
+            if self.estimate_end >= self.last_voiced:
+                tail = self.estimate  # covers every voiced frame already
+            else:
+                tail = await self._classify(self.next_start, self.length)
+            if tail is not None:
+                segments.append(tail)
+        if not segments:
+            # Nothing passed the VAD: go with the whole tail, like the segmenter's loudest window
+            segments.append(await self._classify(self.next_start, self.length, force=True))
+
+        result = {**combine(segments), "duration": round(self.seconds, 2)}
+        if len(segments) > 1:
+            result["segments"] = segments
+        return result
+
+    def cancel(self) -> None:
+        self.ended = True
+        if self._worker.done():
+            if not self._worker.cancelled() and self._worker.exception():
+                logger.warning(f"Voice turn inference failed: {self._worker.exception()}")
+        else:
+            self._worker.cancel()
+
+    # -- audio -----------------------------------------------------------------
+
+    def _append(self, samples: np.ndarray) -> None:
+        samples = samples[: max(0, self.max_samples - self.length)]
+        if not len(samples):
+            return
+        self.audio = np.concatenate([self.audio, samples])
+        self.length += len(samples)
+        self._update_vad()
+        self._wake.set()
+
+    def _update_vad(self) -> None:
+        if not settings.EMOTION_VAD_ENABLED:
+            self.last_voiced = self.length
+            return
+        end = self.length // VAD_FRAME * VAD_FRAME
+        if end <= self.vad_pos:
+            return
+        levels = frame_levels_db(self.audio[self.vad_pos - self.offset : end - self.offset])
+        voiced = np.flatnonzero(levels > settings.EMOTION_VAD_THRESHOLD_DB)
+        if len(voiced):
+            self.last_voiced = self.vad_pos + (int(voiced[-1]) + 1) * VAD_FRAME
+        self.vad_pos = end
+
+    def _trim(self) -> None:
+        keep_from = min(self.next_start, self.vad_pos)
+        if keep_from > self.offset:
+            self.audio = self.audio[keep_from - self.offset:]
+            self.offset = keep_from
+
+    # -- inference ---------------------------------------------------------------
+
+    def _estimate_due(self) -> bool:
+        if self.ended or self.length <= self.estimate_end:
+            return False
+        if self.length - self.estimate_end >= self.update:
+            return True
+        # The speaker paused: the turn may be over, classify what they said
+        return self.last_voiced > self.estimate_end and self.length - self.last_voiced >= self.pause
+
+    async def _run(self):
+        while True:
+            if self.next_start + self.window <= self.length:
+                start = self.next_start
+                segment = await self._classify(start, start + self.window)
+                if segment is not None:
+                    self.segments.append(segment)
+                self.final_end = start + self.window
+                self.next_start += self.hop
+                self.estimate, self.estimate_end = None, max(self.estimate_end, self.final_end)
+                self._trim()
+            elif self._estimate_due():
+                end = self.length
+                self.estimate = await self._classify(self.next_start, end)
+                self.estimate_end = end
+                if self.estimate is not None and self.on_estimate is not None:
+                    try:
+                        await self.on_estimate({
+                            **combine([*self.segments, self.estimate]),
+                            "duration": round(end / SAMPLE_RATE, 2),
+                        })
+                    except Exception as exc:
+                        # The client went away; finish() or cancel() follows
+                        logger.debug(f"Could not send emotion estimate: {exc}")
+            elif self.ended:
+                return
+            else:
+                self._wake.clear()
+                await self._wake.wait()
+
+    async def _classify(self, start: int, end: int, force: bool = False) -> dict | None:
+        """Classify [start, end); None when the VAD marks it as silence."""
+        wav, ratio = await run_decode(window_wav, self.audio[start - self.offset : end - self.offset])
+        if settings.EMOTION_VAD_ENABLED and ratio < settings.EMOTION_VAD_MIN_SPEECH_RATIO and not force:
+            return None
+        result = await self.classify(io.BytesIO(wav))
+        return {
+            "start": round(start / SAMPLE_RATE, 2),
+            "end": round(end / SAMPLE_RATE, 2),
+            "emotion": result["emotion"],
+            "confidence": result["confidence"],
+            "speech_ratio": round(ratio, 3),
+        }
@@ -0,0 +1,127 @@
+"""
+Early rejection of audio uploads, before the body is read.
+
+UploadGuardMiddleware sits in front of the upload routes (/chat,
+/chat/stream):
+
+- A Content-Length above the limit gets a 413 right away; the body is
+  never read.
+- Bodies without a length (chunked) are counted as they stream in, and
+  cut off with a 413 once they pass the limit.
+- For multipart bodies, the first chunks are held back until the audio
+  part's headers and first bytes have arrived (at most PEEK_BYTES). If
+  those bytes are not a supported container, the request gets a 400
+  without the rest being read. The held-back chunks are then passed on
+  unchanged.
+
+The limit is MAX_AUDIO_SIZE plus MULTIPART_OVERHEAD for the other form
+fields and part headers. The route still checks the exact file size.
+"""
+
+import json
+import re
+from starlette.exceptions import HTTPException
+from app.services.audio_input import HEADER_SIZE, TOO_LARGE, UNSUPPORTED_AUDIO, audio_format
+
+PEEK_BYTES = 64 * 1024
+MULTIPART_OVERHEAD = 64 * 1024
+
+
+def _boundary(content_type: str) -> bytes | None:
+    if not content_type.startswith("multipart/form-data"):
+        return None
+    for param in content_type.split(";")[1:]:
+        name, _, value = param.strip().partition("=")
+        if name.lower() == "boundary" and value:
+            return value.strip('"').encode("latin-1")
+    return None
+
+
+def inspect_multipart(body: bytes, boundary: bytes, field: str) -> bool | None:
+    """True/False once `field`'s first bytes are a supported/unsupported
+    audio container, None while they haven't arrived yet."""
+    delimiter = b"--" + boundary
+    name = re.compile(rb'(?:^|[;\s])name="%s"' % re.escape(field.encode()))
+    position = 0
+    while True:
+        start = body.find(delimiter, position)
+        if start < 0:
+            return None
+        headers_end = body.find(b"\r\n\r\n", start)
+        if headers_end < 0:
+            return None
+        data = headers_end + 4
+        if name.search(body, start, headers_end):
+            header = body[data:data + HEADER_SIZE]
+            if len(header) < HEADER_SIZE and body.find(delimiter, data) < 0:
+                return None
+            # An empty part is left to the route ("Audio file is empty")
+            return audio_format(header) is not None or body.startswith(b"\r\n" + delimiter, data)
+        position = data
+
+
+class UploadGuardMiddleware:
+    """Pure ASGI middleware; other paths pass straight through."""
+
+    def __init__(self, app, paths: tuple[str, ...], max_body: int, field: str = "file"):
+        self.app = app
+        self.paths = set(paths)
+        self.max_body = max_body
+        self.field = field
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http" or scope["method"] != "POST" or scope["path"] not in self.paths:
+            return await self.app(scope, receive, send)
+
+        headers = {name: value.decode("latin-1") for name, value in scope.get("headers", ())}
+        length = headers.get(b"content-length")
+        if length is not None and length.isdigit() and int(length) > self.max_body:
+            return await self._reject(send, 413, TOO_LARGE)
+
+        held: list[dict] = []
+        received = 0
+        boundary = _boundary(headers.get(b"content-type", ""))
+        if boundary:
+            body = b""
+            while len(body) < PEEK_BYTES:
+                message = await receive()
+                held.append(message)
+                if message["type"] != "http.request":
+                    break
+                body += message.get("body", b"")
+                verdict = inspect_multipart(body, boundary, self.field)
+                if verdict is False:
+                    return await self._reject(send, 400, UNSUPPORTED_AUDIO)
+                if verdict or not message.get("more_body", False):
+                    break
+            received = len(body)
+            if received > self.max_body:
+                return await self._reject(send, 413, TOO_LARGE)
+
+        async def guarded_receive():
+            nonlocal received
+            if held:
+                return held.pop(0)
+            message = await receive()
+            if message["type"] == "http.request":
+                received += len(message.get("body", b""))
+                if received > self.max_body:
+                    # Re-raised by FastAPI's body parsing and rendered as a 413
+                    raise HTTPException(status_code=413, detail=TOO_LARGE)
+            return message
+
+        await self.app(scope, guarded_receive, send)
+
+    @staticmethod
+    async def _reject(send, status: int, detail: str) -> None:
+        body = json.dumps({"detail": detail}, ensure_ascii=False).encode()
+        await send({
+            "type": "http.response.start",
+            "status": status,
+            "headers": [
+                (b"content-type", b"application/json"),
+                (b"content-length", str(len(body)).encode()),
+                (b"connection", b"close"),
+            ],
+        })
+        await send({"type": "http.response.body", "body": body})
@@ -0,0 +1,4 @@
+"""
+Benchmarks and parity checks. Run from the backend directory, e.g.
+python -m benchmarks.inference_backends
+"""
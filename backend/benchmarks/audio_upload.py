@@ -0,0 +1,128 @@
+"""
+Upload + decode time of compressed audio vs. the WAV path.
+
+    cd backend
+    python -m benchmarks.audio_upload --lengths 3,5,10,30 --uplink-mbps 0.5,2,10 --opus-kbps 32
+
+Each clip length is one synthetic speech clip (see benchmarks.corpus),
+encoded the ways a client can send it:
+
+- wav: 16 kHz 16-bit PCM, what the frontend's recorder builds today;
+- ogg-opus, webm-opus: Opus at --opus-kbps, as Firefox and Chrome
+  MediaRecorder produce it (webm-opus needs PyAV).
+
+Each encoding is then decoded the way /chat does it:
+
+- WAV goes straight into AudioFrontend.decode_into().
+- Compressed clips go through audio_decode.decode_to_wav() first, as on
+  the decode pool, then into decode_into().
+
+Decode time is the median of --repeats runs on this machine, with
+--threads torch threads. Upload time is modelled as one --rtt-ms plus
+size / uplink. Total = upload + decode, one column per uplink: on slow
+links the smaller upload more than pays for the decode.
+"""
+
+import argparse
+import io
+import statistics
+import time
+import numpy as np
+import soundfile as sf
+import torch
+from app.services.audio_decode import decode_to_wav
+from app.services.audio_frontend import AudioFrontend, SAMPLE_RATE
+from app.services.audio_input import audio_format
+from app.services.inference_backends import configure_threads
+from benchmarks.corpus import parse_floats, synthetic_signal, synthetic_wav
+
+MIC_RATE = 48000
+
+
+def encode_opus(signal: np.ndarray, container: str, kbps: float) -> bytes | None:
+    """Opus in Ogg or WebM at `kbps`, from 48 kHz mono float32 samples."""
+    try:
+        import av
+    except ImportError:
+        if container != "ogg":
+            return None
+        buffer = io.BytesIO()  # libsndfile picks the bitrate
+        sf.write(buffer, signal, MIC_RATE, format="OGG", subtype="OPUS")
+        return buffer.getvalue()
+
+    buffer = io.BytesIO()
+    with av.open(buffer, "w", format=container) as output:
+        stream = output.add_stream("libopus", rate=MIC_RATE)
+        stream.layout = "mono"
+        stream.bit_rate = int(kbps * 1000)
+        frame = av.AudioFrame.from_ndarray(signal[None, :], format="flt", layout="mono")
+        frame.sample_rate = MIC_RATE
+        resampler = av.AudioResampler(format=stream.codec_context.format.name, layout="mono", rate=MIC_RATE)
+        for converted in resampler.resample(frame):
+            output.mux(stream.encode(converted))
+        output.mux(stream.encode(None))
+    return buffer.getvalue()
+
+
+def decode_seconds(frontend: AudioFrontend, audio: bytes, repeats: int) -> float:
+    """Median server-side time from upload bytes to a filled batch row."""
+    container = audio_format(audio[:12])
+    row = torch.zeros(frontend.max_samples)
+
+    def run():
+        if container == "wav":
+            return frontend.decode_into(audio, row)
+        wav = decode_to_wav(audio, container)
+        try:
+            return frontend.decode_into(wav, row)
+        finally:
+            wav.close()
+
+    run()  # warmup (resampler kernels, codec init)
+    timings = []
+    for _ in range(repeats):
+        started = time.perf_counter()
+        run()
+        timings.append(time.perf_counter() - started)
+    return statistics.median(timings)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--lengths", default="3,5,10,30", help="Clip lengths (s)")
+    parser.add_argument("--uplink-mbps", default="0.5,2,10", help="Client uplink bandwidths (Mbit/s)")
+    parser.add_argument("--rtt-ms", type=float, default=0.0, help="Added once to every upload")
+    parser.add_argument("--opus-kbps", type=float, default=32.0)
+    parser.add_argument("--repeats", type=int, default=10)
+    parser.add_argument("--threads", type=int, default=1)
+    args = parser.parse_args()
+
+    configure_threads(args.threads, 0)
+    frontend = AudioFrontend(torch.device("cpu"))
+    uplinks = parse_floats(args.uplink_mbps)
+
+    print(f"opus={args.opus_kbps:g}kbps threads={args.threads} rtt={args.rtt_ms:g}ms")
+    print(
+        f"{'clip':>6} {'format':>10} {'bytes':>10} {'x wav':>6} {'decode ms':>10} "
+        + " ".join(f"{f'total@{mbps:g}M':>11}" for mbps in uplinks)
+    )
+    for seconds in parse_floats(args.lengths):
+        signal = synthetic_signal(seconds, MIC_RATE)
+        clips = {"wav": synthetic_wav(seconds, SAMPLE_RATE)}
+        for container in ("ogg", "webm"):
+            encoded = encode_opus(signal, container, args.opus_kbps)
+            if encoded is not None:
+                clips[f"{container}-opus"] = encoded
+
+        wav_size = len(clips["wav"])
+        for name, audio in clips.items():
+            decode = decode_seconds(frontend, audio, args.repeats)
+            totals = [args.rtt_ms / 1000 + len(audio) * 8 / (mbps * 1e6) + decode for mbps in uplinks]
+            print(
+                f"{seconds:>5g}s {name:>10} {len(audio):>10} {len(audio) / wav_size:>6.2f} {decode * 1000:>10.1f} "
+                + " ".join(f"{total * 1000:>11.0f}" for total in totals)
+            )
+
+
+if __name__ == "__main__":
+    main()
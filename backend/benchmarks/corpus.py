@@ -0,0 +1,76 @@
+"""
+Synthetic WAV corpus for benchmarks and load tests.
+
+    cd backend
+    python -m benchmarks.corpus --out /tmp/thera-corpus --lengths 1,3,5,10,20,45 --rates 8000,16000,44100
+
+Clips are deterministic (seeded) speech-like signals: a pitch-varying
+harmonic tone with syllable-rate amplitude modulation, short pauses and a
+little noise. They pass the energy VAD and exercise the real decode,
+resample and long-audio paths, but carry no emotion, so use them for
+latency/throughput only, never for accuracy.
+"""
+
+import argparse
+import io
+import os
+import numpy as np
+import soundfile as sf
+
+DEFAULT_LENGTHS = (1.0, 3.0, 5.0, 10.0, 20.0, 45.0)
+DEFAULT_RATES = (8000, 16000, 44100, 48000)
+
+
+def synthetic_signal(seconds: float, sample_rate: int = 16000, seed: int = 0) -> np.ndarray:
+    """One speech-like mono clip as float32 samples."""
+    rng = np.random.default_rng(seed)
+    t = np.arange(int(seconds * sample_rate)) / sample_rate
+
+    pitch = 140 + 40 * np.sin(2 * np.pi * 0.7 * t + rng.uniform(0, np.pi))
+    phase = 2 * np.pi * np.cumsum(pitch) / sample_rate
+    voice = sum(np.sin(k * phase) / k for k in range(1, 6))
+
+    syllables = 0.5 * (1 + np.sin(2 * np.pi * 4.0 * t))
+    pauses = (np.sin(2 * np.pi * 0.25 * t + rng.uniform(0, np.pi)) > -0.7).astype(np.float64)
+    signal = 0.3 * voice * syllables * pauses + 0.005 * rng.standard_normal(len(t))
+    return signal.astype(np.float32)
+
+
+def synthetic_wav(seconds: float, sample_rate: int = 16000, seed: int = 0, subtype: str = "PCM_16") -> bytes:
+    """One speech-like mono clip as WAV bytes."""
+    buffer = io.BytesIO()
+    sf.write(buffer, synthetic_signal(seconds, sample_rate, seed), sample_rate, format="WAV", subtype=subtype)
+    return buffer.getvalue()
+
+
+def build_corpus(lengths=DEFAULT_LENGTHS, rates=DEFAULT_RATES, seed: int = 0) -> list[tuple[str, bytes]]:
+    """(name, wav bytes) for every length x sample-rate combination."""
+    corpus = []
+    for i, seconds in enumerate(lengths):
+        for j, rate in enumerate(rates):
+            corpus.append((f"{seconds:g}s_{rate}hz", synthetic_wav(seconds, rate, seed=seed + i * len(rates) + j)))
+    return corpus
+
+
+def parse_floats(value: str) -> list[float]:
+    return [float(v) for v in value.split(",") if v.strip()]
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--out", required=True, help="Directory to write the WAV files to")
+    parser.add_argument("--lengths", default=",".join(f"{s:g}" for s in DEFAULT_LENGTHS), help="Seconds")
+    parser.add_argument("--rates", default=",".join(str(r) for r in DEFAULT_RATES), help="Sample rates (Hz)")
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args()
+
+    os.makedirs(args.out, exist_ok=True)
+    corpus = build_corpus(parse_floats(args.lengths), [int(r) for r in parse_floats(args.rates)], args.seed)
+    for name, audio in corpus:
+        with open(os.path.join(args.out, f"{name}.wav"), "wb") as f:
+            f.write(audio)
+    print(f"Wrote {len(corpus)} clips to {args.out}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,159 @@
+"""
+Accuracy parity and latency/throughput of the emotion inference backends.
+
+    cd backend
+    python -m benchmarks.inference_backends --clips path/to/clips --batch-sizes 1,4,8
+
+--clips is a directory of WAV files (searched recursively). When a clip's
+parent directory is named after an emotion label (clips/sad/x.wav), accuracy
+against that label is reported as well. Without --clips a synthetic set is
+used, which only checks agreement with eager.
+
+Every backend is compared with the eager float32 model on the same
+features: top-1 agreement and the largest absolute probability difference.
+
+Reference run: whisper-tiny classifier with random weights, 16 synthetic
+clips, 1 thread, torch 2.14 on a 1-core Linux VM (onnx not installed).
+Median ms per batch of 1 / 4 / 8:
+
+    backend      agree  max|dp|  b1 ms   b4 ms   b8 ms
+    eager        1.000  0.0000   473.7  2083.5  4657.7
+    int8         1.000  0.0009   359.6  1659.7  3496.7
+    torchscript  1.000  0.0000   491.7  1885.3  3953.5
+    compile      1.000  0.0000   407.6  1945.9  3965.9
+
+Random weights give near-uniform probabilities, so agreement here only
+shows the backends compute the same function; rerun with the real
+checkpoint and --clips before trusting int8's accuracy.
+"""
+
+import argparse
+import glob
+import io
+import os
+import statistics
+import time
+import numpy as np
+import soundfile as sf
+import torch
+from app.config import settings
+from app.services.emotion import EmotionModel
+from app.services.inference_backends import BACKENDS, build_backend, configure_threads
+
+
+def load_clips(model: EmotionModel, clips_dir: str | None, count: int):
+    """Return (features [N, 80, T], labels or None per clip)."""
+    if not clips_dir:
+        rng = np.random.default_rng(0)
+        features = []
+        for i in range(count):
+            buffer = io.BytesIO()
+            seconds = 1 + i % 10
+            sf.write(buffer, (rng.standard_normal(16000 * seconds) * 0.1).astype("float32"), 16000, format="WAV")
+            features.append(model.extract_features(buffer.getvalue()))
+        return torch.stack(features), [None] * count
+
+    paths = sorted(glob.glob(os.path.join(clips_dir, "**", "*.wav"), recursive=True))
+    if not paths:
+        raise SystemExit(f"No .wav files under {clips_dir}")
+
+    features, labels = [], []
+    for path in paths:
+        with open(path, "rb") as f:
+            features.append(model.extract_features(f.read()))
+        label = os.path.basename(os.path.dirname(path)).lower()
+        labels.append(label if label in model.labels else None)
+    return torch.stack(features), labels
+
+
+def _lengths(batch: torch.Tensor) -> torch.Tensor:
+    return torch.full((len(batch),), batch.shape[-1], device=batch.device)
+
+
+@torch.no_grad()
+def run(forward, features: torch.Tensor, batch_size: int) -> torch.Tensor:
+    batches = [features[i:i + batch_size] for i in range(0, len(features), batch_size)]
+    return torch.cat([forward(batch, _lengths(batch)) for batch in batches])
+
+
+@torch.no_grad()
+def measure(forward, features: torch.Tensor, batch_size: int, repeats: int) -> tuple[float, float]:
+    """Median latency per batch (ms) and throughput (clips/s)."""
+    batch = features[:batch_size]
+    if len(batch) < batch_size:
+        batch = batch.repeat((batch_size + len(batch) - 1) // len(batch), 1, 1)[:batch_size]
+
+    lengths = _lengths(batch)
+    forward(batch, lengths)  # warmup
+    timings = []
+    for _ in range(repeats):
+        start = time.perf_counter()
+        forward(batch, lengths)
+        timings.append(time.perf_counter() - start)
+
+    median = statistics.median(timings)
+    return median * 1000, batch_size / median
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--clips", help="Directory of reference WAV clips")
+    parser.add_argument("--synthetic-count", type=int, default=32)
+    parser.add_argument("--backends", default=",".join(BACKENDS))
+    parser.add_argument("--batch-sizes", default="1,4,8")
+    parser.add_argument("--repeats", type=int, default=10)
+    parser.add_argument("--threads", type=int, default=settings.TORCH_INTRA_OP_THREADS)
+    args = parser.parse_args()
+
+    configure_threads(args.threads, 0)
+    settings.EMOTION_BACKEND = "eager"
+    settings.EMOTION_VARIABLE_LENGTH = False
+    model = EmotionModel()
+    features, labels = load_clips(model, args.clips, args.synthetic_count)
+    features = features.to(model.device)
+    batch_sizes = [int(b) for b in args.batch_sizes.split(",")]
+    example = (features[:1], _lengths(features[:1]))
+
+    reference = torch.softmax(run(model.forward, features, max(batch_sizes)), dim=-1)
+    label_ids = [model.labels.index(l) if l else -1 for l in labels]
+    labelled = [i for i, l in enumerate(label_ids) if l >= 0]
+
+    print(f"{len(features)} clips, device={model.device}, threads={torch.get_num_threads()}")
+    header = f"{'backend':<12} {'agree':>7} {'max|dp|':>9} {'acc':>7}"
+    for b in batch_sizes:
+        header += f" {f'b{b} ms':>9} {f'b{b} clip/s':>11}"
+    print(header)
+
+    for name in args.backends.split(","):
+        try:
+            forward = build_backend(
+                model.model,
+                name,
+                device=model.device,
+                example=example,
+                onnx_path=settings.EMOTION_ONNX_PATH,
+                source_path=settings.EMOTION_MODEL_PATH,
+                threads=args.threads,
+            )
+            probs = torch.softmax(run(forward, features, max(batch_sizes)).float(), dim=-1).to(reference.device)
+        except Exception as exc:
+            print(f"{name:<12} failed: {exc}")
+            continue
+
+        agree = (probs.argmax(-1) == reference.argmax(-1)).float().mean().item()
+        max_diff = (probs - reference).abs().max().item()
+        if labelled:
+            preds = probs.argmax(-1)
+            acc = f"{sum(preds[i].item() == label_ids[i] for i in labelled) / len(labelled):.3f}"
+        else:
+            acc = "-"
+
+        row = f"{name:<12} {agree:>7.3f} {max_diff:>9.4f} {acc:>7}"
+        for b in batch_sizes:
+            ms, throughput = measure(forward, features, b, args.repeats)
+            row += f" {ms:>9.1f} {throughput:>11.1f}"
+        print(row)
+
+
+if __name__ == "__main__":
+    main()
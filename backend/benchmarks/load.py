@@ -0,0 +1,332 @@
+"""
+Load generator for /chat and /emotion-stats.
+
+    cd backend
+    python -m benchmarks.load --concurrency 16 --duration 60 --mix chat=3,stats=1
+
+By default this starts the stand-ins from benchmarks.standins, seeds some
+history, and runs `uvicorn app.main:app` against them (the emotion model
+is the real one, so EMOTION_MODEL_PATH must exist). Pass --url to load an
+API that is already running instead; it must accept tokens signed with
+--jwt-secret.
+
+After --warmup seconds, --concurrency clients send requests back to back
+for --duration seconds. Reported per endpoint: throughput, requests shed
+by admission control (429/503) and p50/p95/p99 of the client-side latency
+of the requests that were served. Reported per stage (admission waits
+included): p50/p95/p99 estimated from the /metrics histograms (difference
+between two scrapes, so the warmup is excluded). /metrics is per process, so stage numbers cover one
+worker when --workers > 1. The spawned API gets --metrics-token as its
+METRICS_TOKEN; with --url, pass the token that API was started with.
+
+Every chat clip is made unique by default, so the emotion cache doesn't
+hide inference cost; --cache-hits keeps the corpus bytes as they are.
+
+To catch regressions, save a run and compare a later one against it:
+
+    python -m benchmarks.load --save baseline.json
+    python -m benchmarks.load --compare baseline.json --tolerance 0.15
+
+--compare exits with status 1 when throughput drops, or any endpoint or
+stage p95 grows, by more than --tolerance.
+"""
+
+import argparse
+import asyncio
+import json
+import math
+import os
+import random
+import re
+import subprocess
+import sys
+import time
+from collections import defaultdict
+from datetime import date
+import httpx
+from benchmarks.corpus import build_corpus, parse_floats
+from benchmarks.standins import JWT_SECRET, add_profile_arguments, standins_from_args, user_token
+
+_SAMPLE = re.compile(r'^(\w+)\{(.*)\} (\S+)$')
+_LABEL = re.compile(r'(\w+)="([^"]*)"')
+_HISTOGRAMS = ("thera_stage_duration_seconds", "thera_llm_first_output_seconds", "thera_admission_wait_seconds")
+_PREFIXES = {"thera_llm_first_output_seconds": "llm:", "thera_admission_wait_seconds": "admission:"}
+
+
+def percentile(values: list[float], q: float) -> float:
+    if not values:
+        return float("nan")
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, max(0, math.ceil(q * len(ordered)) - 1))]
+
+
+# -- /metrics -------------------------------------------------------------------------
+
+
+def parse_histograms(text: str) -> dict[tuple, dict[float, float]]:
+    """{(metric, series label): {le: cumulative count}} for the stage/LLM histograms."""
+    series: dict[tuple, dict[float, float]] = defaultdict(dict)
+    for line in text.splitlines():
+        match = _SAMPLE.match(line)
+        if not match or not match.group(1).endswith("_bucket"):
+            continue
+        metric = match.group(1)[: -len("_bucket")]
+        if metric not in _HISTOGRAMS:
+            continue
+        labels = dict(_LABEL.findall(match.group(2)))
+        le = float(labels.pop("le"))
+        name = "/".join(value for _, value in sorted(labels.items()))
+        series[(metric, name)][le] = float(match.group(3))
+    return series
+
+
+def histogram_quantile(buckets: dict[float, float], q: float) -> float:
+    """Linear interpolation inside the bucket holding the q-th observation."""
+    bounds = sorted(buckets)
+    total = buckets[bounds[-1]] if bounds else 0
+    if total <= 0:
+        return float("nan")
+    rank = q * total
+    lower_bound, lower_count = 0.0, 0.0
+    for bound in bounds:
+        count = buckets[bound]
+        if count >= rank:
+            if math.isinf(bound):
+                return lower_bound
+            if count == lower_count:
+                return bound
+            return lower_bound + (bound - lower_bound) * (rank - lower_count) / (count - lower_count)
+        lower_bound, lower_count = bound, count
+    return lower_bound
+
+
+def stage_report(before: dict, after: dict) -> dict[str, dict]:
+    report = {}
+    for key, buckets in after.items():
+        previous = before.get(key, {})
+        delta = {le: count - previous.get(le, 0) for le, count in buckets.items()}
+        count = delta.get(float("inf"), 0)
+        if count <= 0:
+            continue
+        metric, name = key
+        label = _PREFIXES.get(metric, "") + name
+        report[label] = {
+            "count": int(count),
+            **{f"p{int(q * 100)}_ms": histogram_quantile(delta, q) * 1000 for q in (0.5, 0.95, 0.99)},
+        }
+    return report
+
+
+# -- load -----------------------------------------------------------------------------
+
+
+class Load:
+    def __init__(self, args: argparse.Namespace, client: httpx.AsyncClient):
+        self.args = args
+        self.client = client
+        self.weights = {}
+        for part in args.mix.split(","):
+            name, _, weight = part.partition("=")
+            self.weights[name.strip()] = float(weight or 1)
+        unknown = set(self.weights) - {"chat", "stats"}
+        if unknown:
+            raise SystemExit(f"Unknown endpoints in --mix: {', '.join(sorted(unknown))}")
+        self.corpus = build_corpus(parse_floats(args.lengths), [int(r) for r in parse_floats(args.rates)])
+        self.tokens = [f"Bearer {user_token(f'bench-user-{i}', args.jwt_secret)}" for i in range(args.users)]
+        self.results: dict[str, list[tuple[float, bool]]] = defaultdict(list)
+        self.recording = False
+
+    def _clip(self) -> bytes:
+        _, audio = random.choice(self.corpus)
+        if self.args.cache_hits:
+            return audio
+        # Change the last PCM sample so the emotion cache never hits
+        return audio[:-2] + random.getrandbits(16).to_bytes(2, "little")
+
+    async def chat(self) -> httpx.Response:
+        return await self.client.post(
+            "/chat",
+            files={"file": ("clip.wav", self._clip(), "audio/wav")},
+            data={"text": "Hôm nay mình thấy hơi mệt."},
+            headers={"Authorization": random.choice(self.tokens)},
+        )
+
+    async def stats(self) -> httpx.Response:
+        day = date.fromordinal(date.today().toordinal() - random.randrange(7))
+        return await self.client.get(
+            "/emotion-stats",
+            params={"date_param": day.isoformat(), "tz": random.choice(("UTC", "Asia/Ho_Chi_Minh"))},
+            headers={"Authorization": random.choice(self.tokens)},
+        )
+
+    async def worker(self, stop_at: float) -> None:
+        names, weights = list(self.weights), list(self.weights.values())
+        while time.monotonic() < stop_at:
+            name = random.choices(names, weights)[0]
+            started = time.perf_counter()
+            try:
+                response = await getattr(self, name)()
+                outcome = "shed" if response.status_code in (429, 503) else (
+                    "ok" if response.status_code < 400 else "error"
+                )
+            except httpx.HTTPError:
+                outcome = "error"
+            if self.recording:
+                self.results[name].append((time.perf_counter() - started, outcome))
+
+    async def run(self, seconds: float, record: bool) -> float:
+        self.recording = record
+        started = time.monotonic()
+        await asyncio.gather(*(self.worker(started + seconds) for _ in range(self.args.concurrency)))
+        return time.monotonic() - started
+
+
+def endpoint_report(results: dict, elapsed: float) -> dict[str, dict]:
+    report = {}
+    for name, samples in sorted(results.items()):
+        # Shed requests are answered right away; keep them out of the percentiles
+        latencies = [latency for latency, outcome in samples if outcome != "shed"]
+        report[name] = {
+            "requests": len(samples),
+            "errors": sum(1 for _, outcome in samples if outcome == "error"),
+            "shed": sum(1 for _, outcome in samples if outcome == "shed"),
+            "rps": len(samples) / elapsed,
+            **{f"p{int(q * 100)}_ms": percentile(latencies, q) * 1000 for q in (0.5, 0.95, 0.99)},
+        }
+    return report
+
+
+def print_table(title: str, rows: dict[str, dict], columns: list[str]) -> None:
+    print(f"\n{title}")
+    print(f"{'':<22}" + "".join(f"{column:>11}" for column in columns))
+    for name, row in rows.items():
+        cells = []
+        for column in columns:
+            value = row.get(column, float("nan"))
+            cells.append(f"{value:>11.1f}" if isinstance(value, float) else f"{value:>11}")
+        print(f"{name:<22}" + "".join(cells))
+
+
+def regressions(current: dict, baseline: dict, tolerance: float) -> list[str]:
+    found = []
+    for section in ("endpoints", "stages"):
+        for name, row in current[section].items():
+            reference = baseline.get(section, {}).get(name)
+            if not reference:
+                continue
+            if row["p95_ms"] > reference["p95_ms"] * (1 + tolerance):
+                found.append(f"{section[:-1]} {name}: p95 {reference['p95_ms']:.1f} -> {row['p95_ms']:.1f} ms")
+            if section == "endpoints" and row["rps"] < reference["rps"] * (1 - tolerance):
+                found.append(f"endpoint {name}: {reference['rps']:.1f} -> {row['rps']:.1f} req/s")
+    return found
+
+
+# -- server ---------------------------------------------------------------------------
+
+
+def spawn_api(args: argparse.Namespace, env: dict[str, str]) -> tuple[subprocess.Popen, str]:
+    port = args.port
+    command = [
+        sys.executable, "-m", "uvicorn", "app.main:app",
+        "--host", "127.0.0.1", "--port", str(port), "--workers", str(args.workers), "--log-level", "warning",
+    ]
+    process = subprocess.Popen(command, env={**os.environ, **env, "METRICS_TOKEN": args.metrics_token})
+    return process, f"http://127.0.0.1:{port}"
+
+
+async def wait_ready(client: httpx.AsyncClient, timeout: float) -> None:
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        try:
+            if (await client.get("/ready")).status_code == 200:
+                return
+        except httpx.HTTPError:
+            pass
+        await asyncio.sleep(0.5)
+    raise SystemExit(f"API not ready after {timeout:.0f}s")
+
+
+async def run(args: argparse.Namespace, base_url: str) -> dict:
+    limits = httpx.Limits(max_connections=args.concurrency * 2, max_keepalive_connections=args.concurrency)
+    async with httpx.AsyncClient(base_url=base_url, timeout=args.timeout, limits=limits) as client:
+        await wait_ready(client, args.ready_timeout)
+        load = Load(args, client)
+
+        if args.warmup > 0:
+            await load.run(args.warmup, record=False)
+        scrape = {"Authorization": f"Bearer {args.metrics_token}"}
+        before = parse_histograms((await client.get("/metrics", headers=scrape)).text)
+        elapsed = await load.run(args.duration, record=True)
+        after = parse_histograms((await client.get("/metrics", headers=scrape)).text)
+
+    return {
+        "config": {k: v for k, v in vars(args).items() if k not in ("save", "compare")},
+        "elapsed": elapsed,
+        "endpoints": endpoint_report(load.results, elapsed),
+        "stages": stage_report(before, after),
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--url", help="Load an already running API instead of spawning one")
+    parser.add_argument("--concurrency", type=int, default=16)
+    parser.add_argument("--duration", type=float, default=60)
+    parser.add_argument("--warmup", type=float, default=10)
+    parser.add_argument("--mix", default="chat=3,stats=1", help="Endpoint weights")
+    parser.add_argument("--users", type=int, default=50)
+    parser.add_argument("--history", type=int, default=40, help="Seeded messages per user (spawned API only)")
+    parser.add_argument("--lengths", default="1,3,5,10", help="Clip lengths (s) in the chat corpus")
+    parser.add_argument("--rates", default="16000,44100", help="Clip sample rates (Hz)")
+    parser.add_argument("--cache-hits", action="store_true", help="Reuse identical clips (emotion cache hits)")
+    parser.add_argument("--jwt-secret", default=JWT_SECRET, help="Secret the --url API verifies tokens with")
+    parser.add_argument("--remote-auth", action="store_true", help="Spawned API checks tokens via /auth/v1/user")
+    parser.add_argument(
+        "--metrics-token", default=os.getenv("METRICS_TOKEN") or "bench-metrics", help="Bearer token for /metrics"
+    )
+    parser.add_argument("--timeout", type=float, default=60)
+    parser.add_argument("--ready-timeout", type=float, default=300)
+    parser.add_argument("--port", type=int, default=8765)
+    parser.add_argument("--workers", type=int, default=1)
+    parser.add_argument("--save", help="Write the results as JSON")
+    parser.add_argument("--compare", help="Baseline JSON from an earlier --save")
+    parser.add_argument("--tolerance", type=float, default=0.15)
+    add_profile_arguments(parser)
+    args = parser.parse_args()
+
+    standins = process = None
+    base_url = args.url
+    if not base_url:
+        standins = standins_from_args(args)
+        standins.seed_messages([f"bench-user-{i}" for i in range(args.users)], args.history)
+        process, base_url = spawn_api(args, standins.env(local_auth=not args.remote_auth))
+
+    try:
+        result = asyncio.run(run(args, base_url))
+    finally:
+        if process is not None:
+            process.terminate()
+            process.wait(timeout=30)
+        if standins is not None:
+            standins.close()
+
+    print(f"{args.concurrency} clients, {result['elapsed']:.1f}s, mix {args.mix}")
+    print_table("Endpoints (client side)", result["endpoints"], ["requests", "errors", "shed", "rps", "p50_ms", "p95_ms", "p99_ms"])
+    print_table("Stages (server histograms)", result["stages"], ["count", "p50_ms", "p95_ms", "p99_ms"])
+
+    if args.save:
+        with open(args.save, "w") as f:
+            json.dump(result, f, indent=2)
+    if args.compare:
+        with open(args.compare) as f:
+            found = regressions(result, json.load(f), args.tolerance)
+        if found:
+            print("\nRegressions:")
+            for line in found:
+                print(f"  {line}")
+            sys.exit(1)
+        print(f"\nNo regressions beyond {args.tolerance:.0%} against {args.compare}")
+
+
+if __name__ == "__main__":
+    main()
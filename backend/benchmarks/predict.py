@@ -0,0 +1,70 @@
+"""
+Microbenchmark of EmotionModel.predict / predict_batch.
+
+    cd backend
+    python -m benchmarks.predict --batch-sizes 1,4,8,16 --lengths 1,5,10,30 --rate 16000
+
+For each clip length and batch size, the same synthetic clip (see
+benchmarks.corpus) is run end to end, WAV bytes in and label out: decode,
+resample, log-mel, encoder and classifier. Batch size 1 uses predict();
+larger sizes use predict_batch(). Reports the median and p95 time per call
+and clips/s, with the settings (backend, variable length, threads) in
+effect, so runs before and after a change can be compared directly.
+"""
+
+import argparse
+import statistics
+import time
+from app.config import settings
+from app.services.emotion import EmotionModel
+from app.services.inference_backends import configure_threads
+from benchmarks.corpus import parse_floats, synthetic_wav
+
+
+def measure(call, repeats: int) -> list[float]:
+    call()  # warmup (lazy init, allocator, graph capture)
+    timings = []
+    for _ in range(repeats):
+        started = time.perf_counter()
+        call()
+        timings.append(time.perf_counter() - started)
+    return timings
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--batch-sizes", default="1,4,8,16")
+    parser.add_argument("--lengths", default="1,5,10,30", help="Clip lengths (s)")
+    parser.add_argument("--rate", type=int, default=16000, help="Clip sample rate (Hz)")
+    parser.add_argument("--repeats", type=int, default=20)
+    parser.add_argument("--threads", type=int, default=settings.TORCH_INTRA_OP_THREADS)
+    args = parser.parse_args()
+
+    settings.TORCH_INTRA_OP_THREADS = args.threads
+    configure_threads(args.threads, 0)
+    model = EmotionModel()
+    batch_sizes = [int(b) for b in args.batch_sizes.split(",")]
+
+    print(
+        f"backend={model.backend} variable_length={model.variable_length} "
+        f"device={model.device} threads={args.threads or 'default'} rate={args.rate}"
+    )
+    print(f"{'clip':>6} {'batch':>6} {'p50 ms':>9} {'p95 ms':>9} {'clip/s':>9}")
+
+    for seconds in parse_floats(args.lengths):
+        audio = synthetic_wav(seconds, args.rate)
+        for batch_size in batch_sizes:
+            if batch_size == 1:
+                call = lambda: model.predict(audio)
+            else:
+                audios = [audio] * batch_size
+                call = lambda: model.predict_batch(audios)
+
+            timings = sorted(measure(call, args.repeats))
+            median = statistics.median(timings)
+            p95 = timings[min(len(timings) - 1, int(0.95 * len(timings)))]
+            print(f"{seconds:>5g}s {batch_size:>6} {median * 1000:>9.1f} {p95 * 1000:>9.1f} {batch_size / median:>9.1f}")
+
+
+if __name__ == "__main__":
+    main()
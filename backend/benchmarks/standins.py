@@ -0,0 +1,492 @@
+"""
+Local stand-ins for Supabase, Groq and Gemini with injected latency.
+
+    cd backend
+    python -m benchmarks.standins --supabase-ms 15 --groq-ms 250 --gemini-ms 400 --token-ms 10
+
+Prints the environment to start the API against them (SUPABASE_URL,
+GROQ_BASE_URL, GEMINI_API_ENDPOINT, keys and a JWT secret). The real SDKs
+talk to these over HTTP, so client overhead, connection pooling and
+serialization are all part of what gets measured.
+
+Covered:
+- Supabase: /auth/v1/user, the PostgREST subset the app uses on
+  `messages` and `emotion_daily_rollups` (eq/gte/lte/lt, order, limit,
+  insert), and the emotion_counts_by_bucket RPC. Everything is kept in
+  memory; rollups are computed from the stored messages.
+- Groq: /openai/v1/chat/completions, plain and streamed (SSE).
+- Gemini: generateContent and streamGenerateContent (SSE or JSON array).
+
+Each service has a base latency with jitter and an error rate. LLM replies
+are --reply-tokens words; streams send one word per --token-ms after the
+first-token latency.
+"""
+
+import argparse
+import json
+import random
+import re
+import threading
+import time
+import uuid
+from collections import defaultdict
+from dataclasses import dataclass
+from datetime import datetime, timezone
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qsl, urlsplit
+from zoneinfo import ZoneInfo
+import jwt
+
+EMOTIONS = ("happy", "neutral", "sad", "angry")
+JWT_SECRET = "benchmark-jwt-secret-benchmark-jwt-secret"
+_WORDS = "Mình hiểu cảm giác của bạn và luôn ở đây để lắng nghe bạn chia sẻ thêm nhé".split()
+
+
+@dataclass
+class Profile:
+    """Injected behaviour of one stand-in."""
+
+    latency_ms: float = 0.0
+    jitter: float = 0.2  # +/- fraction of latency_ms
+    error_rate: float = 0.0
+    token_ms: float = 0.0
+    reply_tokens: int = 40
+
+    def delay(self) -> None:
+        if self.latency_ms > 0:
+            spread = self.latency_ms * self.jitter
+            time.sleep(max(0.0, random.uniform(self.latency_ms - spread, self.latency_ms + spread)) / 1000)
+
+    def fails(self) -> bool:
+        return self.error_rate > 0 and random.random() < self.error_rate
+
+    def reply(self) -> list[str]:
+        return [_WORDS[i % len(_WORDS)] + " " for i in range(self.reply_tokens)]
+
+
+def service_key(secret: str = JWT_SECRET, role: str = "service_role") -> str:
+    """A JWT shaped like a Supabase API key (supabase-py checks the format)."""
+    return jwt.encode({"role": role, "iss": "supabase", "exp": int(time.time()) + 10 * 365 * 86400}, secret, "HS256")
+
+
+def user_token(user_id: str, secret: str = JWT_SECRET, ttl: int = 3600) -> str:
+    """A Supabase-style access token for user_id."""
+    return jwt.encode(
+        {"sub": user_id, "aud": "authenticated", "role": "authenticated", "exp": int(time.time()) + ttl},
+        secret,
+        "HS256",
+    )
+
+
+class _Handler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"
+    profile: Profile
+
+    def log_message(self, format, *args):
+        pass
+
+    # -- helpers ------------------------------------------------------------------
+
+    def _body(self):
+        length = int(self.headers.get("Content-Length") or 0)
+        raw = self.rfile.read(length) if length else b""
+        return json.loads(raw) if raw else None
+
+    def _json(self, status: int, payload, headers: dict | None = None) -> None:
+        body = json.dumps(payload).encode()
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(body)))
+        for name, value in (headers or {}).items():
+            self.send_header(name, value)
+        self.end_headers()
+        self.wfile.write(body)
+
+    def _start_chunked(self, content_type: str) -> None:
+        self.send_response(200)
+        self.send_header("Content-Type", content_type)
+        self.send_header("Transfer-Encoding", "chunked")
+        self.end_headers()
+
+    def _chunk(self, data: str) -> None:
+        raw = data.encode()
+        self.wfile.write(b"%x\r\n%s\r\n" % (len(raw), raw))
+        self.wfile.flush()
+
+    def _end_chunked(self) -> None:
+        self.wfile.write(b"0\r\n\r\n")
+        self.wfile.flush()
+
+    def _dispatch(self, method: str) -> None:
+        self.profile.delay()
+        if self.profile.fails():
+            self._json(503, {"error": {"code": 503, "message": "injected failure", "status": "UNAVAILABLE"}})
+            return
+        try:
+            self.route(method, urlsplit(self.path))
+        except (BrokenPipeError, ConnectionResetError):
+            pass
+
+    def do_GET(self):
+        self._dispatch("GET")
+
+    def do_POST(self):
+        self._dispatch("POST")
+
+    def do_PATCH(self):
+        self._dispatch("PATCH")
+
+    def route(self, method: str, url) -> None:
+        raise NotImplementedError
+
+
+# -- Supabase -----------------------------------------------------------------------
+
+
+def _comparable(value):
+    if isinstance(value, str) and len(value) >= 10 and value[4:5] == "-":
+        try:
+            moment = datetime.fromisoformat(value.replace("Z", "+00:00"))
+            return moment if moment.tzinfo else moment.replace(tzinfo=timezone.utc)
+        except ValueError:
+            return value
+    return value
+
+
+def _matches(row: dict, filters: list[tuple[str, str, str]]) -> bool:
+    for column, op, expected in filters:
+        value = row.get(column)
+        if op == "eq":
+            if str(value) != expected:
+                return False
+            continue
+        if value is None:
+            return False
+        left, right = _comparable(value), _comparable(expected)
+        if type(left) is not type(right):
+            left, right = str(value), expected
+        if op == "gte" and not left >= right:
+            return False
+        if op == "gt" and not left > right:
+            return False
+        if op == "lte" and not left <= right:
+            return False
+        if op == "lt" and not left < right:
+            return False
+    return True
+
+
+class SupabaseStore:
+    def __init__(self, secret: str):
+        self.secret = secret
+        self.messages: list[dict] = []
+        self._lock = threading.Lock()
+
+    def insert(self, rows: list[dict]) -> list[dict]:
+        now = datetime.now(timezone.utc).isoformat()
+        stored = [{"id": str(uuid.uuid4()), "created_at": now, **row} for row in rows]
+        with self._lock:
+            self.messages.extend(stored)
+        return stored
+
+    def rows(self, table: str) -> list[dict]:
+        with self._lock:
+            messages = list(self.messages)
+        if table == "messages":
+            return messages
+        if table == "emotion_daily_rollups":
+            days: dict[tuple, dict] = {}
+            for msg in messages:
+                emotion = (msg.get("emotion") or "").lower()
+                if emotion not in EMOTIONS:
+                    continue
+                day = _comparable(msg["created_at"]).astimezone(timezone.utc).date().isoformat()
+                key = (msg["user_id"], day)
+                if key not in days:
+                    days[key] = {"user_id": msg["user_id"], "day": day, **dict.fromkeys(EMOTIONS, 0)}
+                days[key][emotion] += 1
+            return list(days.values())
+        raise KeyError(table)
+
+    def counts_by_bucket(self, params: dict) -> list[dict]:
+        zone = ZoneInfo(params["p_tz"])
+        start, end = _comparable(params["p_start"]), _comparable(params["p_end"])
+        buckets: dict[datetime, dict] = defaultdict(lambda: dict.fromkeys(EMOTIONS, 0))
+        for msg in self.rows("messages"):
+            emotion = (msg.get("emotion") or "").lower()
+            created = _comparable(msg["created_at"])
+            if msg.get("user_id") != params["p_user_id"] or emotion not in EMOTIONS or not start <= created < end:
+                continue
+            local = created.astimezone(zone).replace(tzinfo=None)
+            if params["p_bucket"] == "day":
+                local = datetime.combine(local.date(), datetime.min.time())
+            else:
+                local = local.replace(minute=0, second=0, microsecond=0)
+            buckets[local][emotion] += 1
+        return [{"bucket": moment.isoformat(), **counts} for moment, counts in sorted(buckets.items())]
+
+
+class SupabaseHandler(_Handler):
+    store: SupabaseStore
+
+    def route(self, method: str, url) -> None:
+        if url.path == "/auth/v1/user":
+            self._user()
+        elif url.path == "/auth/v1/.well-known/jwks.json":
+            self._json(200, {"keys": []})
+        elif url.path.startswith("/rest/v1/rpc/"):
+            self._rpc(url.path.rsplit("/", 1)[-1])
+        elif url.path.startswith("/rest/v1/"):
+            self._table(method, url.path[len("/rest/v1/"):], parse_qsl(url.query))
+        else:
+            self._json(404, {"message": f"No route for {url.path}"})
+
+    def _user(self) -> None:
+        token = (self.headers.get("Authorization") or "").removeprefix("Bearer ").strip()
+        try:
+            claims = jwt.decode(token, self.store.secret, algorithms=["HS256"], audience="authenticated")
+        except jwt.InvalidTokenError as exc:
+            self._json(401, {"code": 401, "msg": f"invalid JWT: {exc}"})
+            return
+        self._json(200, {
+            "id": claims["sub"],
+            "aud": "authenticated",
+            "role": "authenticated",
+            "app_metadata": {},
+            "user_metadata": {},
+            "created_at": "2024-01-01T00:00:00+00:00",
+        })
+
+    def _rpc(self, name: str) -> None:
+        params = self._body() or {}
+        if name == "emotion_counts_by_bucket":
+            self._json(200, self.store.counts_by_bucket(params))
+        else:
+            self._json(404, {"code": "PGRST202", "message": f"Could not find the function public.{name}"})
+
+    def _table(self, method: str, table: str, query: list[tuple[str, str]]) -> None:
+        if method == "POST":
+            payload = self._body()
+            rows = self.store.insert(payload if isinstance(payload, list) else [payload])
+            self._json(201, rows)
+            return
+
+        try:
+            rows = self.store.rows(table)
+        except KeyError:
+            self._json(404, {"code": "42P01", "message": f'relation "public.{table}" does not exist'})
+            return
+
+        filters, order, limit, columns = [], None, None, None
+        for key, value in query:
+            if key == "select":
+                columns = [c.strip() for c in value.split(",")] if value != "*" else None
+            elif key == "order":
+                column, _, direction = value.partition(".")
+                order = (column, direction.startswith("desc"))
+            elif key == "limit":
+                limit = int(value)
+            else:
+                op, _, expected = value.partition(".")
+                filters.append((key, op, expected))
+
+        rows = [row for row in rows if _matches(row, filters)]
+        if order:
+            rows.sort(key=lambda row: _comparable(row.get(order[0])) or "", reverse=order[1])
+        if limit is not None:
+            rows = rows[:limit]
+        if columns:
+            rows = [{c: row.get(c) for c in columns} for row in rows]
+        self._json(200, rows, {"Content-Range": f"0-{max(0, len(rows) - 1)}/*"})
+
+
+# -- LLMs ---------------------------------------------------------------------------
+
+
+class GroqHandler(_Handler):
+    def route(self, method: str, url) -> None:
+        if url.path.rstrip("/") != "/openai/v1/chat/completions":
+            self._json(404, {"error": {"message": f"Unknown path {url.path}"}})
+            return
+        request = self._body() or {}
+        model = request.get("model", "stand-in")
+        words = self.profile.reply()
+        created = int(time.time())
+        ident = f"chatcmpl-{uuid.uuid4().hex}"
+
+        if not request.get("stream"):
+            time.sleep(self.profile.token_ms * len(words) / 1000)
+            self._json(200, {
+                "id": ident,
+                "object": "chat.completion",
+                "created": created,
+                "model": model,
+                "choices": [{
+                    "index": 0,
+                    "message": {"role": "assistant", "content": "".join(words).strip()},
+                    "finish_reason": "stop",
+                }],
+                "usage": {"prompt_tokens": 50, "completion_tokens": len(words), "total_tokens": 50 + len(words)},
+            })
+            return
+
+        self._start_chunked("text/event-stream")
+        for i, word in enumerate(words):
+            if i:
+                time.sleep(self.profile.token_ms / 1000)
+            chunk = {
+                "id": ident,
+                "object": "chat.completion.chunk",
+                "created": created,
+                "model": model,
+                "choices": [{"index": 0, "delta": {"content": word}, "finish_reason": None}],
+            }
+            self._chunk(f"data: {json.dumps(chunk)}\n\n")
+        self._chunk("data: [DONE]\n\n")
+        self._end_chunked()
+
+
+class GeminiHandler(_Handler):
+    _PATH = re.compile(r"^/v1(?:beta)?/models/[^:]+:(generateContent|streamGenerateContent)$")
+
+    @staticmethod
+    def _response(text: str, finished: bool) -> dict:
+        candidate = {"content": {"parts": [{"text": text}], "role": "model"}, "index": 0}
+        if finished:
+            candidate["finishReason"] = "STOP"
+        return {"candidates": [candidate]}
+
+    def route(self, method: str, url) -> None:
+        match = self._PATH.match(url.path)
+        if not match:
+            self._json(404, {"error": {"code": 404, "message": f"Unknown path {url.path}", "status": "NOT_FOUND"}})
+            return
+        self._body()
+        words = self.profile.reply()
+
+        if match.group(1) == "generateContent":
+            time.sleep(self.profile.token_ms * len(words) / 1000)
+            self._json(200, self._response("".join(words).strip(), True))
+            return
+
+        sse = dict(parse_qsl(url.query)).get("alt") == "sse"
+        self._start_chunked("text/event-stream" if sse else "application/json")
+        if not sse:
+            self._chunk("[")
+        for i, word in enumerate(words):
+            if i:
+                time.sleep(self.profile.token_ms / 1000)
+            payload = json.dumps(self._response(word, i == len(words) - 1))
+            self._chunk(f"data: {payload}\r\n\r\n" if sse else ("," if i else "") + payload)
+        if not sse:
+            self._chunk("]")
+        self._end_chunked()
+
+
+# -- running --------------------------------------------------------------------------
+
+
+class Standins:
+    """The three stand-in servers, each on its own thread and port."""
+
+    def __init__(self, supabase: Profile, groq: Profile, gemini: Profile, host: str = "127.0.0.1",
+                 secret: str = JWT_SECRET):
+        self.host = host
+        self.secret = secret
+        self.store = SupabaseStore(secret)
+        self.servers = {
+            "supabase": self._serve(SupabaseHandler, supabase, store=self.store),
+            "groq": self._serve(GroqHandler, groq),
+            "gemini": self._serve(GeminiHandler, gemini),
+        }
+
+    def _serve(self, handler: type, profile: Profile, **attrs) -> ThreadingHTTPServer:
+        bound = type(handler.__name__, (handler,), {"profile": profile, **attrs})
+        server = ThreadingHTTPServer((self.host, 0), bound)
+        server.daemon_threads = True
+        server.request_queue_size = 1024
+        threading.Thread(target=server.serve_forever, daemon=True).start()
+        return server
+
+    def url(self, name: str) -> str:
+        host, port = self.servers[name].server_address[:2]
+        return f"http://{host}:{port}"
+
+    def env(self, local_auth: bool = True) -> dict[str, str]:
+        """Environment for an API process that should use these stand-ins."""
+        env = {
+            "SUPABASE_URL": self.url("supabase"),
+            "SUPABASE_SERVICE_ROLE_KEY": service_key(self.secret),
+            "GROQ_API_KEY": "stand-in",
+            "GROQ_BASE_URL": self.url("groq"),
+            "GEMINI_API_KEY": "stand-in",
+            "GEMINI_API_ENDPOINT": self.url("gemini"),
+        }
+        # Without the secret every token goes through /auth/v1/user
+        env["SUPABASE_JWT_SECRET"] = self.secret if local_auth else ""
+        return env
+
+    def seed_messages(self, user_ids: list[str], per_user: int, days: int = 7) -> None:
+        """History so /emotion-stats and the chat context have rows to read."""
+        now = datetime.now(timezone.utc).timestamp()
+        rng = random.Random(0)
+        rows = []
+        for user_id in user_ids:
+            for i in range(per_user):
+                created = datetime.fromtimestamp(now - rng.uniform(0, days * 86400), timezone.utc)
+                rows.append({
+                    "user_id": user_id,
+                    "role": "user" if i % 2 == 0 else "assistant",
+                    "content": "seed",
+                    "emotion": rng.choice(EMOTIONS) if i % 2 == 0 else None,
+                    "created_at": created.isoformat(),
+                })
+        self.store.insert(rows)
+
+    def close(self) -> None:
+        for server in self.servers.values():
+            server.shutdown()
+            server.server_close()
+
+
+def add_profile_arguments(parser: argparse.ArgumentParser) -> None:
+    parser.add_argument("--supabase-ms", type=float, default=15, help="Supabase latency per request")
+    parser.add_argument("--groq-ms", type=float, default=250, help="Groq latency to first token")
+    parser.add_argument("--gemini-ms", type=float, default=400, help="Gemini latency to first token")
+    parser.add_argument("--token-ms", type=float, default=10, help="Delay between streamed tokens")
+    parser.add_argument("--reply-tokens", type=int, default=40)
+    parser.add_argument("--jitter", type=float, default=0.2, help="Latency spread, fraction of the mean")
+    parser.add_argument("--groq-error-rate", type=float, default=0.0)
+    parser.add_argument("--gemini-error-rate", type=float, default=0.0)
+    parser.add_argument("--supabase-error-rate", type=float, default=0.0)
+
+
+def standins_from_args(args: argparse.Namespace) -> Standins:
+    def llm(latency: float, error_rate: float) -> Profile:
+        return Profile(latency, args.jitter, error_rate, args.token_ms, args.reply_tokens)
+
+    return Standins(
+        supabase=Profile(args.supabase_ms, args.jitter, args.supabase_error_rate),
+        groq=llm(args.groq_ms, args.groq_error_rate),
+        gemini=llm(args.gemini_ms, args.gemini_error_rate),
+    )
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    add_profile_arguments(parser)
+    parser.add_argument("--remote-auth", action="store_true", help="Don't export SUPABASE_JWT_SECRET")
+    args = parser.parse_args()
+
+    standins = standins_from_args(args)
+    for name, value in standins.env(local_auth=not args.remote_auth).items():
+        print(f"export {name}={value}")
+    print(f"# sample token: Bearer {user_token('bench-user-0', standins.secret)}", flush=True)
+    try:
+        threading.Event().wait()
+    except KeyboardInterrupt:
+        standins.close()
+
+
+if __name__ == "__main__":
+    main()
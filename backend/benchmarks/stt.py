@@ -0,0 +1,101 @@
+"""
+Latency of server-side STT sharing the emotion encoder vs. running it apart.
+
+    cd backend
+    STT_ENABLED=true python -m benchmarks.stt --lengths 3,5,10,20 --repeats 10
+
+Per clip length (synthetic speech-like clips, see benchmarks.corpus, or
+--clips), after feature extraction:
+
+- emotion: the emotion model alone (EMOTION_BACKEND, as in production);
+- stt: WHISPER_MODEL with its own encoder, as a separate STT service would
+  run it;
+- separate: emotion + stt, one after the other;
+- shared: EmotionModel.classify_and_transcribe(), one encoder pass for both.
+
+Columns are p50/p95 ms over --repeats runs. "same text" is the share of
+clips whose transcript is identical both ways: 1.0 unless the emotion
+encoder was fine-tuned away from WHISPER_MODEL's. Decoding dominates and
+grows with transcript length, so use real speech (--clips) for absolute
+numbers; the shared path saves one 30 s encoder pass per turn.
+"""
+
+import argparse
+import glob
+import os
+import statistics
+import time
+import torch
+from app.config import settings
+from app.services.emotion import FULL_FRAMES, EmotionModel
+from app.services.transcription import WhisperTranscriber
+from benchmarks.corpus import parse_floats, synthetic_wav
+
+
+def _clips(clips_dir: str | None, lengths: list[float]) -> list[tuple[str, bytes]]:
+    if not clips_dir:
+        return [(f"{seconds:g}s", synthetic_wav(seconds)) for seconds in lengths]
+    paths = sorted(glob.glob(os.path.join(clips_dir, "**", "*.wav"), recursive=True))
+    if not paths:
+        raise SystemExit(f"No .wav files under {clips_dir}")
+    clips = []
+    for path in paths:
+        with open(path, "rb") as f:
+            clips.append((os.path.basename(path), f.read()))
+    return clips
+
+
+def _timed(fn, repeats: int) -> tuple[list[float], object]:
+    result = fn()  # warmup
+    timings = []
+    for _ in range(repeats):
+        started = time.perf_counter()
+        result = fn()
+        timings.append(time.perf_counter() - started)
+    return timings, result
+
+
+def _p(timings: list[float], q: float) -> float:
+    ordered = sorted(timings)
+    return ordered[min(len(ordered) - 1, int(q * len(ordered)))] * 1000
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--lengths", default="3,5,10,20", help="Synthetic clip lengths (s)")
+    parser.add_argument("--clips", help="Directory of WAV clips (instead of synthetic ones)")
+    parser.add_argument("--repeats", type=int, default=10)
+    args = parser.parse_args()
+
+    settings.STT_ENABLED = True
+    settings.STT_SHARE_ENCODER = True
+    model = EmotionModel()
+    if not model.transcriber.shared:
+        raise SystemExit(f"WHISPER_MODEL={settings.WHISPER_MODEL} does not match the emotion encoder's size")
+    settings.STT_SHARE_ENCODER = False
+    separate = WhisperTranscriber(model.model.encoder, model.device)
+
+    print(f"backend={model.backend} stt={settings.WHISPER_MODEL} max_new_tokens={settings.STT_MAX_NEW_TOKENS}")
+    print(
+        f"{'clip':>12} {'emotion':>15} {'stt':>15} {'separate':>15} {'shared':>15} {'saved':>7}"
+    )
+    same = []
+    for name, audio in _clips(args.clips, parse_floats(args.lengths)):
+        features = model.extract_features(audio)
+        padded = model._pad(features, FULL_FRAMES)[None].to(model.device)
+
+        emotion, _ = _timed(lambda: model.classify([features]), args.repeats)
+        stt, (text,) = _timed(lambda: separate.transcribe(input_features=padded), args.repeats)
+        shared, (result,) = _timed(lambda: model.classify_and_transcribe([features]), args.repeats)
+        total = [a + b for a, b in zip(emotion, stt)]
+        same.append(result["text"] == text)
+
+        cells = [f"{_p(t, 0.5):>7.1f}/{_p(t, 0.95):<7.1f}" for t in (emotion, stt, total, shared)]
+        saved = 1 - statistics.median(shared) / statistics.median(total)
+        print(f"{name:>12} " + " ".join(cells) + f" {saved:>6.0%}")
+
+    print(f"same text: {sum(same) / len(same):.2f} ({len(same)} clips), torch threads={torch.get_num_threads()}")
+
+
+if __name__ == "__main__":
+    main()
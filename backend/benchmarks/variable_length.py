@@ -0,0 +1,102 @@
+"""
+Accuracy delta and latency of variable-length input vs. the fixed 30 s path.
+
+    cd backend
+    python -m benchmarks.variable_length --clips path/to/clips --buckets 500,1000,1500,3000
+
+Each clip is classified twice with the eager backend: padded to 3000 frames
+(EMOTION_VARIABLE_LENGTH=false) and padded only to its length bucket with
+padded frames masked out of attention pooling. Reports top-1 agreement, the
+largest confidence difference, accuracy of each path when clips sit in
+label-named folders (clips/sad/x.wav), and mean per-clip latency of both
+paths per bucket.
+"""
+
+import argparse
+import glob
+import os
+import statistics
+import time
+import numpy as np
+from app.config import settings
+from app.services.emotion import EmotionModel, FULL_FRAMES, _parse_buckets
+
+
+def _clips(clips_dir: str | None, count: int) -> list[tuple[bytes, str | None]]:
+    """(wav bytes, label or None) pairs; synthetic 1-30 s noise without --clips."""
+    if not clips_dir:
+        import io
+        import soundfile as sf
+
+        rng = np.random.default_rng(0)
+        clips = []
+        for i in range(count):
+            buffer = io.BytesIO()
+            seconds = 1 + (i * 7) % 30
+            sf.write(buffer, (rng.standard_normal(16000 * seconds) * 0.1).astype("float32"), 16000, format="WAV")
+            clips.append((buffer.getvalue(), None))
+        return clips
+
+    paths = sorted(glob.glob(os.path.join(clips_dir, "**", "*.wav"), recursive=True))
+    if not paths:
+        raise SystemExit(f"No .wav files under {clips_dir}")
+    clips = []
+    for path in paths:
+        with open(path, "rb") as f:
+            clips.append((f.read(), os.path.basename(os.path.dirname(path)).lower()))
+    return clips
+
+
+def _classify_timed(model: EmotionModel, audio: bytes) -> tuple[dict, int, float]:
+    features = model.extract_features(audio)
+    start = time.perf_counter()
+    result = model.classify([features])[0]
+    return result, features.shape[-1], time.perf_counter() - start
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--clips", help="Directory of reference WAV clips")
+    parser.add_argument("--synthetic-count", type=int, default=30)
+    parser.add_argument("--buckets", default=settings.EMOTION_LENGTH_BUCKETS)
+    args = parser.parse_args()
+
+    settings.EMOTION_BACKEND = "eager"
+    model = EmotionModel()
+    clips = _clips(args.clips, args.synthetic_count)
+    buckets = _parse_buckets(args.buckets)
+
+    rows = []
+    for audio, label in clips:
+        model.variable_length, model.length_buckets = False, [FULL_FRAMES]
+        fixed, _, fixed_time = _classify_timed(model, audio)
+        model.variable_length, model.length_buckets = True, buckets
+        variable, frames, variable_time = _classify_timed(model, audio)
+        rows.append((label, model.bucket_for(frames), fixed, variable, fixed_time, variable_time))
+
+    agree = sum(r[2]["emotion"] == r[3]["emotion"] for r in rows) / len(rows)
+    max_conf_diff = max(abs(r[2]["confidence"] - r[3]["confidence"]) for r in rows)
+    print(f"{len(rows)} clips, buckets={buckets}")
+    print(f"top-1 agreement fixed vs variable: {agree:.3f}, max |confidence diff|: {max_conf_diff:.4f}")
+
+    labelled = [r for r in rows if r[0] in model.labels]
+    if labelled:
+        fixed_acc = sum(r[2]["emotion"] == r[0] for r in labelled) / len(labelled)
+        variable_acc = sum(r[3]["emotion"] == r[0] for r in labelled) / len(labelled)
+        print(
+            f"accuracy fixed={fixed_acc:.3f} variable={variable_acc:.3f} "
+            f"delta={variable_acc - fixed_acc:+.3f} ({len(labelled)} labelled clips)"
+        )
+
+    print(f"{'bucket':>7} {'clips':>6} {'fixed ms':>9} {'variable ms':>12} {'speedup':>8}")
+    for bucket in buckets:
+        in_bucket = [r for r in rows if r[1] == bucket]
+        if not in_bucket:
+            continue
+        fixed_ms = statistics.mean(r[4] for r in in_bucket) * 1000
+        variable_ms = statistics.mean(r[5] for r in in_bucket) * 1000
+        print(f"{bucket:>7} {len(in_bucket):>6} {fixed_ms:>9.1f} {variable_ms:>12.1f} {fixed_ms / variable_ms:>7.2f}x")
+
+
+if __name__ == "__main__":
+    main()
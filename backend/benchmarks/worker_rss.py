@@ -0,0 +1,101 @@
+"""
+Per-worker memory with the checkpoint copied vs. memory-mapped.
+
+    cd backend
+    python -m benchmarks.worker_rss --workers 4
+
+Starts N worker processes at the same time, the way `uvicorn --workers N`
+would, once per mode:
+
+- copy: torch.load into private memory (EMOTION_MMAP=false).
+- mmap: torch.load(mmap=True) + load_state_dict(assign=True).
+
+Each worker loads the classifier and runs one forward pass. It then
+reports its memory from /proc/self/smaps_rollup, before and after the
+load:
+
+- RSS counts shared pages in full for every process.
+- PSS splits shared pages between the processes mapping them.
+- Private is memory only that process holds.
+
+With mmap, RSS still shows the weights in every worker, but PSS and
+Private drop because the page cache holds a single physical copy.
+Linux only.
+
+Reference run: a whisper-tiny classifier (33 MB checkpoint), 4 workers,
+torch 2.14 on a 1-core / 6 GB Linux VM, MB per worker, before -> after
+load, delta:
+
+    copy   rss 770.5 -> 864.6 (+94.1)  pss 531.2 -> 611.3 (+80.1)  private 452.4 -> 527.8 (+75.5)
+    mmap   rss 770.4 -> 847.1 (+76.7)  pss 531.2 -> 570.2 (+39.0)  private 452.3 -> 478.8 (+26.4)
+
+The ~26 MB left private under mmap is the forward pass's activations and
+allocator arenas, which no loading scheme shares.
+"""
+
+import argparse
+import multiprocessing as mp
+import statistics
+from app.config import settings
+
+_FIELDS = {"Rss": "rss", "Pss": "pss", "Private_Clean": "private", "Private_Dirty": "private"}
+
+
+def _memory_mb() -> dict[str, float]:
+    usage = {"rss": 0.0, "pss": 0.0, "private": 0.0}
+    with open("/proc/self/smaps_rollup") as f:
+        for line in f:
+            name, _, rest = line.partition(":")
+            if name in _FIELDS:
+                usage[_FIELDS[name]] += int(rest.split()[0]) / 1024
+    return usage
+
+
+def _worker(path: str, mmap: bool, barrier, results):
+    import torch
+    from app.services.emotion import FULL_FRAMES, load_classifier
+
+    torch.set_num_threads(1)
+    before = _memory_mb()
+    model = load_classifier(path, torch.device("cpu"), mmap=mmap)
+    with torch.no_grad():
+        model(torch.zeros(1, 80, FULL_FRAMES))
+
+    # Measure once every worker holds its model, so PSS reflects the sharing
+    barrier.wait()
+    after = _memory_mb()
+    results.put((before, after))
+    barrier.wait()
+
+
+def _run(path: str, workers: int, mmap: bool) -> list[tuple[dict, dict]]:
+    ctx = mp.get_context("spawn")
+    barrier = ctx.Barrier(workers)
+    results = ctx.Queue()
+    processes = [ctx.Process(target=_worker, args=(path, mmap, barrier, results)) for _ in range(workers)]
+    for process in processes:
+        process.start()
+    samples = [results.get() for _ in processes]
+    for process in processes:
+        process.join()
+    return samples
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--model", default=settings.EMOTION_MODEL_PATH)
+    parser.add_argument("--workers", type=int, default=4)
+    args = parser.parse_args()
+
+    print(f"{args.workers} workers, checkpoint {args.model}")
+    print(f"{'mode':<6} {'metric':<8} {'before MB':>10} {'after MB':>10} {'delta MB':>10}")
+    for mode, mmap in (("copy", False), ("mmap", True)):
+        samples = _run(args.model, args.workers, mmap)
+        for metric in ("rss", "pss", "private"):
+            before = statistics.mean(b[metric] for b, _ in samples)
+            after = statistics.mean(a[metric] for _, a in samples)
+            print(f"{mode:<6} {metric:<8} {before:>10.1f} {after:>10.1f} {after - before:>10.1f}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,138 @@
+-- Per-user per-day emotion counters backing GET /emotion-stats.
+--
+-- Counters are kept current by a trigger on messages, so every insert path
+-- (the write-behind queue, retries, manual inserts) updates them in the same
+-- transaction as the row itself. Days are UTC calendar days.
+--
+-- Apply once in the Supabase SQL editor, then backfill existing history with:
+--     python -m app.cli rebuild-rollups
+
+create table if not exists public.emotion_daily_rollups (
+    user_id    uuid        not null,
+    day        date        not null,
+    happy      integer     not null default 0,
+    neutral    integer     not null default 0,
+    sad        integer     not null default 0,
+    angry      integer     not null default 0,
+    updated_at timestamptz not null default now(),
+    primary key (user_id, day)
+);
+
+alter table public.emotion_daily_rollups enable row level security;
+
+-- Signed-in users can read their own counters. The backend reads them with
+-- the service role key, which bypasses RLS; its anon-key client is not
+-- signed in as anyone and reads no rows.
+drop policy if exists "Users read own emotion rollups" on public.emotion_daily_rollups;
+create policy "Users read own emotion rollups"
+    on public.emotion_daily_rollups
+    for select
+    to authenticated
+    using (auth.uid() = user_id);
+
+-- Runs as the table owner, so inserts into messages update the counters
+-- whichever role made them (no insert/update policy on the rollups needed).
+create or replace function public.bump_emotion_rollup()
+returns trigger
+language plpgsql
+security definer
+set search_path = public
+as $$
+declare
+    label text := lower(new.emotion);
+begin
+    if label not in ('happy', 'neutral', 'sad', 'angry') then
+        return new;
+    end if;
+
+    insert into public.emotion_daily_rollups as r (user_id, day, happy, neutral, sad, angry)
+    values (
+        new.user_id,
+        (coalesce(new.created_at, now()) at time zone 'UTC')::date,
+        (label = 'happy')::int,
+        (label = 'neutral')::int,
+        (label = 'sad')::int,
+        (label = 'angry')::int
+    )
+    on conflict (user_id, day) do update set
+        happy      = r.happy + excluded.happy,
+        neutral    = r.neutral + excluded.neutral,
+        sad        = r.sad + excluded.sad,
+        angry      = r.angry + excluded.angry,
+        updated_at = now();
+
+    return new;
+end;
+$$;
+
+drop trigger if exists messages_emotion_rollup on public.messages;
+create trigger messages_emotion_rollup
+    after insert on public.messages
+    for each row
+    when (new.emotion is not null)
+    execute function public.bump_emotion_rollup();
+
+-- Recompute rollups from the raw messages table. Both filters are optional.
+-- Returns the number of (user, day) rows written.
+create or replace function public.rebuild_emotion_rollups(
+    p_user_id uuid default null,
+    p_since   date default null
+)
+returns integer
+language plpgsql
+as $$
+declare
+    written integer;
+begin
+    delete from public.emotion_daily_rollups
+    where (p_user_id is null or user_id = p_user_id)
+      and (p_since is null or day >= p_since);
+
+    insert into public.emotion_daily_rollups (user_id, day, happy, neutral, sad, angry)
+    select
+        user_id,
+        (created_at at time zone 'UTC')::date as day,
+        count(*) filter (where lower(emotion) = 'happy'),
+        count(*) filter (where lower(emotion) = 'neutral'),
+        count(*) filter (where lower(emotion) = 'sad'),
+        count(*) filter (where lower(emotion) = 'angry')
+    from public.messages
+    where emotion is not null
+      and lower(emotion) in ('happy', 'neutral', 'sad', 'angry')
+      and (p_user_id is null or user_id = p_user_id)
+      and (p_since is null or created_at >= (p_since::timestamp at time zone 'UTC'))
+    group by 1, 2;
+
+    get diagnostics written = row_count;
+    return written;
+end;
+$$;
+
+-- Emotion counts for an arbitrary range, grouped into day or hour buckets in
+-- the caller's timezone. Used by GET /emotion-stats/range when the request
+-- can't be answered from the UTC day rollups above.
+create or replace function public.emotion_counts_by_bucket(
+    p_user_id uuid,
+    p_start   timestamptz,
+    p_end     timestamptz,
+    p_bucket  text,
+    p_tz      text
+)
+returns table (bucket timestamp, happy bigint, neutral bigint, sad bigint, angry bigint)
+language sql
+stable
+as $$
+    select
+        date_trunc(p_bucket, created_at at time zone p_tz) as bucket,
+        count(*) filter (where lower(emotion) = 'happy'),
+        count(*) filter (where lower(emotion) = 'neutral'),
+        count(*) filter (where lower(emotion) = 'sad'),
+        count(*) filter (where lower(emotion) = 'angry')
+    from public.messages
+    where user_id = p_user_id
+      and created_at >= p_start
+      and created_at < p_end
+      and emotion is not null
+    group by 1
+    order by 1;
+$$;
@@ -32,6 +32,68 @@ export async function chat(audioBlob, text, token = null) {
   return response.data;
 }
 
+/**
+ * Streaming chat endpoint (Server-Sent Events)
+ * Emotion arrives first, then reply tokens as the LLM generates them
+ *
+ * @param {Blob} audioBlob - Audio file blob
+ * @param {string} text - User's transcribed text (from frontend STT)
+ * @param {string|null} token - Authorization token
+ * @param {Object} handlers - { onEmotion, onToken, onDone, onError }
+ * @returns {Promise<string>} - Full reply text
+ */
+export async function chatStream(audioBlob, text, token = null, handlers = {}) {
+  const formData = new FormData();
+  formData.append('file', audioBlob, 'audio.wav');
+  formData.append('text', text);
+
+  const headers = {};
+  if (token) headers['Authorization'] = token.startsWith('Bearer ') ? token : `Bearer ${token}`;
+
+  const response = await fetch(`${API_CONFIG.BASE_URL}/chat/stream`, {
+    method: 'POST',
+    body: formData,
+    headers,
+  });
+  if (!response.ok) {
+    throw new Error(`Chat stream failed: ${response.status}`);
+  }
+
+  const reader = response.body.getReader();
+  const decoder = new TextDecoder();
+  let buffer = '';
+  let replyText = '';
+
+  while (true) {
+    const { value, done } = await reader.read();
+    if (done) break;
+    buffer += decoder.decode(value, { stream: true });
+
+    // SSE events are separated by a blank line
+    let boundary;
+    while ((boundary = buffer.indexOf('\n\n')) !== -1) {
+      const raw = buffer.slice(0, boundary);
+      buffer = buffer.slice(boundary + 2);
+
+      const event = raw.match(/^event: (.*)$/m)?.[1];
+      const data = JSON.parse(raw.match(/^data: (.*)$/m)?.[1] || '{}');
+
+      if (event === 'emotion') handlers.onEmotion?.(data);
+      if (event === 'token') {
+        replyText += data.text;
+        handlers.onToken?.(data.text, replyText);
+      }
+      if (event === 'done') {
+        replyText = data.reply_text;
+        handlers.onDone?.(data);
+      }
+      if (event === 'error') handlers.onError?.(data);
+    }
+  }
+
+  return replyText;
+}
+
 /**
  * Get emotion statistics for a specific date
  * 
@@ -53,6 +115,28 @@ export async function getEmotionStats(date, token) {
   return response.data;
 }
 
+/**
+ * Get per-bucket emotion counts for a date range in one request
+ *
+ * @param {string} start - First day, YYYY-MM-DD
+ * @param {string} end - Last day (inclusive), YYYY-MM-DD
+ * @param {string} token - Authorization token
+ * @param {Object} options - { bucket: 'day' | 'hour', tz: IANA timezone }
+ * @returns {Promise} - { buckets: [...], counts: { happy: [...], ... }, totals: {...} }
+ */
+export async function getEmotionStatsRange(start, end, token, options = {}) {
+  const authHeader = token.startsWith('Bearer ') ? token : `Bearer ${token}`;
+  const tz = options.tz || Intl.DateTimeFormat().resolvedOptions().timeZone;
+
+  const response = await apiClient.get('/emotion-stats/range', {
+    params: { start, end, bucket: options.bucket || 'day', tz },
+    headers: {
+      'Authorization': authHeader,
+    },
+  });
+
+  return response.data;
+}
 
 export default apiClient;
 
@@ -1,6 +1,6 @@
-import React, { useState, useEffect } from "react";
+import React, { useState, useEffect, useRef } from "react";
 import { Link, useNavigate } from "react-router-dom";
-import { getEmotionStats } from "../api";
+import { getEmotionStatsRange } from "../api";
 import { supabase } from "../lib/supabaseClient";
 import { Navigation } from "../components";
 
@@ -18,6 +18,17 @@ const EMOTION_COLORS = {
   angry: "#D97777", // Red
 };
 
+// Days fetched per range request, so prev/next navigation needs no extra calls
+const RANGE_DAYS = 7;
+
+// YYYY-MM-DD in the user's local calendar (toISOString would give the UTC day)
+const toLocalDateStr = (date) => {
+  const year = date.getFullYear();
+  const month = String(date.getMonth() + 1).padStart(2, "0");
+  const day = String(date.getDate()).padStart(2, "0");
+  return `${year}-${month}-${day}`;
+};
+
 export const VisualizePage = () => {
   const navigate = useNavigate();
   const [currentDate, setCurrentDate] = useState(new Date());
@@ -30,6 +41,31 @@ export const VisualizePage = () => {
   const [isAuthenticated, setIsAuthenticated] = useState(false);
   const [loading, setLoading] = useState(false);
   const [error, setError] = useState(null);
+  const statsByDayRef = useRef({});
+
+  // Return stats for one day, fetching the week ending on it in one request.
+  // Only past days are cached: today keeps changing as the user chats.
+  const getDayStats = async (dateStr, token) => {
+    if (statsByDayRef.current[dateStr]) return statsByDayRef.current[dateStr];
+
+    const startDate = new Date(`${dateStr}T00:00:00`);
+    startDate.setDate(startDate.getDate() - (RANGE_DAYS - 1));
+    const range = await getEmotionStatsRange(toLocalDateStr(startDate), dateStr, token);
+
+    const today = toLocalDateStr(new Date());
+    let dayStats;
+    range.buckets.forEach((bucket, i) => {
+      const counts = {
+        happy: range.counts.happy[i],
+        neutral: range.counts.neutral[i],
+        sad: range.counts.sad[i],
+        angry: range.counts.angry[i],
+      };
+      if (bucket === dateStr) dayStats = counts;
+      if (bucket < today) statsByDayRef.current[bucket] = counts;
+    });
+    return dayStats;
+  };
 
   // Fetch emotion stats for current date
   useEffect(() => {
@@ -71,11 +107,11 @@ export const VisualizePage = () => {
         setIsAuthenticated(true);
 
         // Format date as YYYY-MM-DD
-        const dateStr = currentDate.toISOString().split("T")[0];
+        const dateStr = toLocalDateStr(currentDate);
 
         // Fetch emotion stats
         try {
-          const data = await getEmotionStats(dateStr, token);
+          const data = await getDayStats(dateStr, token);
           setStats(data);
         } catch (apiErr) {
           // If 401 (token invalid), clear cache and retry once
@@ -93,7 +129,7 @@ export const VisualizePage = () => {
             localStorage.setItem("auth_token", freshToken);
             
             // Retry with fresh token
-            const data2 = await getEmotionStats(dateStr, freshToken);
+            const data2 = await getDayStats(dateStr, freshToken);
             setStats(data2);
           } else {
             throw apiErr;